@@ -0,0 +1,89 @@
+"""Benchmark options and the `measure` fixture, which records time and peak memory.
+
+Timing regressions are checked by pytest-benchmark against a saved run
+(`--benchmark-compare --benchmark-compare-fail=mean:10%`); peak memory regressions are
+checked against the `peak_memory_mb` recorded in a saved run's JSON (`--memory-baseline`).
+
+`peak_memory_mb` is the peak of Python allocations traced by tracemalloc, which is
+deterministic but misses native allocations (e.g. Polars buffers); `rss_growth_mb` is how
+much the call raised the process' peak resident memory, which includes them but is zero
+when an earlier benchmark already reached a higher peak.
+"""
+import json
+import resource
+import sys
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+
+# The Taskmaster-2 preparation scripts aren't part of the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark sizes and memory")
+    group.addoption(
+        "--bench-sizes", default="1000,100000",
+        help="Comma separated numbers of rows to benchmark (e.g. 1000,100000,10000000)"
+    )
+    group.addoption(
+        "--memory-baseline", default=None,
+        help="Benchmark JSON (from --benchmark-json) whose peak memory the run must not exceed"
+    )
+    group.addoption(
+        "--memory-tolerance", type=float, default=0.1,
+        help="Allowed relative peak memory increase over the baseline"
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "n_rows" in metafunc.fixturenames:
+        sizes = [int(x) for x in metafunc.config.getoption("bench_sizes").split(",")]
+        metafunc.parametrize("n_rows", sizes, ids=[f"{x}rows" for x in sizes])
+
+
+def _max_rss_mb() -> float:
+    """Peak resident memory of the process so far (reported in KiB on Linux, bytes on macOS)."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2 ** 20 if sys.platform == "darwin" else max_rss / 2 ** 10
+
+
+@pytest.fixture(scope="session")
+def memory_baseline(request):
+    """Peak memory of each benchmark in the `--memory-baseline` JSON, by node id."""
+    path = request.config.getoption("memory_baseline")
+    if not path:
+        return {}
+    with open(path) as f:
+        return {x["fullname"]: x["extra_info"].get("peak_memory_mb") for x in json.load(f)["benchmarks"]}
+
+
+@pytest.fixture
+def measure(benchmark, request, memory_baseline):
+    """Benchmark a function and record its peak traced memory (in MB) in the benchmark's extra info.
+
+    Fewer rounds are run for larger inputs; memory is traced in a separate call, so tracing
+    doesn't slow down the timed rounds.
+    """
+    def run(fn, *args, n_rows: int, **kwargs):
+        result = benchmark.pedantic(
+            fn, args=args, kwargs=kwargs, rounds=max(1, min(10, 1_000_000 // n_rows)), iterations=1
+        )
+
+        max_rss_before = _max_rss_mb()
+        tracemalloc.start()
+        fn(*args, **kwargs)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        benchmark.extra_info["peak_memory_mb"] = peak_mb
+        benchmark.extra_info["rss_growth_mb"] = _max_rss_mb() - max_rss_before
+
+        baseline = memory_baseline.get(request.node.nodeid)
+        tolerance = request.config.getoption("memory_tolerance")
+        if baseline is not None and peak_mb > baseline * (1 + tolerance) + 1:
+            pytest.fail(f"Peak memory {peak_mb:.1f} MB exceeds the baseline {baseline:.1f} MB by more than {tolerance:.0%}")
+        return result
+
+    return run
@@ -0,0 +1,74 @@
+"""Synthetic inputs for the benchmarks, reproducible from a seed."""
+import random
+from typing import Dict, List
+
+
+WORDS = ["alpha", "beta", "gamma", "delta", "booking", "flight", "restaurant", "weather", "music", "hotel"]
+
+
+def numeric_values(n: int, seed: int = 0) -> List[float]:
+    """Floats with 10% None values."""
+    rng = random.Random(seed)
+    return [None if rng.random() < 0.1 else rng.gauss(100, 15) for _ in range(n)]
+
+
+def string_values(n: int, seed: int = 0, n_unique: int = 1000) -> List[str]:
+    """Short strings drawn from `n_unique` values, with 10% None values."""
+    rng = random.Random(seed)
+    vocabulary = [f"{rng.choice(WORDS)} {i}" for i in range(n_unique)]
+    return [None if rng.random() < 0.1 else rng.choice(vocabulary) for _ in range(n)]
+
+
+def none_heavy_values(n: int, seed: int = 0) -> List[int]:
+    """Integers with 90% None values."""
+    rng = random.Random(seed)
+    return [rng.randint(0, 100) if rng.random() < 0.1 else None for _ in range(n)]
+
+
+def nested_values(n: int, seed: int = 0) -> List[List[int]]:
+    """Lists of 0-5 integers (n values in total, on average), with 5% None lists."""
+    rng = random.Random(seed)
+    lists = []
+    total = 0
+    while total < n:
+        size = rng.randint(0, 4)
+        lists.append(None if rng.random() < 0.05 else [rng.randint(0, 50) for _ in range(size)])
+        total += size
+    return lists
+
+
+VALUE_GENERATORS = {
+    "numeric": numeric_values,
+    "string": string_values,
+    "none_heavy": none_heavy_values,
+    "nested": nested_values,
+}
+
+
+def records(n: int, seed: int = 0) -> List[Dict]:
+    """Records like the annotated datasets, with an id, a long text, a label and list and struct fields."""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i,
+            "conversation_id": i // 5,
+            "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 200))),
+            "label": rng.choice(WORDS[:5]),
+            "tags": [rng.choice(WORDS) for _ in range(rng.randint(0, 8))],
+            "scores": {x: rng.random() for x in WORDS[:rng.randint(1, 8)]},
+        }
+        for i in range(n)
+    ]
+
+
+def dialogs(n_turns: int, turns_per_dialog: int = 20, seed: int = 0) -> List[str]:
+    """Taskmaster-2 style dialogs with `n_turns` USER + ASSISTANT turns in total."""
+    rng = random.Random(seed)
+    result = []
+    for start in range(0, n_turns, turns_per_dialog):
+        lines = []
+        for _ in range(min(turns_per_dialog, n_turns - start)):
+            lines.append("USER: " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))))
+            lines.append("ASSISTANT: " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 30))))
+        result.append("\n".join(lines))
+    return result
@@ -0,0 +1,12 @@
+from annotate_and_finetune.data_science_agent.get_data_sample import truncate_sample
+from benchmarks.generators import records
+
+
+def truncate_samples(samples):
+    return [truncate_sample(x) for x in samples]
+
+
+def test_truncate_sample(measure, n_rows):
+    samples = records(n_rows)
+    truncated = measure(truncate_samples, samples, n_rows=n_rows)
+    assert len(truncated) == n_rows
@@ -0,0 +1,16 @@
+import pytest
+
+from annotate_and_finetune.split_data import split_data
+from benchmarks.generators import records
+
+
+@pytest.mark.parametrize("mode", ["shuffle", "key", "group_stratified"])
+def test_split_data(measure, n_rows, mode):
+    data = [{k: x[k] for k in ("id", "conversation_id", "label")} for x in records(n_rows)]
+    kwargs = {
+        "shuffle": dict(seed=0),
+        "key": dict(key="id"),
+        "group_stratified": dict(key="id", group_key="conversation_id", stratify_key="label"),
+    }[mode]
+    splits = measure(split_data, data, [0.8, 0.1, 0.1], n_rows=n_rows, **kwargs)
+    assert sum(len(x) for x in splits) == n_rows
@@ -0,0 +1,11 @@
+import pytest
+
+from annotate_and_finetune.summarize_list import summarize_list
+from benchmarks.generators import VALUE_GENERATORS
+
+
+@pytest.mark.parametrize("kind", list(VALUE_GENERATORS))
+def test_summarize_list(measure, n_rows, kind):
+    values = VALUE_GENERATORS[kind](n_rows)
+    summary = measure(summarize_list, values, n_rows=n_rows)
+    assert "Value Counts" in summary
@@ -0,0 +1,16 @@
+import pytest
+
+from prepare_taskmaster2_turn_dataset import process_dialog_to_turns
+from benchmarks.generators import dialogs
+
+
+def process_dialogs(dialog_strs, context_window=None):
+    return [process_dialog_to_turns(x, "label", context_window) for x in dialog_strs]
+
+
+@pytest.mark.parametrize("context_window", [None, 4], ids=["full_context", "window4"])
+def test_process_dialog_to_turns(measure, n_rows, context_window):
+    # One row per turn
+    dialog_strs = dialogs(n_rows)
+    turns = measure(process_dialogs, dialog_strs, context_window, n_rows=n_rows)
+    assert sum(len(x) for x in turns) == n_rows
@@ -5,6 +5,7 @@ https://github.com/google-research-datasets/Taskmaster/tree/master/TM-2-2020
 """
 
 from pathlib import Path
+from multiprocessing import Pool
 from typing import Annotated, List, Dict
 import json
 
@@ -25,6 +26,18 @@ def format_conversation(utterances: List[Dict]) -> str:
     return "\n".join(conversation)
 
 
+def process_file(json_file: Path) -> List[str]:
+    """Convert the conversations of one TM-2-2020 JSON file into JSON lines."""
+    label = json_file.stem  # e.g. "flights" from "flights.json"
+
+    # Read and process conversations
+    data = json.loads(json_file.read_text())
+    return [
+        json.dumps({'dialog': format_conversation(conv['utterances']), 'label': label}) + '\n'
+        for conv in data
+    ]
+
+
 def prepare_taskmaster2_dialog_dataset(
     input_dir: Annotated[
         Path,
@@ -34,6 +47,10 @@ def prepare_taskmaster2_dialog_dataset(
         Path,
         Option(help="Output path for the processed jsonl file")
     ] = Path.home() / "data/taskmaster2/taskmaster2_dialogs.jsonl",
+    num_proc: Annotated[
+        int,
+        Option(help="Number of processes (one JSON file per task)")
+    ] = 4,
 ):
     """Process Taskmaster-2 files into a single jsonlines file.
     
@@ -42,20 +59,11 @@ def prepare_taskmaster2_dialog_dataset(
     # Create output directory if needed
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Process each JSON file
-    with output_path.open('w') as outf:
-        for json_file in input_dir.glob('*.json'):
-            label = json_file.stem  # e.g. "flights" from "flights.json"
-            
-            # Read and process conversations
-            data = json.loads(json_file.read_text())
-            for conv in data:
-                # Convert dialog to string format and write as JSON line
-                dialog_str = format_conversation(conv['utterances'])
-                outf.write(json.dumps({
-                    'dialog': dialog_str,
-                    'label': label
-                }) + '\n')
+    # Process the JSON files in parallel, writing them in a fixed order
+    json_files = sorted(input_dir.glob('*.json'))
+    with output_path.open('w') as outf, Pool(min(num_proc, len(json_files)) or 1) as pool:
+        for lines in pool.imap(process_file, json_files):
+            outf.writelines(lines)
 
     print(f"Processed Taskmaster-2 dialog dataset saved to: {output_path}")
 
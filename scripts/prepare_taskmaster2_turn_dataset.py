@@ -2,48 +2,91 @@
 
 Creates a dataset with one row per dialog turn, including cumulative context
 from all previous turns in the conversation.
+
+With `--mode offsets`, each dialog is stored once with the character offsets of
+its turns, and `iter_turns` materializes the turn records lazily when reading.
 """
 
 from pathlib import Path
-from typing import Annotated, List, Dict
+from typing import Annotated, Iterator, List, Dict
 import json
 
 import typer
 from typer import Option
 
 
-def process_dialog_to_turns(dialog: str, label: str) -> List[Dict]:
-    """Convert a dialog string into a list of cumulative turn records.
-    Each turn contains a USER message followed by an ASSISTANT response."""
-    turns = []
+def turn_offsets(dialog: str, context_window: int = None) -> List[Dict]:
+    """Find the character offsets of the USER + ASSISTANT turns of a dialog string.
+
+    Args:
+        dialog: Dialog with one "USER: ..." or "ASSISTANT: ..." message per line
+        context_window: Number of turns (including the current one) in each turn's context
+            (None for all previous turns)
+
+    Returns:
+        One dictionary per turn with its `turn_index` and the `context_start`, `user_start`,
+        `assistant_start` and `end` offsets into `dialog`
+    """
     dialog_lines = dialog.split('\n')
-    
+
+    # Start offset of each line (plus the end of the dialog)
+    line_starts = [0]
+    for line in dialog_lines:
+        line_starts.append(line_starts[-1] + len(line) + 1)
+
+    turns = []
     # Process lines in pairs of USER + ASSISTANT messages
     for i in range(0, len(dialog_lines)-1, 2):
-        # Skip if we don't have both USER and ASSISTANT messages
-        if i+1 >= len(dialog_lines):
-            break
-            
         # Verify we have USER then ASSISTANT pattern
-        current_line = dialog_lines[i]
-        next_line = dialog_lines[i+1]
-        if not (current_line.startswith('USER:') and next_line.startswith('ASSISTANT:')):
+        if not (dialog_lines[i].startswith('USER:') and dialog_lines[i+1].startswith('ASSISTANT:')):
             continue
-            
-        # Build context from all previous turns plus current pair
-        context = '\n'.join(dialog_lines[:i+2])
-        turn = {
-            'context': context,
-            'label': label,
+
+        context_line = 0 if context_window is None else max(0, i + 2 - 2 * context_window)
+        turns.append({
             'turn_index': i//2,  # Index counts pairs rather than individual messages
-            'user_message': current_line,
-            'assistant_message': next_line
-        }
-        turns.append(turn)
-    
+            'context_start': line_starts[context_line],
+            'user_start': line_starts[i],
+            'assistant_start': line_starts[i+1],
+            'end': line_starts[i+2] - 1,
+        })
     return turns
 
 
+def materialize_turn(dialog: str, label: str, offsets: Dict) -> Dict:
+    """Build a turn record from a dialog and the offsets of one of its turns."""
+    return {
+        'context': dialog[offsets['context_start']:offsets['end']],
+        'label': label,
+        'turn_index': offsets['turn_index'],
+        'user_message': dialog[offsets['user_start']:offsets['assistant_start'] - 1],
+        'assistant_message': dialog[offsets['assistant_start']:offsets['end']],
+    }
+
+
+def process_dialog_to_turns(dialog: str, label: str, context_window: int = None) -> List[Dict]:
+    """Convert a dialog string into a list of cumulative turn records.
+    Each turn contains a USER message followed by an ASSISTANT response."""
+    return [materialize_turn(dialog, label, x) for x in turn_offsets(dialog, context_window)]
+
+
+def iter_turns(path: str, context_window: int = None) -> Iterator[Dict]:
+    """Lazily read turn records from a dataset saved with `--mode offsets`.
+
+    Args:
+        path: Path to the jsonlines file of dialogs with turn offsets
+        context_window: Number of turns in each turn's context (None to use the saved offsets)
+
+    Yields:
+        Turn records, as written with `--mode full`, plus a `dialog_index` field
+    """
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            offsets = record['turns'] if context_window is None else turn_offsets(record['dialog'], context_window)
+            for x in offsets:
+                yield materialize_turn(record['dialog'], record['label'], x) | {'dialog_index': record['dialog_index']}
+
+
 def prepare_taskmaster2_turn_dataset(
     input_file: Annotated[
         Path,
@@ -53,23 +96,44 @@ def prepare_taskmaster2_turn_dataset(
         Path,
         Option(help="Output path for the processed jsonl file")
     ] = Path.home() / "data/taskmaster2/taskmaster2_turns.jsonl",
+    mode: Annotated[
+        str,
+        Option(help="'full' to write one record per turn with its context, or 'offsets' to write each dialog once with turn offsets")
+    ] = "full",
+    context_window: Annotated[
+        int,
+        Option(help="Number of turns (including the current one) in each turn's context (default: all previous turns)")
+    ] = None,
 ):
     """Process Taskmaster-2 dialog dataset into turn-level records with cumulative context."""
-    
+    if mode not in ("full", "offsets"):
+        raise ValueError(f"Unknown mode: {mode}")
+
     # Create output directory if needed
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Process each dialog
-    with output_path.open('w') as outf:
-        for line in open(input_file):
+    with output_path.open('w') as outf, open(input_file) as inf:
+        for dialog_index, line in enumerate(inf):
             dialog_data = json.loads(line)
-            
+
+            if mode == "offsets":
+                # Store the dialog once; contexts are sliced from it when reading
+                outf.write(json.dumps({
+                    'dialog_index': dialog_index,
+                    'dialog': dialog_data['dialog'],
+                    'label': dialog_data['label'],
+                    'turns': turn_offsets(dialog_data['dialog'], context_window),
+                }) + '\n')
+                continue
+
             # Convert dialog into turn records
             turns = process_dialog_to_turns(
                 dialog_data['dialog'],
-                dialog_data['label']
+                dialog_data['label'],
+                context_window
             )
-            
+
             # Write each turn as a JSON line
             for turn in turns:
                 outf.write(json.dumps(turn) + '\n')
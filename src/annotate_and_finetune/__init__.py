@@ -1,5 +1,6 @@
 from .annotate import run_annotation
 from .finetune import run_finetuning
 from .summarize_list import summarize_list
+from .summarize_dataframe import summarize_dataframe
 from .split_data import split_data
 from .main import run_pipeline
\ No newline at end of file
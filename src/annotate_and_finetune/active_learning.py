@@ -0,0 +1,283 @@
+from pathlib import Path
+from typing import Annotated, Dict, List, Tuple
+import json
+import os
+import random
+
+import numpy as np
+import torch
+import typer
+from typer import Option
+
+from llmpipe import read_data, write_data
+from annotate_and_finetune.annotation_config import annotate_samples, annotation_kwargs_from_config
+from annotate_and_finetune.finetune import resolve_max_length, run_finetuning
+from annotate_and_finetune.main import load_config
+from annotate_and_finetune.metrics import AnnotationMetrics
+from annotate_and_finetune.predict import load_classifier
+from annotate_and_finetune.split_data import split_data
+from annotate_and_finetune.streaming import iter_chunks
+
+
+def entropy_scores(probs: np.ndarray) -> np.ndarray:
+    """Predictive entropy of each row of class probabilities (higher is more uncertain)."""
+    return -(probs * np.log(np.clip(probs, 1e-12, None))).sum(axis=1)
+
+
+def margin_scores(probs: np.ndarray) -> np.ndarray:
+    """Negative margin between the two most probable classes (higher is more uncertain)."""
+    if probs.shape[1] < 2:
+        return np.zeros(len(probs))
+    top2 = np.sort(probs, axis=1)[:, -2:]
+    return top2[:, 0] - top2[:, 1]
+
+
+def kmeans(x: np.ndarray, k: int, n_iter: int = 20, seed: int = None) -> np.ndarray:
+    """Cluster rows of `x` into `k` clusters with Lloyd's algorithm, returning cluster assignments."""
+    rng = np.random.default_rng(seed)
+    centers = x[rng.choice(len(x), size=k, replace=False)].astype(np.float64)
+    x_norms = (x ** 2).sum(axis=1)[:, None]
+    for _ in range(n_iter):
+        # Squared distances as |x|^2 - 2 x.c + |c|^2, without an (n, k, d) difference array
+        distances = x_norms - 2 * x @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+        assignments = distances.argmin(axis=1)
+        for j in range(k):
+            members = x[assignments == j]
+            if len(members):
+                centers[j] = members.mean(axis=0)
+    return assignments
+
+
+def select_samples(
+    probs: np.ndarray,
+    n: int,
+    strategy: str = "entropy",
+    embeddings: np.ndarray = None,
+    oversample: int = 5,
+    seed: int = None,
+) -> List[int]:
+    """Select the indices of the pool samples to annotate next.
+
+    Args:
+        probs: Predicted class probabilities of the pool samples
+        n: Number of samples to select
+        strategy: "entropy" or "margin" (most uncertain first), "cluster" (the most uncertain
+            sample of each of `n` embedding clusters among the `oversample * n` most uncertain
+            samples, so the selection covers different regions of the data) or "random"
+        embeddings: Embeddings of the pool samples (required by the "cluster" strategy)
+        oversample: Candidates per selected sample for the "cluster" strategy
+        seed: Random seed
+
+    Returns:
+        Indices of the selected samples
+    """
+    n = min(n, len(probs))
+    if strategy == "random":
+        return random.Random(seed).sample(range(len(probs)), n)
+    if strategy == "margin":
+        scores = margin_scores(probs)
+    elif strategy in ("entropy", "cluster"):
+        scores = entropy_scores(probs)
+    else:
+        raise ValueError(f"Unknown selection strategy: {strategy}")
+    ranked = np.argsort(-scores, kind="stable")
+    if strategy != "cluster":
+        return ranked[:n].tolist()
+
+    candidates = ranked[:n * oversample]
+    if len(candidates) <= n:
+        return candidates.tolist()
+    assignments = kmeans(embeddings[candidates], n, seed=seed)
+    # Candidates are ordered by uncertainty, so the first member of each cluster is its most uncertain
+    selected = {}
+    for idx, cluster in zip(candidates, assignments):
+        selected.setdefault(cluster, idx)
+    # Fill with the next most uncertain candidates if some clusters are empty
+    selected = sorted(selected.values(), key=lambda i: -scores[i])
+    chosen = set(selected)
+    remaining = [x for x in candidates if x not in chosen]
+    return [int(x) for x in selected + remaining][:n]
+
+
+def score_pool(
+    model_path: str,
+    samples: List[Dict],
+    input_field: str,
+    batch_size: int = 32,
+    max_length: int = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Predict class probabilities and first-token embeddings of samples with a fine-tuned classifier.
+
+    Returns:
+        Tuple of class probabilities and embeddings, one row per sample
+    """
+    model, tokenizer = load_classifier(model_path)
+    probs, embeddings = [None] * len(samples), [None] * len(samples)
+    encodings = tokenizer(
+        [x[input_field] for x in samples], truncation=True, max_length=resolve_max_length(tokenizer, max_length)
+    )
+    features = [{k: v[i] for k, v in encodings.items()} for i in range(len(samples))]
+    # Batch samples of similar length together
+    order = sorted(range(len(samples)), key=lambda i: len(features[i]["input_ids"]))
+    with torch.inference_mode():
+        for batch_idx in iter_chunks(order, batch_size):
+            batch = tokenizer.pad([features[i] for i in batch_idx], return_tensors="pt")
+            outputs = model(**batch, output_hidden_states=True)
+            batch_probs = torch.softmax(outputs.logits, dim=-1).numpy()
+            batch_embeddings = outputs.hidden_states[-1][:, 0].numpy()
+            for j, i in enumerate(batch_idx):
+                probs[i], embeddings[i] = batch_probs[j], batch_embeddings[j]
+    return np.stack(probs), np.stack(embeddings)
+
+
+def active_learning(
+    config_path: Annotated[str, Option(help="Path to YAML config file")] = None,
+    num_proc: Annotated[int, Option(help="Number of processes for annotation")] = 2,
+    verbose: Annotated[bool, Option(help="Enable verbose output")] = False,
+    backend: Annotated[str, Option(help="Annotation backend: 'process' or 'async' (overrides the config)")] = None,
+):
+    """Iteratively fine-tune, score the unlabeled pool and annotate the samples the classifier is least sure about.
+
+    Uses the pipeline config, plus an `active_learning` section with:
+
+    - `seed_size`: Random samples annotated in the first round, split into train/val/test (default 200)
+    - `round_size`: Samples selected and annotated per round, added to the train set (default 100)
+    - `budget`: Maximum annotated samples in total (default 1000)
+    - `target_accuracy`: Stop once the validation accuracy reaches this value
+    - `max_rounds`: Maximum rounds (default 10)
+    - `strategy`: "entropy", "margin", "cluster" or "random" (default "cluster")
+    - `pool_sample_size`: Score a random subset of the pool of this size each round (default: whole pool)
+    """
+    print("Loading config file...")
+    config = load_config(config_path)
+    al_config = config.get("active_learning") or {}
+    seed_size = al_config.get("seed_size", 200)
+    round_size = al_config.get("round_size", 100)
+    budget = al_config.get("budget", 1000)
+    target_accuracy = al_config.get("target_accuracy")
+    max_rounds = al_config.get("max_rounds", 10)
+    strategy = al_config.get("strategy", "cluster")
+    pool_sample_size = al_config.get("pool_sample_size")
+
+    context_col = config["context_col"]
+    id_col = config.get("id_col", "id")
+    seed = config.get("seed")
+    rng = random.Random(seed)
+    data_path = str(Path(config["data_path"]).expanduser())
+    model_path = str(Path(config["model_path"]).expanduser())
+    model_output_path = str(Path(config["model_output_path"]).expanduser())
+    data_output_path = str(Path(config["data_output_path"]).expanduser())
+    val_test_prop = config.get("val_test_prop", 0.2)
+    tokenized_cache_dir = config.get("tokenized_cache_dir")
+    finetune_kwargs = dict(
+        input_field=context_col,
+        model_path=model_path,
+        num_epochs=config.get("num_epochs", 1),
+        learning_rate=config.get("learning_rate", 0.00001),
+        batch_size=config.get("batch_size", 8),
+        max_length=config.get("max_length"),
+        group_by_length=config.get("group_by_length", True),
+        tokenized_cache_dir=str(Path(tokenized_cache_dir).expanduser()) if tokenized_cache_dir else None,
+        soft_label_field=config.get("soft_label_field"),
+    )
+
+    print(f"Loading data from {data_path}...")
+    pool = read_data(data_path)
+    pool = [
+        {("gt_label" if k == "label" else k): v for k, v in x.items()} | ({} if id_col in x else {id_col: i})
+        for i, x in enumerate(pool)
+    ]
+    rng.shuffle(pool)
+
+    with AnnotationMetrics(
+        progress_interval=config.get("progress_interval", 30),
+        prometheus_path=config.get("prometheus_path"),
+    ) as metrics:
+        annotation_kwargs = annotation_kwargs_from_config(
+            config, num_proc=num_proc, verbose=verbose, backend=backend, metrics=metrics
+        )
+
+        # Seed round: annotate random samples and fix the validation and test sets
+        seed_samples, pool = pool[:seed_size], pool[seed_size:]
+        print(f"\nAnnotating {len(seed_samples)} seed samples...")
+        annotated = annotate_samples(seed_samples, config, **annotation_kwargs)
+        n_annotated = len(seed_samples)
+        train_samples, val_samples, test_samples = split_data(
+            annotated,
+            [1 - 2 * val_test_prop, val_test_prop, val_test_prop],
+            key=id_col,
+            group_key=config.get("split_group_col"),
+            stratify_key="label" if config.get("split_stratify", False) else None,
+            seed=seed,
+        )
+
+        rounds = []
+        for round_idx in range(max_rounds):
+            round_path = f"{model_output_path}/round_{round_idx:02d}"
+            os.makedirs(round_path, exist_ok=True)
+            print(f"\nRound {round_idx}: fine-tuning on {len(train_samples)} samples...")
+            # run_finetuning replaces labels with label ids, so pass copies
+            round_metrics = run_finetuning(
+                train_data=[dict(x) for x in train_samples],
+                val_data=[dict(x) for x in val_samples],
+                test_data=[dict(x) for x in test_samples],
+                output_path=round_path,
+                **finetune_kwargs,
+            )
+            val_accuracy = round_metrics["validation"].get("eval_accuracy")
+            rounds.append({
+                "round": round_idx,
+                "train_samples": len(train_samples),
+                "annotated_samples": n_annotated,
+                "validation_accuracy": val_accuracy,
+                "test_accuracy": round_metrics["test"].get("eval_accuracy"),
+                "model_path": round_path,
+            })
+            print(f"Round {round_idx}: validation accuracy {val_accuracy}, {n_annotated} samples annotated")
+
+            if target_accuracy is not None and val_accuracy is not None and val_accuracy >= target_accuracy:
+                print(f"Reached target accuracy {target_accuracy}")
+                break
+            n_select = min(round_size, budget - n_annotated, len(pool))
+            if n_select <= 0:
+                print("Annotation budget or unlabeled pool exhausted")
+                break
+
+            # Score (a sample of) the pool with the current model and annotate the most informative samples
+            candidates = pool if pool_sample_size is None else rng.sample(pool, min(pool_sample_size, len(pool)))
+            probs, embeddings = score_pool(
+                round_path, candidates, context_col, batch_size=finetune_kwargs["batch_size"],
+                max_length=finetune_kwargs["max_length"]
+            )
+            selected = [candidates[i] for i in select_samples(probs, n_select, strategy, embeddings, seed=seed)]
+            selected_ids = {x[id_col] for x in selected}
+            pool = [x for x in pool if x[id_col] not in selected_ids]
+            print(f"Annotating {len(selected)} samples selected by {strategy}...")
+            train_samples = train_samples + annotate_samples(selected, config, **annotation_kwargs)
+            n_annotated += len(selected)
+
+        # Save the annotated data, the per-round report and the annotation metrics
+        os.makedirs(data_output_path, exist_ok=True)
+        write_data(train_samples, f"{data_output_path}/train.jsonl")
+        write_data(val_samples, f"{data_output_path}/val.jsonl")
+        write_data(test_samples, f"{data_output_path}/test.jsonl")
+        with open(f"{data_output_path}/active_learning.json", "w") as f:
+            json.dump(rounds, f, indent=2)
+        metrics.write_report(f"{data_output_path}/annotation_metrics.json")
+        print(metrics.progress_line())
+
+    print("\n| Round | Annotated | Train | Validation accuracy | Test accuracy |")
+    print("|---|---|---|---|---|")
+    for x in rounds:
+        print(f"| {x['round']} | {x['annotated_samples']} | {x['train_samples']} | {x['validation_accuracy']} | {x['test_accuracy']} |")
+
+
+def main():
+    """CLI entry point."""
+    app = typer.Typer(add_completion=False, pretty_exceptions_show_locals=False)
+    app.command()(active_learning)
+    app()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 from pathlib import Path
-from typing import Annotated, Dict, List
+from typing import Annotated, Callable, Dict, Iterable, Iterator, List
+from functools import partial
+from itertools import chain
+import multiprocessing
 import random
 import yaml
 
@@ -9,30 +12,77 @@ import polars as pl
 
 from llmpipe import PromptModule, read_data, write_data
 
+from annotate_and_finetune.async_annotate import run_async_annotation
+from annotate_and_finetune.annotation_cache import AnnotationCache, cache_key
+from annotate_and_finetune.checkpoint import append_records, is_annotated, read_completed_ids
+from annotate_and_finetune.metrics import AnnotationMetrics
+from annotate_and_finetune.prompt_cache import format_cache_summary, inline_allowed_labels
+from annotate_and_finetune.streaming import iter_chunks, iter_jsonl, reservoir_sample
 
-def run_annotation(
+
+def format_allowed_labels(allowed_labels: List[Dict]) -> str:
+    """Format allowed label dictionaries with 'label' and 'description' fields as a markdown list."""
+    return "\n".join([f"- {c['label']}: {c['description']}" for c in allowed_labels])
+
+
+def iter_annotation(
     config: Dict,
-    samples: List[Dict],
+    samples: Iterable[Dict],
     n_samples: int = None,
     num_proc: int = 1,
     model: str = "claude-3-5-sonnet-20241022",
     verbose: bool = False,
     allowed_labels: List[Dict] = None,
-) -> List[Dict]:
-    """Run annotation on a dataset using the provided config.
-    
+    cache_path: str = None,
+    cache_max_size_mb: float = 1024,
+    seed: int = None,
+    chunk_size: int = None,
+    backend: str = "process",
+    max_concurrency: int = 64,
+    requests_per_minute: float = None,
+    tokens_per_minute: float = None,
+    prompt_caching: bool = False,
+    metrics: AnnotationMetrics = None,
+) -> Iterator[List[Dict]]:
+    """Run annotation on a dataset, yielding annotated samples one chunk at a time.
+
+    `samples` may be a lazy iterable (e.g. from `iter_jsonl`), in which case it is consumed
+    one chunk at a time and random sampling uses a single-pass reservoir sample.
+
     Args:
         config: Prompt configuration dictionary
-        samples: List of samples to annotate
+        samples: List or iterable of samples to annotate
         n_samples: Number of random samples to process
         num_proc: Number of processes to use
         model: LiteLLM model identifier
         verbose: Stream output to stdout
         allowed_labels: List of allowed label dictionaries with 'label' and 'description' fields
-        
-    Returns:
-        List of annotated samples
+        cache_path: Path to a SQLite response cache; only uncached samples are sent to the model
+        cache_max_size_mb: Maximum size of the response cache in megabytes
+        seed: Random seed for sample selection, so repeated runs select the same samples
+        chunk_size: Number of samples per chunk (defaults to a single chunk for lists and
+            1000 samples for other iterables)
+        backend: "process" to parallelize with `num_proc` processes, or "async" to run
+            `max_concurrency` concurrent calls from a single process
+        max_concurrency: Maximum number of in-flight requests (async backend)
+        requests_per_minute: Provider requests per minute quota (async backend)
+        tokens_per_minute: Provider input tokens per minute quota (async backend)
+        prompt_caching: Send the allowed labels as part of the static prompt preamble, so
+            providers can cache it as a shared prefix, and report cached input tokens
+        metrics: Collects request latency, token and error metrics (a temporary collector is
+            used if None)
+
+    Yields:
+        Lists of annotated samples
     """
+    # Process allowed classes if provided
+    classes_md = None
+    if allowed_labels:
+        classes_md = format_allowed_labels(allowed_labels)
+        if prompt_caching:
+            config = inline_allowed_labels(config, classes_md)
+            classes_md = None
+
     # Update config with runtime parameters
     config["model"] = model
     config["verbose"] = verbose
@@ -44,18 +94,190 @@ def run_annotation(
     
     # Sample if requested
     if n_samples is not None:
-        n_samples = min(n_samples, len(samples))
-        samples = random.sample(samples, n_samples)
+        if isinstance(samples, list):
+            n_samples = min(n_samples, len(samples))
+            samples = random.Random(seed).sample(samples, n_samples)
+        else:
+            samples = reservoir_sample(samples, n_samples, seed=seed)
+
+    owns_metrics = metrics is None
+    if owns_metrics:
+        metrics = AnnotationMetrics(progress_interval=None)
+
+    # Select the annotation backend
+    if backend == "process":
+        if num_proc > 1 and multiprocessing.get_start_method() != "fork":
+            print("Worker processes are not forked, so their requests are not recorded in the annotation metrics")
+        def run_prompt(rows: List[Dict]) -> List[Dict]:
+            data = pl.from_dicts(rows).to_dict(as_series=False)
+            return pl.from_dict(prompt(**data, num_proc=num_proc)).to_dicts()
+    elif backend == "async":
+        run_prompt = partial(
+            run_async_annotation,
+            prompt,
+            output_names=[x["name"] for x in config.get("outputs", [])],
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            metrics=metrics,
+        )
+    else:
+        if owns_metrics:
+            metrics.close()
+        raise ValueError(f"Unknown annotation backend: {backend}")
+
+    cache = AnnotationCache(cache_path, max_size_mb=cache_max_size_mb) if cache_path else None
+    try:
+        with metrics.track():
+            if chunk_size is None:
+                chunk_size = max(len(samples), 1) if isinstance(samples, list) else 1000
+            for chunk in iter_chunks(samples, chunk_size):
+                records = _annotate_chunk(prompt, model, chunk, classes_md, run_prompt, cache)
+                metrics.add_samples(len(records))
+                yield records
+    finally:
+        if cache is not None:
+            stats = cache.stats()
+            print(f"Annotation cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
+            cache.close()
+        if prompt_caching:
+            print(format_cache_summary(metrics.report()["tokens"]))
+        if owns_metrics:
+            metrics.close()
+
+
+def _annotate_chunk(
+    prompt: PromptModule,
+    model: str,
+    samples: List[Dict],
+    classes_md: str,
+    run_prompt: Callable[[List[Dict]], List[Dict]],
+    cache: AnnotationCache = None,
+) -> List[Dict]:
+    """Run a chunk of samples through the prompt, consulting the response cache if provided."""
+    rows = samples
+    if classes_md is not None:
+        rows = [x | {"allowed_labels": classes_md} for x in samples]
 
-    data = pl.from_dicts(samples).to_dict(as_series=False)
-    
-    # Process allowed classes if provided
-    if allowed_labels:
-        classes_md = "\n".join([f"- {c['label']}: {c['description']}" for c in allowed_labels])
-        data["allowed_labels"] = [classes_md] * len(samples)
-    
     # Run prompt and return results
-    return pl.from_dict(prompt(**data, num_proc=num_proc)).to_dicts()
+    if cache is None:
+        return run_prompt(rows)
+
+    # Look up every sample, keyed on the prompt, model and input fields
+    keys = [cache_key(prompt.prompt, model, row) for row in rows]
+    results = cache.get_many(keys)
+
+    # Only send cache misses to the model
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        responses = run_prompt([rows[i] for i in missing])
+        completed = {}
+        for i, response in zip(missing, responses):
+            results[i] = response
+            # Don't cache failed responses so they are retried on the next run
+            if all(response.get(k) is not None for k in response if k not in rows[i]):
+                completed[keys[i]] = response
+        cache.put_many(completed)
+
+    return results
+
+
+def run_annotation(
+    config: Dict,
+    samples: List[Dict],
+    n_samples: int = None,
+    num_proc: int = 1,
+    model: str = "claude-3-5-sonnet-20241022",
+    verbose: bool = False,
+    allowed_labels: List[Dict] = None,
+    cache_path: str = None,
+    cache_max_size_mb: float = 1024,
+    seed: int = None,
+    **kwargs,
+) -> List[Dict]:
+    """Run annotation on a dataset using the provided config.
+    
+    Args:
+        config: Prompt configuration dictionary
+        samples: List of samples to annotate
+        n_samples: Number of random samples to process
+        num_proc: Number of processes to use
+        model: LiteLLM model identifier
+        verbose: Stream output to stdout
+        allowed_labels: List of allowed label dictionaries with 'label' and 'description' fields
+        cache_path: Path to a SQLite response cache; only uncached samples are sent to the model
+        cache_max_size_mb: Maximum size of the response cache in megabytes
+        seed: Random seed for sample selection, so repeated runs select the same samples
+        kwargs: Backend options passed to `iter_annotation`
+        
+    Returns:
+        List of annotated samples
+    """
+    return list(chain.from_iterable(iter_annotation(
+        config=config,
+        samples=samples,
+        n_samples=n_samples,
+        num_proc=num_proc,
+        model=model,
+        verbose=verbose,
+        allowed_labels=allowed_labels,
+        cache_path=cache_path,
+        cache_max_size_mb=cache_max_size_mb,
+        seed=seed,
+        **kwargs,
+    )))
+
+
+def annotate_to_file(
+    config: Dict,
+    samples: Iterable[Dict],
+    output_path: str,
+    id_col: str = "id",
+    n_samples: int = None,
+    chunk_size: int = 100,
+    resume: bool = False,
+    **kwargs,
+) -> int:
+    """Annotate a dataset, appending each completed chunk to a jsonlines file.
+
+    With `resume`, sample ids already present in `output_path` are skipped, so an interrupted
+    job can be restarted with the same arguments and only the remaining samples are annotated.
+    Failed annotations (with a None output) are not written, so they are retried on resume.
+
+    Args:
+        config: Prompt configuration dictionary
+        samples: List or iterable of samples to annotate; each must have an `id_col` field
+        output_path: Path to the jsonlines output file
+        id_col: Field uniquely identifying each sample
+        n_samples: Total number of random samples to annotate, including previously completed ones
+        chunk_size: Number of samples annotated between checkpoints
+        resume: Skip samples already in `output_path`; if False, the file is overwritten
+        kwargs: Additional arguments passed to `iter_annotation`
+
+    Returns:
+        Number of samples annotated in this run
+    """
+    if not resume:
+        Path(output_path).unlink(missing_ok=True)
+
+    # Skip samples that were completed by a previous run
+    output_fields = [x["name"] for x in config.get("outputs", [])]
+    completed_ids = read_completed_ids(output_path, id_col, output_fields)
+    remaining = (x for x in samples if x[id_col] not in completed_ids)
+    if completed_ids:
+        print(f"Resuming: {len(completed_ids)} samples already annotated")
+    if n_samples is not None:
+        n_samples = max(n_samples - len(completed_ids), 0)
+
+    n_annotated, n_failed = 0, 0
+    for records in iter_annotation(config=config, samples=remaining, n_samples=n_samples, chunk_size=chunk_size, **kwargs):
+        annotated = [x for x in records if is_annotated(x, output_fields)]
+        append_records(annotated, output_path)
+        n_annotated += len(annotated)
+        n_failed += len(records) - len(annotated)
+    if n_failed:
+        print(f"{n_failed} samples failed and were not saved; rerun with --resume to retry them")
+    return n_annotated
 
 
 def annotate(
@@ -66,7 +288,21 @@ def annotate(
     num_proc: Annotated[int, Option(help="Number of processes to use")] = 1,
     model: Annotated[str, Option(help="LiteLLM model identifier")] = "claude-3-5-sonnet-20241022",
     verbose: Annotated[bool, Option(help="Stream output to stdout")] = False,
-    allowed_labels_path: Annotated[str, Option(help="Path to jsonlines file containing allowed labels")] = None
+    allowed_labels_path: Annotated[str, Option(help="Path to jsonlines file containing allowed labels")] = None,
+    cache_path: Annotated[str, Option(help="Path to a SQLite cache of model responses")] = None,
+    cache_max_size_mb: Annotated[float, Option(help="Maximum size of the response cache in megabytes")] = 1024,
+    seed: Annotated[int, Option(help="Random seed for sample selection")] = None,
+    id_col: Annotated[str, Option(help="Field uniquely identifying each sample (row numbers are used if missing)")] = "id",
+    chunk_size: Annotated[int, Option(help="Number of samples annotated between checkpoints")] = 100,
+    resume: Annotated[bool, Option(help="Skip samples already in the output file (otherwise it is overwritten)")] = False,
+    backend: Annotated[str, Option(help="Annotation backend: 'process' (num-proc processes) or 'async' (concurrent calls in one process)")] = "process",
+    max_concurrency: Annotated[int, Option(help="Maximum number of in-flight requests (async backend)")] = 64,
+    requests_per_minute: Annotated[float, Option(help="Provider requests per minute quota (async backend)")] = None,
+    tokens_per_minute: Annotated[float, Option(help="Provider input tokens per minute quota (async backend)")] = None,
+    stream: Annotated[bool, Option(help="Read the (jsonlines) input lazily instead of loading it into memory")] = False,
+    prompt_caching: Annotated[bool, Option(help="Send allowed labels in the cacheable prompt preamble and report cached tokens")] = False,
+    progress_interval: Annotated[float, Option(help="Seconds between progress lines (0 to disable)")] = 30,
+    prometheus_path: Annotated[str, Option(help="Path to write metrics in Prometheus text format")] = None
 ):
     """CLI entry point to run annotation on a dataset."""
     # Expand user paths
@@ -78,7 +314,12 @@ def annotate(
         config = yaml.safe_load(f)
     
     # Load data
-    samples = read_data(input_data_path)
+    if stream:
+        samples = (x if id_col in x else {id_col: i, **x} for i, x in enumerate(iter_jsonl(input_data_path)))
+    else:
+        samples = read_data(input_data_path)
+        if samples and id_col not in samples[0]:
+            samples = [{id_col: i, **x} for i, x in enumerate(samples)]
     
     # Load allowed labels if provided
     allowed_labels = None
@@ -86,19 +327,37 @@ def annotate(
         allowed_labels_path = str(Path(allowed_labels_path).expanduser())
         allowed_labels = read_data(allowed_labels_path)
     
-    # Run annotation
-    results = run_annotation(
-        config=config,
-        samples=samples,
-        n_samples=n_samples,
-        num_proc=num_proc,
-        model=model,
-        verbose=verbose,
-        allowed_labels=allowed_labels
-    )
-    
-    # Save results
-    write_data(results, output_data_path)
+    # Run annotation, saving results as each chunk completes
+    with AnnotationMetrics(progress_interval=progress_interval, prometheus_path=prometheus_path) as metrics:
+        n_annotated = annotate_to_file(
+            config=config,
+            samples=samples,
+            output_path=output_data_path,
+            id_col=id_col,
+            n_samples=n_samples,
+            chunk_size=chunk_size,
+            resume=resume,
+            num_proc=num_proc,
+            model=model,
+            verbose=verbose,
+            allowed_labels=allowed_labels,
+            cache_path=str(Path(cache_path).expanduser()) if cache_path else None,
+            cache_max_size_mb=cache_max_size_mb,
+            seed=seed,
+            backend=backend,
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            prompt_caching=prompt_caching,
+            metrics=metrics
+        )
+        print(f"Annotated {n_annotated} samples, saved to {output_data_path}")
+
+        # Save the metrics report next to the output data
+        metrics_path = str(Path(output_data_path).with_suffix(".metrics.json"))
+        metrics.write_report(metrics_path)
+        print(metrics.progress_line())
+        print(f"Saved annotation metrics to {metrics_path}")
 
 
 def main():
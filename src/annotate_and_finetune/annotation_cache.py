@@ -0,0 +1,143 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def cache_key(prompt_text: str, model: str, inputs: Dict) -> str:
+    """Compute a content hash identifying a single annotation request.
+
+    Args:
+        prompt_text: The rendered prompt template
+        model: LiteLLM model identifier
+        inputs: The input fields sent with the prompt
+
+    Returns:
+        Hex digest of the request content
+    """
+    payload = json.dumps(
+        {"prompt": prompt_text, "model": model, "inputs": inputs},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnnotationCache:
+    """Persistent SQLite cache of LLM annotation responses.
+
+    Responses are stored as json keyed by `cache_key`. When the total size of stored
+    responses exceeds `max_size_mb`, the least recently used entries are evicted.
+
+    `get_many` and `put_many` look up and store a chunk of responses in one transaction, and
+    the total size is tracked in memory (it is read once when the cache is opened), so each
+    chunk costs a single commit and no full-table scan.
+
+    Args:
+        path: Path to the SQLite database file
+        max_size_mb: Maximum total size of cached responses in megabytes
+    """
+
+    def __init__(self, path: str, max_size_mb: float = 1024):
+        self.path = str(Path(path).expanduser())
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.conn.commit()
+        self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _select(self, column: str, keys: List[str]) -> Dict[str, Any]:
+        """Select a column of the rows with the given keys, in batches below SQLite's variable limit."""
+        rows = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            query = f"SELECT key, {column} FROM responses WHERE key IN ({', '.join('?' * len(batch))})"
+            rows.update(self.conn.execute(query, batch).fetchall())
+        return rows
+
+    def get_many(self, keys: List[str]) -> List[Optional[Dict]]:
+        """Return the cached response for each key (None for misses), updating access times in one commit."""
+        values = self._select("value", list(set(keys)))
+        self.hits += sum(1 for key in keys if key in values)
+        self.misses += sum(1 for key in keys if key not in values)
+        if values:
+            now = time.time()
+            self.conn.executemany("UPDATE responses SET accessed = ? WHERE key = ?", [(now, key) for key in values])
+            self.conn.commit()
+        return [json.loads(values[key]) if key in values else None for key in keys]
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached response for a key, or None on a miss."""
+        return self.get_many([key])[0]
+
+    def put_many(self, items: Dict[str, Dict]):
+        """Store responses by key and evict old entries if the cache is over its size limit, in one commit."""
+        if not items:
+            return
+        values = {key: json.dumps(value, default=str) for key, value in items.items()}
+        # Replaced entries no longer count towards the total size
+        self.total_size -= sum(self._select("size", list(values)).values())
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO responses (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+            [(key, value, len(value), now) for key, value in values.items()]
+        )
+        self.total_size += sum(len(x) for x in values.values())
+        self._evict()
+        self.conn.commit()
+
+    def put(self, key: str, value: Dict):
+        """Store a response and evict old entries if the cache is over its size limit."""
+        self.put_many({key: value})
+
+    def size_bytes(self) -> int:
+        """Total size of all cached responses."""
+        return self.total_size
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits, without committing."""
+        excess = self.total_size - self.max_size_bytes
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+            self.total_size -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.evictions += len(keys)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in `max_size_bytes`."""
+        self._evict()
+        self.conn.commit()
+
+    def stats(self) -> Dict:
+        """Hit, miss and eviction counters for this session."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size_bytes": self.size_bytes(),
+        }
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
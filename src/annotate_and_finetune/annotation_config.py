@@ -0,0 +1,174 @@
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+import yaml
+
+from annotate_and_finetune.annotate import format_allowed_labels, run_annotation
+from annotate_and_finetune.batch_annotation import annotate_batches, iter_batches, pack_batches
+from annotate_and_finetune.cascade import annotate_cascade
+from annotate_and_finetune.metrics import AnnotationMetrics
+from annotate_and_finetune.token_estimation import get_token_estimator
+
+
+def build_annotation_configs(
+    task: str,
+    details: str,
+    context_col: str,
+    context_description: str,
+    id_col: str,
+) -> Tuple[Dict, Dict]:
+    """Build the single-sample and batch annotation prompt configurations.
+
+    Args:
+        task: Annotation task description
+        details: Additional task details
+        context_col: Field containing the text to annotate
+        context_description: Description of the text to annotate
+        id_col: Field uniquely identifying each sample
+
+    Returns:
+        Tuple of the single-sample and batch prompt configuration dictionaries
+    """
+    single_annotation_config = f"""\
+task: {task}
+details: {details}
+outputs:
+  - name: thinking
+    description: Begin by thinking step by step
+  - name: label
+    description: A label selected from `allowed_labels`
+    inputs:
+      - name: {context_col}
+        description: {context_description}
+      - name: allowed_labels
+        description: The set of allowed labels
+"""
+
+    batch_annotation_config = f"""\
+task: {task}
+details: {details}
+inputs:
+  - name: annotation_inputs
+    description: A table of annotation inputs
+  - name: allowed_labels
+    description: The set of allowed labels
+outputs:
+  - name: thinking
+    description: Begin by thinking step by step
+  - name: labels
+    type: jsonlines
+    description: A table with annotated labels
+    fields:
+      - name: {id_col}
+        description: An id from `annotation_inputs`
+      - name: label
+        description: A label selected from `allowed_labels`
+"""
+
+    return yaml.safe_load(single_annotation_config), yaml.safe_load(batch_annotation_config)
+
+
+def build_batches(
+    samples: Iterable[Dict], config: Dict, count_tokens: Callable[[str], int] = None
+) -> Iterator[List[Dict]]:
+    """Group samples into batch annotation requests as configured in a pipeline config.
+
+    If `annotation_token_budget` is set, samples are packed into each request until the
+    estimated tokens of the task, details, allowed labels and annotation inputs reach the
+    budget (at most `max_annotation_batch_size` samples). Otherwise, batches have a fixed
+    `annotation_batch_size`.
+
+    Args:
+        samples: Samples to batch
+        config: Pipeline configuration dictionary
+        count_tokens: Function counting the tokens in a string when packing (defaults to
+            counting with `annotation_tokenizer`)
+
+    Returns:
+        Iterator over batches of samples
+    """
+    id_col = config.get("id_col", "id")
+    context_col = config["context_col"]
+    token_budget = config.get("annotation_token_budget")
+    if token_budget is None:
+        return iter_batches(samples, config.get("annotation_batch_size", 10))
+
+    # Pack as many samples per request as fit in the budget left after the static prompt
+    count_tokens = count_tokens or get_token_estimator(config.get("annotation_tokenizer"))
+    classes_md = format_allowed_labels(config["allowed_labels"])
+    preamble_tokens = count_tokens(f"{config['task']}\n{config.get('details')}\n{classes_md}")
+    return pack_batches(
+        samples, id_col, context_col,
+        token_budget=token_budget - preamble_tokens,
+        max_batch_size=config.get("max_annotation_batch_size", 50),
+        count_tokens=count_tokens
+    )
+
+
+def annotation_kwargs_from_config(
+    config: Dict,
+    num_proc: int = 2,
+    verbose: bool = False,
+    backend: str = None,
+    metrics: AnnotationMetrics = None,
+) -> Dict:
+    """Collect the `run_annotation` options of a pipeline config.
+
+    Args:
+        config: Pipeline configuration dictionary
+        num_proc: Number of processes for annotation (process backend)
+        verbose: Enable verbose output
+        backend: Annotation backend (overrides the config)
+        metrics: Annotation metrics collector
+
+    Returns:
+        Keyword arguments for `run_annotation`, `annotate_batches` and `annotate_cascade`
+    """
+    cache_path = config.get("cache_path")
+    return dict(
+        num_proc=num_proc,
+        model=config.get("model", "anthropic/claude-3-sonnet-20240229"),
+        verbose=verbose,
+        allowed_labels=config["allowed_labels"],
+        cache_path=str(Path(cache_path).expanduser()) if cache_path is not None else None,
+        cache_max_size_mb=config.get("cache_max_size_mb", 1024),
+        backend=backend or config.get("annotation_backend", "process"),
+        max_concurrency=config.get("max_concurrency", 64),
+        requests_per_minute=config.get("requests_per_minute"),
+        tokens_per_minute=config.get("tokens_per_minute"),
+        prompt_caching=config.get("prompt_caching", False),
+        metrics=metrics,
+    )
+
+
+def annotate_samples(samples: List[Dict], config: Dict, **kwargs) -> List[Dict]:
+    """Annotate a list of samples with the annotation mode of a pipeline config.
+
+    Uses cascade annotation if `annotation_cascade` is set, single-sample prompts if
+    `annotation_batch_size` is 1, and batched prompts otherwise.
+
+    Args:
+        samples: Samples to annotate; each must have an `id_col` field
+        config: Pipeline configuration dictionary
+        kwargs: Annotation options (see `annotation_kwargs_from_config`)
+
+    Returns:
+        Annotated samples with a `label` field, without the `thinking` and `allowed_labels` fields
+    """
+    id_col = config.get("id_col", "id")
+    context_col = config["context_col"]
+    single_config, batch_config = build_annotation_configs(
+        config["task"], config.get("details"), context_col, config["context_description"], id_col
+    )
+    if config.get("annotation_cascade"):
+        records = annotate_cascade(single_config, samples, config["annotation_cascade"], **kwargs)
+    elif config.get("annotation_batch_size", 10) == 1:
+        records = run_annotation(config=single_config, samples=samples, **kwargs)
+    else:
+        records = annotate_batches(
+            batch_config, list(build_batches(samples, config)), id_col, context_col,
+            fallback_config=single_config,
+            max_retries=config.get("annotation_max_retries", 3),
+            **kwargs
+        )
+    return [{k: v for k, v in x.items() if k not in ("thinking", "allowed_labels")} for x in records]
@@ -0,0 +1,193 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List
+
+import litellm
+
+from llmpipe import PromptModule
+
+from annotate_and_finetune.metrics import AnnotationMetrics
+from annotate_and_finetune.token_estimation import estimate_request_tokens
+
+
+class TokenBucket:
+    """Token bucket that refills continuously at `rate_per_minute`.
+
+    Args:
+        rate_per_minute: Refill rate (and capacity) of the bucket
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` tokens are available and consume them."""
+        # Requests larger than the bucket would never fit; let them through once the bucket is full
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """Requests/min and tokens/min limits with a shared, adaptive backoff on rate limit errors.
+
+    When any request is rate limited, all requests pause. The pause doubles on consecutive
+    rate limit errors (up to `max_backoff` seconds) and resets after a successful request.
+
+    Args:
+        requests_per_minute: Maximum requests per minute (None for no limit)
+        tokens_per_minute: Maximum estimated input tokens per minute (None for no limit)
+        initial_backoff: Pause in seconds after the first rate limit error
+        max_backoff: Maximum pause in seconds
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = None,
+        tokens_per_minute: float = None,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.backoff = initial_backoff
+        self.paused_until = 0.0
+        self.n_rate_limited = 0
+
+    async def acquire(self, n_tokens: int):
+        """Wait for any backoff pause and for capacity in both buckets."""
+        delay = self.paused_until - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.paused_until - time.monotonic()
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            await self.tokens.acquire(n_tokens)
+
+    def on_success(self):
+        self.backoff = self.initial_backoff
+
+    def on_rate_limit(self):
+        """Pause all requests, with jitter, and increase the next pause."""
+        self.n_rate_limited += 1
+        pause = self.backoff * (1 + random.random())
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    """Check whether an exception is a provider rate limit (HTTP 429) error."""
+    return isinstance(e, litellm.RateLimitError) or getattr(e, "status_code", None) == 429
+
+
+async def _annotate_one(
+    prompt: PromptModule,
+    sample: Dict,
+    output_names: List[str],
+    limiter: RateLimiter,
+    executor: ThreadPoolExecutor,
+    semaphore: asyncio.Semaphore,
+    max_retries: int,
+) -> Dict:
+    """Annotate a single sample, retrying on rate limit errors."""
+    loop = asyncio.get_running_loop()
+    n_tokens = estimate_request_tokens(prompt.prompt, sample)
+    for attempt in range(max_retries + 1):
+        try:
+            # Wait for the limiter only once a slot is free, so a backoff pause also holds back
+            # calls that haven't started yet
+            async with semaphore:
+                await limiter.acquire(n_tokens)
+                response = await loop.run_in_executor(executor, partial(prompt, **sample))
+            limiter.on_success()
+            return sample | response
+        except Exception as e:
+            if is_rate_limit_error(e) and attempt < max_retries:
+                limiter.on_rate_limit()
+                continue
+            print(f"Annotation failed ({type(e).__name__}): {e}")
+            return sample | {name: None for name in output_names}
+
+
+async def _annotate_all(
+    prompt: PromptModule,
+    samples: List[Dict],
+    output_names: List[str],
+    max_concurrency: int,
+    limiter: RateLimiter,
+    max_retries: int,
+) -> List[Dict]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        return await asyncio.gather(*[
+            _annotate_one(prompt, sample, output_names, limiter, executor, semaphore, max_retries)
+            for sample in samples
+        ])
+
+
+def run_async_annotation(
+    prompt: PromptModule,
+    samples: List[Dict],
+    output_names: List[str] = None,
+    max_concurrency: int = 64,
+    requests_per_minute: float = None,
+    tokens_per_minute: float = None,
+    max_retries: int = 8,
+    metrics: AnnotationMetrics = None,
+) -> List[Dict]:
+    """Annotate samples concurrently from a single process.
+
+    Calls are scheduled on an asyncio event loop and throttled by requests/min and
+    tokens/min limits. `PromptModule` is synchronous, so in-flight calls run on a
+    thread pool of `max_concurrency` threads rather than one process per call.
+
+    If called from a running event loop (e.g. in Jupyter), the annotation loop runs in a
+    separate thread, blocking the caller until it finishes.
+
+    Args:
+        prompt: Initialized prompt module
+        samples: Prompt inputs, one dictionary per sample
+        output_names: Names of the prompt outputs, set to None for samples that fail
+        max_concurrency: Maximum number of in-flight requests
+        requests_per_minute: Provider requests per minute quota (None for no limit)
+        tokens_per_minute: Provider input tokens per minute quota (None for no limit)
+        max_retries: Maximum retries per sample after rate limit errors
+        metrics: If set, rate limit retries are counted in these metrics
+
+    Returns:
+        Samples merged with prompt outputs, in input order
+    """
+    limiter = RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+    coroutine = _annotate_all(prompt, samples, output_names or [], max_concurrency, limiter, max_retries)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        results = asyncio.run(coroutine)
+    else:
+        # asyncio.run can't be called from a running event loop, so start a new one in a thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            results = executor.submit(asyncio.run, coroutine).result()
+    if limiter.n_rate_limited:
+        print(f"Rate limited {limiter.n_rate_limited} times")
+        if metrics is not None:
+            metrics.add_retries("rate_limit", limiter.n_rate_limited)
+    return results
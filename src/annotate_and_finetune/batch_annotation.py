@@ -0,0 +1,170 @@
+import json
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
+
+from annotate_and_finetune.annotate import run_annotation
+from annotate_and_finetune.streaming import iter_chunks
+from annotate_and_finetune.token_estimation import estimate_tokens
+
+
+def format_batch(batch: List[Dict], id_col: str, context_col: str) -> str:
+    """Format a batch of samples as a jsonlines table of annotation inputs."""
+    return "\n".join([json.dumps({k: x[k] for k in (id_col, context_col)}) for x in batch])
+
+
+def iter_batches(samples: Iterable[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    """Group samples into fixed size batches."""
+    return iter_chunks(samples, batch_size)
+
+
+def pack_batches(
+    samples: Iterable[Dict],
+    id_col: str,
+    context_col: str,
+    token_budget: int,
+    max_batch_size: int = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[List[Dict]]:
+    """Group samples into batches whose formatted annotation inputs fit a token budget.
+
+    Samples are packed greedily in order. A sample that exceeds the budget on its own
+    is put in a batch by itself.
+
+    Args:
+        samples: Samples to batch
+        id_col: Field uniquely identifying each sample
+        context_col: Field containing the text to annotate
+        token_budget: Maximum tokens of annotation inputs per batch
+        max_batch_size: Maximum samples per batch (None for no limit)
+        count_tokens: Function mapping a string to its (estimated) number of tokens
+
+    Yields:
+        Batches of samples
+    """
+    batch, batch_tokens = [], 0
+    for sample in samples:
+        # Each sample is one line of the annotation inputs table
+        n_tokens = count_tokens(format_batch([sample], id_col, context_col)) + 1
+        if batch and (batch_tokens + n_tokens > token_budget or len(batch) == max_batch_size):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(sample)
+        batch_tokens += n_tokens
+    if batch:
+        yield batch
+
+
+def _collect_labels(
+    batches: List[List[Dict]],
+    responses: List[Dict],
+    id_col: str,
+    allowed: Set[str] = None,
+) -> Tuple[Dict[str, str], List[List[Dict]]]:
+    """Match batch responses to samples, returning valid labels by id and the unlabeled samples of each batch.
+
+    Ids that are not in the batch (hallucinated) and labels outside `allowed` are ignored.
+    """
+    labels = {}
+    missing = []
+    for batch, response in zip(batches, responses):
+        batch_ids = {str(x[id_col]) for x in batch}
+        for row in response.get("labels") or []:
+            if not isinstance(row, dict):
+                continue
+            sample_id = str(row.get(id_col))
+            label = row.get("label")
+            if sample_id not in batch_ids or sample_id in labels or label is None:
+                continue
+            if allowed is not None and label not in allowed:
+                continue
+            labels[sample_id] = label
+        missing.append([x for x in batch if str(x[id_col]) not in labels])
+    return labels, missing
+
+
+def annotate_batches(
+    config: Dict,
+    batches: List[List[Dict]],
+    id_col: str,
+    context_col: str,
+    fallback_config: Dict = None,
+    max_retries: int = 3,
+    **kwargs,
+) -> List[Dict]:
+    """Annotate batches of samples with one prompt per batch and join the labels back onto the samples.
+
+    Samples whose ids are missing from a response, or whose labels are not in `allowed_labels`,
+    are re-submitted in batches half the size of the batch they failed in. Samples that still
+    fail in a batch of one are annotated with the single-sample `fallback_config` prompt.
+
+    Args:
+        config: Batch annotation prompt configuration dictionary
+        batches: Batches of samples to annotate
+        id_col: Field uniquely identifying each sample
+        context_col: Field containing the text to annotate
+        fallback_config: Single-sample annotation prompt configuration (None to skip the fallback)
+        max_retries: Maximum number of re-batching rounds
+        kwargs: Additional arguments passed to `run_annotation`
+
+    Returns:
+        Annotated samples (samples that could not be labeled are dropped)
+    """
+    allowed_labels = kwargs.get("allowed_labels")
+    allowed = {x["label"] for x in allowed_labels} if allowed_labels else None
+    metrics = kwargs.get("metrics")
+    n_samples = sum(len(x) for x in batches)
+
+    labels = {}
+    failed_singles = []
+    pending = batches
+    n_first_pass = 0
+    for round_idx in range(max_retries + 1):
+        if not pending:
+            break
+        batched_samples = [{"annotation_inputs": format_batch(x, id_col, context_col)} for x in pending]
+        responses = run_annotation(config=config, samples=batched_samples, **kwargs)
+        round_labels, missing = _collect_labels(pending, responses, id_col, allowed)
+        labels.update(round_labels)
+        if round_idx == 0:
+            n_first_pass = len(labels)
+
+        # Re-batch the unlabeled samples of each batch at half the batch size
+        retry = []
+        for batch, batch_missing in zip(pending, missing):
+            if not batch_missing:
+                continue
+            if len(batch) == 1:
+                failed_singles.extend(batch_missing)
+                continue
+            retry.extend(iter_chunks(batch_missing, (len(batch) + 1) // 2))
+        pending = retry
+        if metrics is not None and retry and round_idx < max_retries:
+            metrics.add_retries("rebatch", sum(len(x) for x in retry))
+    n_rebatched = len(labels) - n_first_pass
+
+    # Fall back to single-sample prompts
+    n_fallback = 0
+    remaining = failed_singles + list(chain(*pending))
+    if remaining and fallback_config is not None:
+        if metrics is not None:
+            metrics.add_retries("single_sample", len(remaining))
+        responses = run_annotation(
+            config=fallback_config,
+            samples=[{k: x[k] for k in (id_col, context_col)} for x in remaining],
+            **kwargs
+        )
+        for response in responses:
+            label = response.get("label")
+            if label is not None and (allowed is None or label in allowed):
+                labels[str(response[id_col])] = label
+                n_fallback += 1
+
+    print(
+        f"Batch annotation: {n_first_pass}/{n_samples} labeled on the first pass, "
+        f"{n_rebatched} recovered by re-batching, {n_fallback} recovered by single-sample prompts, "
+        f"{n_samples - len(labels)} unlabeled"
+    )
+    return [
+        x | {"label": labels[str(x[id_col])]}
+        for x in chain(*batches) if str(x[id_col]) in labels
+    ]
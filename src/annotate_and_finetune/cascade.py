@@ -0,0 +1,163 @@
+from collections import Counter
+from copy import deepcopy
+from typing import Dict, List, Set
+
+from annotate_and_finetune.annotate import run_annotation
+
+
+CONFIDENCE_OUTPUT = {
+    "name": "confidence",
+    "description": "Your confidence that the label is correct, as a number between 0 and 1",
+}
+
+
+def add_confidence_output(config: Dict) -> Dict:
+    """Return a copy of a single-sample annotation config that also asks for a self-reported confidence."""
+    config = deepcopy(config)
+    if not any(x["name"] == CONFIDENCE_OUTPUT["name"] for x in config["outputs"]):
+        config["outputs"].append(dict(CONFIDENCE_OUTPUT))
+    return config
+
+
+def parse_confidence(value) -> float:
+    """Parse a self-reported confidence into [0, 1] (0 if missing or malformed)."""
+    try:
+        confidence = float(str(value).strip().rstrip("%"))
+    except (TypeError, ValueError):
+        return 0.0
+    if confidence > 1:
+        confidence /= 100
+    return min(max(confidence, 0.0), 1.0)
+
+
+def label_scores(valid_labels: List[str], confidence: float, allowed: Set[str] = None) -> List[Dict]:
+    """Estimate a label distribution for a sample from its valid votes.
+
+    With several votes, each label's score is its share of the valid votes. A single vote
+    has no spread, so its self-reported confidence is used as the score of its label and the
+    remainder is divided evenly between the other allowed labels.
+
+    Returns:
+        List of `label` and `score` dictionaries (a list rather than a mapping, so that the
+        records have a fixed schema), highest score first
+    """
+    counts = Counter(valid_labels)
+    if len(valid_labels) == 1 and allowed and len(allowed) > 1 and confidence > 0:
+        label = valid_labels[0]
+        rest = (1 - confidence) / (len(allowed) - 1)
+        scores = {x: rest for x in sorted(allowed)} | {label: confidence}
+    else:
+        scores = {x: n / len(valid_labels) for x, n in counts.items()}
+    return [{"label": x, "score": v} for x, v in sorted(scores.items(), key=lambda x: -x[1])]
+
+
+def aggregate_votes(responses: List[Dict], allowed: Set[str] = None) -> Dict:
+    """Combine the responses of several annotation votes for one sample.
+
+    Args:
+        responses: One response per vote, with `label` and `confidence` fields
+        allowed: Allowed labels (None to accept any label)
+
+    Returns:
+        Dictionary with the majority `label` (None if no vote is valid), its `agreement`
+        (share of all votes), mean `confidence` over the votes for it, and `label_scores`
+        (see `label_scores`)
+    """
+    labels = [x.get("label") for x in responses]
+    valid = [x for x in labels if x is not None and (allowed is None or x in allowed)]
+    if not valid:
+        return {"label": None, "agreement": 0.0, "confidence": 0.0, "label_scores": []}
+    label, n = Counter(valid).most_common(1)[0]
+    confidences = [parse_confidence(x.get("confidence")) for x in responses if x.get("label") == label]
+    confidence = sum(confidences) / len(confidences)
+    return {
+        "label": label,
+        "agreement": n / len(responses),
+        "confidence": confidence,
+        "label_scores": label_scores(valid, confidence, allowed),
+    }
+
+
+def escalation_reason(vote: Dict, confidence_threshold: float = None, min_agreement: float = 1.0) -> str:
+    """Return why a sample should go to the next tier ("invalid", "disagreement" or "low_confidence"), or None to accept it."""
+    if vote["label"] is None:
+        return "invalid"
+    if vote["agreement"] < min_agreement:
+        return "disagreement"
+    if confidence_threshold is not None and vote["confidence"] < confidence_threshold:
+        return "low_confidence"
+    return None
+
+
+def annotate_cascade(
+    config: Dict,
+    samples: List[Dict],
+    tiers: List[Dict],
+    **kwargs,
+) -> List[Dict]:
+    """Annotate samples with a cascade of models, escalating uncertain samples to the next tier.
+
+    Each tier labels the samples passed to it `n_votes` times. A sample is accepted at a tier
+    unless its majority label is invalid, the votes agree less than `min_agreement`, or the
+    mean self-reported confidence of the majority votes is below `confidence_threshold`.
+    Samples are accepted unconditionally at the last tier (except for invalid labels).
+
+    Votes after the first are not read from or written to the response cache, so they are
+    independent samples (set `temperature` in the tier to diversify them).
+
+    Args:
+        config: Single-sample annotation prompt configuration dictionary
+        samples: Samples to annotate
+        tiers: Tier dictionaries ordered from cheapest to strongest, each with a `model` and
+            optional `confidence_threshold`, `n_votes` (default 1), `min_agreement` (default 1.0)
+            and extra prompt settings (e.g. `temperature`)
+        kwargs: Additional arguments passed to `run_annotation`
+
+    Returns:
+        Annotated samples with `label`, `confidence`, `agreement`, `label_scores` and
+        `annotation_model` fields (samples without a valid label at the last tier are dropped)
+    """
+    allowed_labels = kwargs.get("allowed_labels")
+    allowed = {x["label"] for x in allowed_labels} if allowed_labels else None
+    kwargs.pop("model", None)
+    config = add_confidence_output(config)
+
+    records = []
+    pending = samples
+    for tier_idx, tier in enumerate(tiers):
+        if not pending:
+            break
+        is_last = tier_idx == len(tiers) - 1
+        tier = dict(tier)
+        model = tier.pop("model")
+        n_votes = tier.pop("n_votes", 1)
+        confidence_threshold = tier.pop("confidence_threshold", None)
+        min_agreement = tier.pop("min_agreement", 1.0)
+        tier_config = config | tier
+
+        votes = []
+        for vote_idx in range(n_votes):
+            vote_kwargs = kwargs | {"cache_path": None} if vote_idx > 0 else kwargs
+            votes.append(run_annotation(config=dict(tier_config), samples=pending, model=model, **vote_kwargs))
+
+        escalated = []
+        reasons = Counter()
+        for i, sample in enumerate(pending):
+            responses = [x[i] for x in votes]
+            vote = aggregate_votes(responses, allowed)
+            reason = escalation_reason(vote, confidence_threshold, min_agreement)
+            if reason is not None and not (is_last and reason != "invalid"):
+                reasons[reason] += 1
+                escalated.append(sample)
+                continue
+            record = {k: v for k, v in responses[0].items() if k not in ("label", "confidence")}
+            records.append(record | vote | {"annotation_model": model})
+
+        reasons_str = ", ".join(f"{n} {reason}" for reason, n in reasons.items()) or "none"
+        action = "dropped" if is_last else "escalated"
+        print(
+            f"Cascade tier {tier_idx + 1} ({model}, {n_votes} vote{'s' if n_votes > 1 else ''}): "
+            f"{len(pending) - len(escalated)}/{len(pending)} accepted, {len(escalated)} {action} ({reasons_str})"
+        )
+        pending = escalated
+    return records
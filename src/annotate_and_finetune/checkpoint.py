@@ -0,0 +1,70 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+
+
+def repair_jsonl(path: str):
+    """Truncate a partially written trailing line left behind by an interrupted run."""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+
+        # Scan backwards for the last complete line
+        pos = size
+        while pos > 0:
+            step = min(65536, pos)
+            pos -= step
+            f.seek(pos)
+            idx = f.read(step).rfind(b"\n")
+            if idx != -1:
+                f.truncate(pos + idx + 1)
+                return
+        f.truncate(0)
+
+
+def is_annotated(record: Dict, output_fields: Iterable[str]) -> bool:
+    """Check that a record has a value for every output field (failed annotations have None outputs)."""
+    return all(record.get(k) is not None for k in output_fields)
+
+
+def read_completed_ids(path: str, id_col: str, output_fields: Iterable[str] = ()) -> Set:
+    """Read the ids of samples already written to a jsonlines output file.
+
+    Records with a None output field are failed annotations, and are not counted as
+    completed so they are retried.
+
+    Args:
+        path: Path to the jsonlines output file
+        id_col: Field uniquely identifying each sample
+        output_fields: Fields that must not be None for a sample to count as completed
+
+    Returns:
+        Set of completed sample ids (empty if the file does not exist)
+    """
+    if not Path(path).exists():
+        return set()
+    repair_jsonl(path)
+    completed_ids = set()
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if is_annotated(record, output_fields):
+                    completed_ids.add(record[id_col])
+    return completed_ids
+
+
+def append_records(records: List[Dict], path: str):
+    """Append records to a jsonlines file and flush them to disk."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
@@ -12,6 +12,7 @@ from llmpipe.prompt_module2 import PromptModule2
 def generate_data_schema(
     data_sample_path: Annotated[str, Option(help="Path to dataset samples")],
     output_path: Annotated[str, Option(help="Path to save the schema")] = None,
+    data_summary_path: Annotated[str, Option(help="Path to column summaries of the full dataset")] = None,
     model: Annotated[str, Option(help="A LiteLLM model identifier")] = "claude-3-5-sonnet-20241022-v2",
     verbose: Annotated[bool, Option(help="Stream output to stdout")] = False
 ):
@@ -19,12 +20,18 @@ def generate_data_schema(
     # Read the data
     with open(data_sample_path, "r") as f:
         data_sample = f.read()
+    inputs = [
+        Input("data_samples", "A small set of examples from a dataset"),
+    ]
+    input_values = {"data_samples": data_sample}
+    if data_summary_path:
+        with open(data_summary_path, "r") as f:
+            input_values["data_summary"] = f.read()
+        inputs.append(Input("data_summary", "Statistics and most frequent values of each column of the full dataset"))
 
     module = PromptModule2(
         task="Generate a schema for a dataset as a markdown table. Columns should include name, type, and description.",
-        inputs=[
-            Input("data_samples", "A small set of examples from a dataset"),
-        ],
+        inputs=inputs,
         outputs=[
             Output("thinking", "Begin by thinking step by step"),
             Output("data_schema", "The data schema as a markdown table")
@@ -32,7 +39,7 @@ def generate_data_schema(
         model=model,
         verbose=verbose
     )
-    response = module(data_samples=data_sample)
+    response = module(**input_values)
 
     # Save schema if output path provided
     if output_path:
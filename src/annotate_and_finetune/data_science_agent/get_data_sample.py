@@ -7,6 +7,7 @@ from typer import Option
 import polars as pl
 
 from llmpipe import read_data
+from annotate_and_finetune.streaming import reservoir_sample, sample_jsonl
 
 
 def truncate_value(value: Any, max_len: int = 500, max_items: int = 5) -> Any:
@@ -29,27 +30,59 @@ def truncate_sample(sample: Dict[str, Any]) -> Dict[str, Any]:
     return {k: truncate_value(v) for k, v in sample.items()}
 
 
-def get_data_sample(
-    data_path: Annotated[str, Option(help="Dataset path")],
-    n_samples: Annotated[int, Option("-n", "--n-samples", help="Number of samples to print")] = 5,
-    output_path: Annotated[str, Option(help="Path to save the samples")] = None
-):
-    """Print random samples from a dataset with truncated long values and optionally save them."""
+def load_samples(data_path: str, n_samples: int, sampling: str = "auto", seed: int = None) -> List[Dict[str, Any]]:
+    """Randomly sample records from a dataset.
+
+    Args:
+        data_path: Dataset path
+        n_samples: Number of records to sample
+        sampling: "index" seeks to randomly chosen lines of a jsonlines file, "reservoir" samples
+            the lines of a jsonlines file in a single pass, and "full" loads the whole dataset.
+            "auto" uses "index" for jsonlines files and "full" otherwise.
+        seed: Random seed
+
+    Returns:
+        List of at most `n_samples` records
+    """
+    if sampling == "auto":
+        sampling = "index" if data_path.endswith(".jsonl") else "full"
+    if sampling == "index":
+        return sample_jsonl(data_path, n_samples, seed)
+    if sampling == "reservoir":
+        with open(data_path, "rb") as f:
+            lines = reservoir_sample((line for line in f if line.strip()), n_samples, seed)
+        return [json.loads(line) for line in lines]
+    if sampling != "full":
+        raise ValueError(f"Unknown sampling mode: {sampling}")
+
     # Read the data
     samples = read_data(data_path)
-    
+
     # Convert to DataFrame
     df = pl.from_dicts(samples, infer_schema_length=100000)
-    
+
     # Get random samples
     total_rows = len(df)
-    n_samples = min(n_samples, total_rows)
-    random_indices = random.sample(range(total_rows), n_samples)
-    
-    # Get samples
-    samples = [df.row(idx, named=True) for idx in random_indices]
+    random_indices = random.Random(seed).sample(range(total_rows), min(n_samples, total_rows))
+    return [df.row(idx, named=True) for idx in random_indices]
+
+
+def get_data_sample(
+    data_path: Annotated[str, Option(help="Dataset path")],
+    n_samples: Annotated[int, Option("-n", "--n-samples", help="Number of samples to print")] = 5,
+    output_path: Annotated[str, Option(help="Path to save the samples")] = None,
+    sampling: Annotated[str, Option(help="Sampling mode: auto, index or reservoir (jsonlines only), or full")] = "auto",
+    seed: Annotated[int, Option(help="Random seed")] = None
+):
+    """Print random samples from a dataset with truncated long values and optionally save them.
+
+    By default, jsonlines files are sampled by seeking to randomly chosen lines, without loading
+    the dataset, so sampling takes seconds regardless of the dataset size.
+    """
+    samples = load_samples(data_path, n_samples, sampling, seed)
+    n_samples = len(samples)
     truncated_samples = [truncate_sample(sample) for sample in samples]
-    
+
     # Either print samples or save to file
     if output_path:
         with open(output_path, "w") as f:
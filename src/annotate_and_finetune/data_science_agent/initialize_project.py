@@ -7,13 +7,15 @@ from annotate_and_finetune.data_science_agent.initialize_repo import initialize_
 from annotate_and_finetune.data_science_agent.get_data_sample import get_data_sample
 from annotate_and_finetune.data_science_agent.generate_data_schema import generate_data_schema
 from annotate_and_finetune.data_science_agent.git_commit import git_commit
+from annotate_and_finetune.summarize_dataframe import summarize_data
 
 
 def initialize_project(
     repo_path: Annotated[str, Option(help="Directory to initialize project in")],
     data_path: Annotated[str, Option(help="Dataset path")],
     model: Annotated[str, Option(help="A LiteLLM model identifier")] = "claude-3-5-sonnet-20241022-v2",
-    verbose: Annotated[bool, Option(help="Stream output to stdout")] = False
+    verbose: Annotated[bool, Option(help="Stream output to stdout")] = False,
+    summary_max_rows: Annotated[int, Option(help="Summarize a random sample of at most this many rows")] = 10000,
 ):
     """Initialize a project."""
     initialize_repo(
@@ -24,9 +26,15 @@ def initialize_project(
         n_samples=3,
         output_path=f"{repo_path}/sample_data.md"
     )
+    summarize_data(
+        data_path=data_path,
+        output_path=f"{repo_path}/data_summary.md",
+        max_rows=summary_max_rows
+    )
     generate_data_schema(
         data_sample_path=f"{repo_path}/sample_data.md",
         output_path=f"{repo_path}/data_schema.md",
+        data_summary_path=f"{repo_path}/data_summary.md",
         model=model,
         verbose=verbose
     )
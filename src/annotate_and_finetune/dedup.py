@@ -0,0 +1,154 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import re
+import zlib
+
+import numpy as np
+
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def shingle_hashes(text: str, k: int = 5) -> np.ndarray:
+    """Hash the character `k`-grams of a text, after lowercasing and collapsing whitespace."""
+    text = re.sub(r"\s+", " ", str(text).lower()).strip()
+    shingles = {text[i:i + k] for i in range(max(len(text) - k + 1, 1))}
+    return np.array([zlib.crc32(x.encode("utf-8")) for x in shingles], dtype=np.uint64)
+
+
+def minhash_signatures(texts: List[str], num_perm: int = 128, k: int = 5, seed: int = 0) -> np.ndarray:
+    """Compute MinHash signatures of texts from their character shingles.
+
+    Returns:
+        Array of shape (len(texts), num_perm); the share of equal signature values of two texts
+        estimates the Jaccard similarity of their shingle sets
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = shingle_hashes(text, k)
+        signatures[i] = ((a[:, None] * hashes[None, :] + b[:, None]) % MERSENNE_PRIME).min(axis=1)
+    return signatures
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Choose the bands and rows per band of a MinHash LSH index for a Jaccard threshold.
+
+    Pairs with similarity s collide in at least one band with probability 1 - (1 - s^rows)^bands,
+    which rises steeply around (1 / bands)^(1 / rows); the split closest to the threshold is used.
+    """
+    splits = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(splits, key=lambda x: abs((1 / x[0]) ** (1 / x[1]) - threshold))
+
+
+def cluster_near_duplicates(signatures: np.ndarray, threshold: float = 0.8) -> List[int]:
+    """Group near-duplicate rows with MinHash LSH.
+
+    Rows sharing an LSH bucket are merged when their estimated Jaccard similarity is at
+    least `threshold`, so only candidate pairs are compared rather than all pairs.
+
+    Args:
+        signatures: MinHash signatures, one row per sample
+        threshold: Minimum estimated Jaccard similarity of near-duplicates
+
+    Returns:
+        The cluster of each row, given as the index of the cluster's first row
+    """
+    n, num_perm = signatures.shape
+    bands, rows = lsh_params(num_perm, threshold)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+            buckets[key].append(i)
+        for members in buckets.values():
+            first = members[0]
+            for i in members[1:]:
+                root_first, root_i = find(first), find(i)
+                if root_first == root_i:
+                    continue
+                if (signatures[first] == signatures[i]).mean() >= threshold:
+                    parent[max(root_first, root_i)] = min(root_first, root_i)
+    return [find(i) for i in range(n)]
+
+
+def dedup_samples(
+    samples: List[Dict],
+    context_col: str,
+    threshold: float = 0.8,
+    num_perm: int = 128,
+    shingle_size: int = 5,
+) -> Tuple[List[Dict], Dict[int, List[Dict]]]:
+    """Reduce samples to one representative per cluster of near-duplicate `context_col` texts.
+
+    Args:
+        samples: Samples to deduplicate
+        context_col: Field containing the text to compare
+        threshold: Minimum estimated Jaccard similarity of near-duplicates
+        num_perm: Number of MinHash permutations
+        shingle_size: Characters per shingle
+
+    Returns:
+        Tuple of the representative samples (the first sample of each cluster) and the other
+        members of each cluster, keyed by the representative's position in `samples`
+    """
+    signatures = minhash_signatures([x[context_col] for x in samples], num_perm, shingle_size)
+    clusters = cluster_near_duplicates(signatures, threshold)
+    members = defaultdict(list)
+    for i, cluster in enumerate(clusters):
+        if i != cluster:
+            members[cluster].append(samples[i])
+    representatives = [x for i, x in enumerate(samples) if clusters[i] == i]
+    return representatives, dict(members)
+
+
+def propagate_labels(
+    annotated: List[Dict],
+    samples: List[Dict],
+    members: Dict[int, List[Dict]],
+    id_col: str,
+) -> List[Dict]:
+    """Copy the annotations of representatives to the members of their near-duplicate clusters.
+
+    Each record gets a `dedup_cluster` field with its representative's id, so near-duplicates
+    can be kept in the same split.
+
+    Args:
+        annotated: Annotated representatives
+        samples: All samples, as passed to `dedup_samples`
+        members: Cluster members by representative position, as returned by `dedup_samples`
+        id_col: Field uniquely identifying each sample
+
+    Returns:
+        Annotated representatives and cluster members
+    """
+    position = {x[id_col]: i for i, x in enumerate(samples)}
+    records = []
+    for record in annotated:
+        cluster_id = record[id_col]
+        records.append(record | {"dedup_cluster": cluster_id})
+        # Members take the representative's annotation fields but keep their own input fields
+        annotation = {k: v for k, v in record.items() if k not in samples[position[cluster_id]]}
+        for member in members.get(position[cluster_id], []):
+            records.append(member | annotation | {"dedup_cluster": cluster_id})
+    return records
+
+
+def format_dedup_report(n_samples: int, n_representatives: int, n_annotated: int, n_propagated: int) -> str:
+    """Describe how many annotation calls were saved by near-duplicate removal."""
+    saved = n_samples - n_representatives
+    return (
+        f"Dedup: {n_samples} samples in {n_representatives} near-duplicate clusters "
+        f"({saved} samples, {saved / n_samples:.1%}, not sent for annotation); "
+        f"{n_propagated} labels propagated from {n_annotated} annotated representatives"
+        if n_samples else "Dedup: no samples"
+    )
@@ -0,0 +1,207 @@
+import json
+import math
+from pathlib import Path
+from typing import Annotated, Callable, Dict, List
+
+import typer
+import yaml
+from typer import Option
+
+from llmpipe import PromptModule
+
+from annotate_and_finetune.annotate import format_allowed_labels
+from annotate_and_finetune.annotation_config import build_annotation_configs, build_batches
+from annotate_and_finetune.batch_annotation import format_batch
+from annotate_and_finetune.prompt_cache import inline_allowed_labels
+from annotate_and_finetune.streaming import iter_jsonl, reservoir_sample
+from annotate_and_finetune.token_estimation import get_token_estimator
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0
+
+
+def _prompt_tokens(config: Dict, classes_md: str, prompt_caching: bool, count_tokens: Callable[[str], int]) -> int:
+    """Count the tokens of the static prompt (template plus allowed labels)."""
+    if prompt_caching:
+        return count_tokens(PromptModule(**inline_allowed_labels(config, classes_md)).prompt)
+    return count_tokens(PromptModule(**config).prompt) + count_tokens(classes_md)
+
+
+def estimate_costs(
+    n_requests: int,
+    input_tokens_per_request: float,
+    output_tokens_per_request: float,
+    model: str,
+    concurrency: int,
+    requests_per_minute: float = None,
+    tokens_per_minute: float = None,
+    base_latency: float = 1.0,
+    output_tokens_per_second: float = 50,
+) -> Dict:
+    """Project total tokens, cost and duration for a number of requests.
+
+    Duration is the slowest of the concurrency-bound time (each request takes `base_latency`
+    plus its output generation time) and the requests/min and tokens/min quotas.
+    """
+    input_tokens = n_requests * input_tokens_per_request
+    output_tokens = n_requests * output_tokens_per_request
+    try:
+        import litellm
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model, prompt_tokens=int(input_tokens), completion_tokens=int(output_tokens)
+        )
+        cost = prompt_cost + completion_cost
+    except Exception:
+        cost = None
+
+    latency = base_latency + output_tokens_per_request / output_tokens_per_second
+    durations = [n_requests * latency / max(concurrency, 1)]
+    if requests_per_minute:
+        durations.append(n_requests / requests_per_minute * 60)
+    if tokens_per_minute:
+        durations.append(input_tokens / tokens_per_minute * 60)
+
+    return {
+        "requests": n_requests,
+        "input_tokens_per_request": round(input_tokens_per_request),
+        "output_tokens_per_request": round(output_tokens_per_request),
+        "input_tokens": round(input_tokens),
+        "output_tokens": round(output_tokens),
+        "cost_usd": cost,
+        "duration_minutes": max(durations) / 60,
+    }
+
+
+def estimate(
+    config_path: Annotated[str, Option(help="Path to the pipeline YAML config file")],
+    n_rows: Annotated[int, Option(help="Number of random rows to render prompts for")] = 200,
+    tokenizer: Annotated[str, Option(help="Local or HuggingFace tokenizer path (defaults to LiteLLM's tokenizer for the model)")] = None,
+    num_proc: Annotated[int, Option(help="Number of processes for annotation (process backend)")] = 2,
+    max_concurrency: Annotated[int, Option(help="Maximum in-flight requests (async backend, overrides the config)")] = None,
+    requests_per_minute: Annotated[float, Option(help="Requests per minute quota (overrides the config)")] = None,
+    tokens_per_minute: Annotated[float, Option(help="Input tokens per minute quota (overrides the config)")] = None,
+    thinking_tokens: Annotated[int, Option(help="Assumed output tokens of the `thinking` output per request")] = 150,
+    label_tokens: Annotated[int, Option(help="Assumed output tokens per label")] = 15,
+    base_latency: Annotated[float, Option(help="Assumed seconds per request before output generation")] = 1.0,
+    output_tokens_per_second: Annotated[float, Option(help="Assumed output generation speed")] = 50,
+    output_path: Annotated[str, Option(help="Path to save the estimate as json")] = None,
+):
+    """Estimate the requests, tokens, cost and duration of annotating with a pipeline config, without calling a model."""
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+
+    model = config.get("model", "anthropic/claude-3-sonnet-20240229")
+    id_col = config.get("id_col", "id")
+    context_col = config["context_col"]
+    data_path = str(Path(config["data_path"]).expanduser())
+    n_samples = config.get("n_samples", 10)
+    annotation_batch_size = config.get("annotation_batch_size", 10)
+    prompt_caching = config.get("prompt_caching", False)
+    backend = config.get("annotation_backend", "process")
+    concurrency = (max_concurrency or config.get("max_concurrency", 64)) if backend == "async" else num_proc
+    requests_per_minute = requests_per_minute or config.get("requests_per_minute")
+    tokens_per_minute = tokens_per_minute or config.get("tokens_per_minute")
+
+    # Count rows and sample some in a single pass over the data
+    n_total = 0
+
+    def counted_rows():
+        nonlocal n_total
+        for i, x in enumerate(iter_jsonl(data_path)):
+            n_total += 1
+            yield x if id_col in x else {id_col: i, **x}
+
+    rows = reservoir_sample(counted_rows(), n_rows, seed=0)
+    print(f"Rendering prompts for {len(rows)} of {n_total} rows from {data_path}")
+
+    count_tokens = get_token_estimator(tokenizer, model=None if tokenizer else model)
+    classes_md = format_allowed_labels(config["allowed_labels"])
+    single_config, batch_config = build_annotation_configs(
+        config["task"], config.get("details"), context_col, config["context_description"], id_col
+    )
+
+    # Single-sample prompts
+    single_prompt_tokens = _prompt_tokens(single_config, classes_md, prompt_caching, count_tokens)
+    single_input_tokens = single_prompt_tokens + _mean([count_tokens(str(x[context_col])) for x in rows])
+
+    # Batched prompts, packed with the chosen tokenizer if there is one (as the pipeline would with it
+    # as `annotation_tokenizer`)
+    batches = list(build_batches(rows, config, count_tokens if tokenizer else None))
+    mean_batch_size = _mean([len(x) for x in batches]) or 1
+    batch_prompt_tokens = _prompt_tokens(batch_config, classes_md, prompt_caching, count_tokens)
+    batch_input_tokens = batch_prompt_tokens + _mean([count_tokens(format_batch(x, id_col, context_col)) for x in batches])
+
+    # Number of samples the configured mode annotates (n_samples counts batches in batch mode;
+    # cascades annotate one sample per request)
+    annotation_cascade = config.get("annotation_cascade")
+    if annotation_batch_size == 1 or annotation_cascade:
+        n_annotated = min(n_samples, n_total) if n_samples is not None else n_total
+    else:
+        n_annotated = min(round(n_samples * mean_batch_size), n_total) if n_samples is not None else n_total
+
+    cost_kwargs = dict(
+        model=model,
+        concurrency=concurrency,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        base_latency=base_latency,
+        output_tokens_per_second=output_tokens_per_second,
+    )
+    estimates = {
+        "single": estimate_costs(
+            n_annotated, single_input_tokens, thinking_tokens + label_tokens, **cost_kwargs
+        ),
+        "batch": estimate_costs(
+            math.ceil(n_annotated / mean_batch_size), batch_input_tokens,
+            thinking_tokens + label_tokens * mean_batch_size, **cost_kwargs
+        ) | {"mean_batch_size": round(mean_batch_size, 2)},
+    }
+    # Cascades have no estimate of their own, since the share of escalated samples isn't known up front
+    if annotation_cascade:
+        configured_mode = "cascade"
+    else:
+        configured_mode = "single" if annotation_batch_size == 1 else "batch"
+
+    print(f"\nModel: {model}")
+    print(f"Samples to annotate: {n_annotated}")
+    print(f"Concurrency: {concurrency} ({backend} backend)")
+    for mode, result in estimates.items():
+        marker = " (configured)" if mode == configured_mode else ""
+        cost = f"${result['cost_usd']:.2f}" if result["cost_usd"] is not None else "unknown"
+        print(f"\n{mode.capitalize()} mode{marker}:")
+        if mode == "batch":
+            print(f"- Mean batch size: {result['mean_batch_size']}")
+        print(f"- Requests: {result['requests']}")
+        print(f"- Input tokens: {result['input_tokens']} ({result['input_tokens_per_request']} per request)")
+        print(f"- Output tokens: {result['output_tokens']} ({result['output_tokens_per_request']} per request)")
+        print(f"- Cost: {cost}")
+        print(f"- Duration: {result['duration_minutes']:.1f} minutes")
+    if annotation_cascade:
+        print(
+            f"\nThe configured model cascade ({' -> '.join(x['model'] for x in annotation_cascade)}) is not estimated: "
+            f"the estimates are for annotating every sample with {model} alone, and each cascade stage "
+            "adds requests for the samples it escalates."
+        )
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump({
+                "model": model,
+                "rows": n_total,
+                "samples": n_annotated,
+                "configured_mode": configured_mode,
+                "estimates": estimates,
+            }, f, indent=2)
+        print(f"\nSaved estimate to {output_path}")
+
+
+def main():
+    """CLI entry point."""
+    app = typer.Typer(add_completion=False, pretty_exceptions_show_locals=False)
+    app.command()(estimate)
+    app()
+
+
+if __name__ == "__main__":
+    main()
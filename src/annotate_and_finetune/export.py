@@ -0,0 +1,264 @@
+from pathlib import Path
+from typing import Annotated, Callable, Dict, List
+import json
+import os
+import time
+
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+import typer
+from typer import Option
+
+from llmpipe import read_data
+from annotate_and_finetune.finetune import resolve_max_length
+from annotate_and_finetune.streaming import iter_chunks
+
+
+def quantize_dynamic(model) -> torch.nn.Module:
+    """Quantize the linear layers of a model to int8 with dynamic activation quantization."""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def save_quantized(model, path: str) -> str:
+    """Save the weights of a quantized model and its config to a directory.
+
+    Only the state dict is saved (not the pickled module), so loading doesn't depend on the
+    model's class paths. Reload the model with `load_quantized`.
+
+    Returns:
+        Path to the saved weights
+    """
+    os.makedirs(path, exist_ok=True)
+    model.config.save_pretrained(path)
+    weights_path = f"{path}/model_int8.pt"
+    torch.save(model.state_dict(), weights_path)
+    return weights_path
+
+
+def load_quantized(path: str) -> torch.nn.Module:
+    """Load a model saved by `save_quantized`: build the model from its config, quantize it and load the int8 weights."""
+    model = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(path))
+    model = quantize_dynamic(model.eval())
+    model.load_state_dict(torch.load(f"{path}/model_int8.pt"))
+    return model
+
+
+def export_onnx(model, tokenizer, path: str, opset_version: int = 17):
+    """Export a sequence classification model to ONNX with dynamic batch and sequence axes."""
+    dummy = tokenizer(["An example input"], return_tensors="pt")
+    input_names = [x for x in ("input_ids", "attention_mask") if x in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    # Tracing can't save inference-mode tensors, so only disable gradients
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[x] for x in input_names),
+            path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+        )
+
+
+def _onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError:
+        raise ImportError("ONNX export requires onnxruntime: pip install onnxruntime")
+    return onnxruntime
+
+
+def onnx_runner(path: str, num_threads: int = None) -> Callable[[Dict], np.ndarray]:
+    """Create an ONNX Runtime session, returning a function mapping a padded batch to logits."""
+    ort = _onnxruntime()
+    options = ort.SessionOptions()
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    input_names = [x.name for x in session.get_inputs()]
+    return lambda batch: session.run(["logits"], {k: batch[k].numpy() for k in input_names})[0]
+
+
+def torch_runner(model) -> Callable[[Dict], np.ndarray]:
+    """Return a function mapping a padded batch to logits with a torch model."""
+    def run(batch):
+        with torch.inference_mode():
+            return model(**batch).logits.numpy()
+    return run
+
+
+def evaluate_runner(
+    run_batch: Callable[[Dict], np.ndarray],
+    tokenizer,
+    texts: List[str],
+    labels: List[int],
+    batch_size: int = 32,
+    max_length: int = None,
+    n_latency: int = 100,
+) -> Dict:
+    """Measure the accuracy, batched throughput and single-sample latency of a model.
+
+    Args:
+        run_batch: Function mapping a padded batch of inputs to logits
+        tokenizer: Tokenizer
+        texts: Inputs to classify
+        labels: Label ids of the inputs
+        batch_size: Samples per forward pass when measuring throughput
+        max_length: Maximum tokens per sample
+        n_latency: Number of samples to classify one at a time when measuring latency
+
+    Returns:
+        Dictionary of accuracy, predictions, throughput and latency metrics
+    """
+    max_length = resolve_max_length(tokenizer, max_length)
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)
+    features = [{k: v[i] for k, v in encodings.items()} for i in range(len(texts))]
+    # Sort by length so each batch is padded to a similar length
+    order = sorted(range(len(texts)), key=lambda i: len(features[i]["input_ids"]))
+
+    # Warm up (e.g. allocations and kernel selection) before timing, so the first variant isn't penalized
+    if order:
+        run_batch(tokenizer.pad([features[i] for i in order[:batch_size]], return_tensors="pt"))
+
+    predictions = [None] * len(texts)
+    start = time.perf_counter()
+    for batch_idx in iter_chunks(order, batch_size):
+        batch = tokenizer.pad([features[i] for i in batch_idx], return_tensors="pt")
+        for i, pred in zip(batch_idx, run_batch(batch).argmax(-1).tolist()):
+            predictions[i] = pred
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for feature in features[:n_latency]:
+        batch = tokenizer.pad([feature], return_tensors="pt")
+        start = time.perf_counter()
+        run_batch(batch)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "accuracy": float(np.mean([p == y for p, y in zip(predictions, labels)])) if labels else None,
+        "predictions": predictions,
+        "samples_per_second": len(texts) / elapsed if elapsed else None,
+        "latency_ms_p50": float(np.percentile(latencies, 50) * 1000) if latencies else None,
+        "latency_ms_p90": float(np.percentile(latencies, 90) * 1000) if latencies else None,
+    }
+
+
+def _size_mb(path: str) -> float:
+    """Size of a model file, or of the weight files of a saved HF model directory."""
+    path = Path(path)
+    files = [path] if path.is_file() else [*path.glob("*.safetensors"), *path.glob("*.bin")]
+    return sum(x.stat().st_size for x in files) / 2 ** 20
+
+
+def _format(value: float, spec: str) -> str:
+    """Format a metric, showing missing values (e.g. accuracy without test labels) as n/a."""
+    return "n/a" if value is None else format(value, spec)
+
+
+def format_export_report(report: Dict[str, Dict]) -> str:
+    """Format export results by model variant as a markdown table."""
+    lines = [
+        "| Model | Accuracy | Delta | Agreement | Samples/s | Latency p50 (ms) | Size (MB) |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for name, result in report.items():
+        lines.append(
+            f"| {name} | {_format(result['accuracy'], '.4f')} | {_format(result['accuracy_delta'], '+.4f')} | "
+            f"{_format(result['agreement_with_fp32'], '.4f')} | {_format(result['samples_per_second'], '.1f')} | "
+            f"{_format(result['latency_ms_p50'], '.1f')} | {_format(result['size_mb'], '.1f')} |"
+        )
+    return "\n".join(lines)
+
+
+def export(
+    model_path: Annotated[str, Option(help="Path to a model saved by finetune")],
+    test_input_data_path: Annotated[str, Option(help="Path to the test data to verify accuracy on")],
+    output_path: Annotated[str, Option(help="Path to save exported models and the export report")] = None,
+    input_field: Annotated[str, Option(help="The field to use as input to the transformer")] = "text",
+    quantize: Annotated[bool, Option(help="Export a dynamically quantized (int8) torch model")] = True,
+    onnx: Annotated[bool, Option(help="Export an ONNX model (and an int8 ONNX model with --quantize); requires onnxruntime")] = False,
+    batch_size: Annotated[int, Option(help="Samples per forward pass when measuring throughput")] = 32,
+    max_length: Annotated[int, Option(help="Maximum tokens per sample (defaults to the tokenizer's maximum, at most 512)")] = None,
+    num_threads: Annotated[int, Option(help="Intra-op threads for all models")] = None,
+    n_latency: Annotated[int, Option(help="Number of samples to classify one at a time when measuring latency")] = 100,
+):
+    """CLI entry point to export quantized and ONNX versions of a fine-tuned classifier and compare them to the fp32 model."""
+    # Expand user paths
+    model_path = str(Path(model_path).expanduser())
+    test_input_data_path = str(Path(test_input_data_path).expanduser())
+    output_path = str(Path(output_path or f"{model_path}/export").expanduser())
+    os.makedirs(output_path, exist_ok=True)
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+
+    # Test labels are label strings, as written by the pipeline; accuracy is skipped without labels
+    test_data = read_data(test_input_data_path)
+    label2id = model.config.label2id
+    texts = [x[input_field] for x in test_data]
+    labels = []
+    if all(x.get("label") is not None for x in test_data):
+        labels = [label2id[x["label"]] if isinstance(x["label"], str) else x["label"] for x in test_data]
+
+    variants = {"fp32": (torch_runner(model), model_path)}
+    if quantize:
+        quantized = quantize_dynamic(model)
+        quantized_path = save_quantized(quantized, output_path)
+        print(f"Saved int8 model to {quantized_path} (load it with export.load_quantized)")
+        variants["int8"] = (torch_runner(quantized), quantized_path)
+    if onnx:
+        onnx_path = f"{output_path}/model.onnx"
+        export_onnx(model, tokenizer, onnx_path)
+        print(f"Saved ONNX model to {onnx_path}")
+        variants["onnx"] = (onnx_runner(onnx_path, num_threads), onnx_path)
+        if quantize:
+            _onnxruntime()
+            from onnxruntime.quantization import QuantType, quantize_dynamic as quantize_onnx
+            onnx_int8_path = f"{output_path}/model_int8.onnx"
+            quantize_onnx(onnx_path, onnx_int8_path, weight_type=QuantType.QInt8)
+            print(f"Saved int8 ONNX model to {onnx_int8_path}")
+            variants["onnx_int8"] = (onnx_runner(onnx_int8_path, num_threads), onnx_int8_path)
+    tokenizer.save_pretrained(output_path)
+
+    # Compare every variant with the fp32 model on the test data
+    report = {}
+    for name, (run_batch, path) in variants.items():
+        print(f"Evaluating {name}...")
+        result = evaluate_runner(run_batch, tokenizer, texts, labels, batch_size, max_length, n_latency)
+        predictions = result.pop("predictions")
+        if name == "fp32":
+            fp32_predictions = predictions
+        result["agreement_with_fp32"] = (
+            float(np.mean([p == q for p, q in zip(predictions, fp32_predictions)])) if predictions else None
+        )
+        result["size_mb"] = _size_mb(path)
+        report[name] = result
+    for result in report.values():
+        result["accuracy_delta"] = (
+            result["accuracy"] - report["fp32"]["accuracy"] if result["accuracy"] is not None else None
+        )
+
+    print("\n" + format_export_report(report))
+
+    report_path = f"{output_path}/export_report.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved export report to {report_path}")
+
+
+def main():
+    """CLI entry point."""
+    app = typer.Typer(add_completion=False, pretty_exceptions_show_locals=False)
+    app.command()(export)
+    app()
+
+
+if __name__ == "__main__":
+    main()
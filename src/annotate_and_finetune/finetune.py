@@ -1,6 +1,9 @@
 from pathlib import Path
 from typing import Annotated, Dict, List
+import hashlib
 import json
+import os
+import shutil
 import numpy as np
 from sklearn.metrics import classification_report, confusion_matrix
 import torch
@@ -8,7 +11,9 @@ from datasets import Dataset
 from transformers import (
     AutoModelForSequenceClassification,
     AutoTokenizer,
+    DataCollatorWithPadding,
     Trainer,
+    TrainerCallback,
     TrainingArguments,
     EvalPrediction
 )
@@ -47,6 +52,161 @@ def compute_metrics(pred: EvalPrediction, id2label: Dict[int, str] = None) -> Di
     return metrics
 
 
+# Truncation length for tokenizers that don't set a maximum (they report a sentinel like 1e30)
+DEFAULT_MAX_LENGTH = 512
+
+
+def resolve_max_length(tokenizer, max_length: int = None) -> int:
+    """Maximum tokens per sample: `max_length` if set, else the tokenizer's maximum, capped at 512."""
+    return max_length or min(tokenizer.model_max_length, DEFAULT_MAX_LENGTH)
+
+
+def padding_ratio(batches: List[List[int]], pad_to: int = None) -> float:
+    """Share of pad tokens in batches of sequence lengths.
+
+    Args:
+        batches: Batches of token sequence lengths
+        pad_to: Fixed length every sequence is padded to (None to pad to the longest sequence in each batch)
+
+    Returns:
+        Pad tokens divided by total tokens
+    """
+    n_tokens = sum(sum(batch) for batch in batches)
+    n_padded = sum(len(batch) * (pad_to or max(batch)) for batch in batches if batch)
+    return 1 - n_tokens / n_padded if n_padded else 0.0
+
+
+def length_grouped_batches(lengths: List[int], batch_size: int, seed: int = 42) -> List[List[int]]:
+    """Group sequence lengths into batches the way `group_by_length` training does.
+
+    Lengths are shuffled, split into mega-batches of 50 batches, and each mega-batch is
+    sorted by length before being cut into batches.
+    """
+    lengths = list(np.random.default_rng(seed).permutation(lengths))
+    megabatch_size = 50 * batch_size
+    batches = []
+    for i in range(0, len(lengths), megabatch_size):
+        megabatch = sorted(lengths[i:i + megabatch_size], reverse=True)
+        batches.extend(megabatch[j:j + batch_size] for j in range(0, len(megabatch), batch_size))
+    return batches
+
+
+def tokenized_fingerprint(samples: List[Dict], input_field: str, tokenizer, max_length: int) -> str:
+    """Hash the inputs and labels of samples together with the tokenizer and max length."""
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        "tokenizer": tokenizer.name_or_path,
+        "tokenizer_class": type(tokenizer).__name__,
+        "vocab_size": len(tokenizer),
+        "init_kwargs": tokenizer.init_kwargs,
+        "input_field": input_field,
+        "max_length": max_length,
+    }, sort_keys=True, default=str).encode("utf-8"))
+    for sample in samples:
+        h.update(json.dumps([sample[input_field], sample["label"], sample.get("soft_labels")]).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def tokenize_dataset(
+    samples: List[Dict],
+    input_field: str,
+    tokenizer,
+    max_length: int,
+    cache_dir: str = None,
+) -> Dataset:
+    """Tokenize samples (without padding) into a dataset with `label`, token and `length` columns.
+
+    A `soft_labels` field (label distributions for distillation) is kept if samples have one.
+
+    With a `cache_dir`, the tokenized dataset is saved as Arrow files under a fingerprint of the
+    samples, tokenizer and max length, and later calls with the same inputs load it from disk.
+    Datasets loaded from disk are memory-mapped rather than held in memory.
+
+    Args:
+        samples: Samples with `input_field` and integer `label` fields
+        input_field: The field to use as input to the transformer
+        tokenizer: Tokenizer
+        max_length: Maximum tokens per sample
+        cache_dir: Directory of cached tokenized datasets (None to disable caching)
+
+    Returns:
+        Tokenized dataset
+    """
+    if cache_dir is not None:
+        cache_path = Path(cache_dir).expanduser() / tokenized_fingerprint(samples, input_field, tokenizer, max_length)
+        if cache_path.exists():
+            print(f"Loading tokenized dataset from {cache_path}")
+            return Dataset.load_from_disk(str(cache_path))
+
+    def tokenize_function(examples):
+        tokens = tokenizer(examples[input_field], truncation=True, max_length=max_length)
+        tokens["length"] = [len(x) for x in tokens["input_ids"]]
+        return tokens
+
+    columns = [input_field, "label"] + (["soft_labels"] if samples and "soft_labels" in samples[0] else [])
+    dataset = Dataset.from_list([{k: x[k] for k in columns} for x in samples])
+    dataset = dataset.map(tokenize_function, batched=True, remove_columns=[input_field])
+    if cache_dir is None:
+        return dataset
+
+    # Write to a temporary directory first so an interrupted save is never loaded
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    dataset.save_to_disk(str(tmp_path))
+    try:
+        tmp_path.rename(cache_path)
+        print(f"Saved tokenized dataset to {cache_path}")
+    except OSError:
+        # Another process saved the same dataset first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return Dataset.load_from_disk(str(cache_path))
+
+
+def soft_targets(sample: Dict, label2id: Dict[str, int], soft_label_field: str) -> List[float]:
+    """Build a label distribution from a sample's list of `label` and `score` dictionaries.
+
+    Scores of unknown labels are ignored and the rest are normalized; samples without
+    scores get a one-hot distribution of their `label`.
+    """
+    target = [0.0] * len(label2id)
+    for x in sample.get(soft_label_field) or []:
+        if x.get("label") in label2id:
+            target[label2id[x["label"]]] += x.get("score") or 0.0
+    total = sum(target)
+    if total <= 0:
+        target[label2id[sample["label"]]] = 1.0
+        return target
+    return [x / total for x in target]
+
+
+class DistillationTrainer(Trainer):
+    """Trainer that mixes the cross entropy loss on hard labels with a KL divergence loss on soft labels.
+
+    Args:
+        distillation_alpha: Weight of the soft label loss (1 - alpha weights the hard label loss)
+        distillation_temperature: Temperature applied to both the student logits and the soft labels
+    """
+
+    def __init__(self, *args, distillation_alpha: float = 0.5, distillation_temperature: float = 1.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.distillation_alpha = distillation_alpha
+        self.distillation_temperature = distillation_temperature
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        soft_labels = inputs.pop("soft_labels", None)
+        inputs.pop("length", None)
+        outputs = model(**inputs)
+        loss = outputs.loss
+        if soft_labels is not None:
+            t = self.distillation_temperature
+            targets = torch.softmax(torch.log(soft_labels.to(outputs.logits.dtype) + 1e-8) / t, dim=-1)
+            soft_loss = torch.nn.functional.kl_div(
+                torch.log_softmax(outputs.logits / t, dim=-1), targets, reduction="batchmean"
+            ) * t ** 2
+            loss = self.distillation_alpha * soft_loss + (1 - self.distillation_alpha) * loss
+        return (loss, outputs) if return_outputs else loss
+
+
 def run_finetuning(
     train_data: List[Dict],
     val_data: List[Dict],
@@ -57,6 +217,13 @@ def run_finetuning(
     num_epochs: int = 0,
     learning_rate: float = 0.00001,
     batch_size: int = 8,
+    max_length: int = None,
+    group_by_length: bool = True,
+    tokenized_cache_dir: str = None,
+    callbacks: List[TrainerCallback] = None,
+    soft_label_field: str = None,
+    distillation_alpha: float = 0.5,
+    distillation_temperature: float = 1.0,
 ) -> Dict:
     """Run finetuning on datasets.
     
@@ -70,11 +237,32 @@ def run_finetuning(
         num_epochs: Number of training epochs (0 to skip training)
         learning_rate: Learning rate
         batch_size: Batch size for training and evaluation
+        max_length: Maximum tokens per sample (defaults to the tokenizer's maximum, at most 512)
+        group_by_length: Batch training samples of similar length together, so less
+            padding is needed when each batch is padded to its longest sample
+        tokenized_cache_dir: Directory of cached tokenized datasets, reused by runs with the
+            same data, tokenizer and max length (None to disable caching)
+        callbacks: Trainer callbacks, e.g. to stop training early
+        soft_label_field: Field with lists of `label` and `score` dictionaries (e.g. `label_scores`
+            from cascade annotation) to distill into the model (None to train on hard labels only)
+        distillation_alpha: Weight of the soft label loss when distilling
+        distillation_temperature: Softmax temperature of the soft label loss
         
     Returns:
-        Dictionary containing metrics and model outputs
+        Dictionary containing validation and test metrics and hyperparameters
     """
 
+    # Soft labels come from annotation (e.g. a cascade); without any, distillation would train on one-hot targets
+    if soft_label_field is not None:
+        n_soft = sum(1 for x in train_data if x.get(soft_label_field))
+        if n_soft == 0:
+            raise ValueError(
+                f"No training samples have soft labels in `{soft_label_field}`; "
+                "annotate with a model cascade or don't set soft_label_field"
+            )
+        if n_soft < len(train_data):
+            print(f"Warning: {len(train_data) - n_soft} of {len(train_data)} training samples have no `{soft_label_field}` and use one-hot targets")
+
     # Get unique labels and create label mapping
     all_labels = sorted(list(set([d["label"] for d in train_data + val_data + test_data])))
     label2id = {label: i for i, label in enumerate(all_labels)}
@@ -82,12 +270,10 @@ def run_finetuning(
     num_labels = len(all_labels)
     for samples in (train_data, val_data, test_data):
         for sample in samples:
+            if soft_label_field is not None:
+                sample["soft_labels"] = soft_targets(sample, label2id, soft_label_field)
             sample["label"] = label2id[sample["label"]]
 
-    train_dataset = Dataset.from_list(train_data)
-    val_dataset = Dataset.from_list(val_data)
-    test_dataset = Dataset.from_list(test_data)
-
     # Load tokenizer and model
     tokenizer = AutoTokenizer.from_pretrained(model_path)
     model = AutoModelForSequenceClassification.from_pretrained(
@@ -97,14 +283,38 @@ def run_finetuning(
         label2id=label2id
     )
 
-    # Tokenization function
-    def tokenize_function(examples):
-        return tokenizer(examples[input_field], padding="max_length", truncation=True)
+    # Tokenize datasets; padding is done per batch by the data collator
+    max_length = resolve_max_length(tokenizer, max_length)
+    train_dataset, val_dataset, test_dataset = [
+        tokenize_dataset(x, input_field, tokenizer, max_length, cache_dir=tokenized_cache_dir)
+        for x in (train_data, val_data, test_data)
+    ]
+
+    # Evaluation order doesn't affect metrics, so evaluate in length order
+    val_dataset = val_dataset.sort("length")
+    test_dataset = test_dataset.sort("length")
 
-    # Tokenize datasets
-    train_dataset = train_dataset.map(tokenize_function, batched=True)
-    val_dataset = val_dataset.map(tokenize_function, batched=True)
-    test_dataset = test_dataset.map(tokenize_function, batched=True)
+    # Report the share of pad tokens with fixed length vs per batch padding
+    train_lengths = train_dataset["length"]
+    train_batches = (
+        length_grouped_batches(train_lengths, batch_size)
+        if group_by_length else
+        [train_lengths[i:i + batch_size] for i in range(0, len(train_lengths), batch_size)]
+    )
+    eval_batches = [
+        x[i:i + batch_size]
+        for x in (val_dataset["length"], test_dataset["length"])
+        for i in range(0, len(x), batch_size)
+    ]
+    padding = {
+        "max_length_padding_ratio": padding_ratio(train_batches + eval_batches, pad_to=max_length),
+        "train_padding_ratio": padding_ratio(train_batches),
+        "eval_padding_ratio": padding_ratio(eval_batches),
+    }
+    print(
+        f"Pad tokens: {padding['max_length_padding_ratio']:.1%} with padding to {max_length} tokens, "
+        f"{padding['train_padding_ratio']:.1%} (train) and {padding['eval_padding_ratio']:.1%} (eval) with per batch padding"
+    )
 
     # Set up training arguments
     training_args = TrainingArguments(
@@ -118,15 +328,27 @@ def run_finetuning(
         save_strategy="epoch",
         load_best_model_at_end=True,
         push_to_hub=False,
+        group_by_length=group_by_length,
+        # Keep the soft labels column, which the model's forward method doesn't take
+        remove_unused_columns=soft_label_field is None,
     )
 
     # Initialize trainer with compute_metrics that has access to label mappings
-    trainer = Trainer(
+    distillation_kwargs = {}
+    if soft_label_field is not None:
+        distillation_kwargs = dict(
+            distillation_alpha=distillation_alpha,
+            distillation_temperature=distillation_temperature,
+        )
+    trainer = (DistillationTrainer if soft_label_field is not None else Trainer)(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=val_dataset,
+        data_collator=DataCollatorWithPadding(tokenizer),
         compute_metrics=lambda pred: compute_metrics(pred, id2label),
+        callbacks=callbacks,
+        **distillation_kwargs,
     )
 
     # Train model if epochs > 0
@@ -147,7 +369,13 @@ def run_finetuning(
             "learning_rate": learning_rate,
             "batch_size": batch_size,
             "weight_decay": 0.01,
-        }
+            "max_length": max_length,
+            "group_by_length": group_by_length,
+            "soft_label_field": soft_label_field,
+            "distillation_alpha": distillation_alpha if soft_label_field is not None else None,
+            "distillation_temperature": distillation_temperature if soft_label_field is not None else None,
+        },
+        "padding": padding,
     }
 
     metrics_path = Path(output_path) / "metrics.json"
@@ -157,6 +385,7 @@ def run_finetuning(
     # Save model and tokenizer
     trainer.save_model()
     tokenizer.save_pretrained(output_path)
+    return metrics
 
 
 def finetune(
@@ -169,6 +398,12 @@ def finetune(
     num_epochs: Annotated[int, Option(help="Number of training epochs (0 to skip training)")] = 0,
     learning_rate: Annotated[float, Option(help="Learning rate")] = 0.00001,
     batch_size: Annotated[int, Option(help="Batch size for training and evaluation")] = 8,
+    max_length: Annotated[int, Option(help="Maximum tokens per sample (defaults to the tokenizer's maximum, at most 512)")] = None,
+    group_by_length: Annotated[bool, Option(help="Batch training samples of similar length together")] = True,
+    tokenized_cache_dir: Annotated[str, Option(help="Directory to cache tokenized datasets in across runs")] = None,
+    soft_label_field: Annotated[str, Option(help="Field with label scores to distill (e.g. label_scores)")] = None,
+    distillation_alpha: Annotated[float, Option(help="Weight of the soft label loss when distilling")] = 0.5,
+    distillation_temperature: Annotated[float, Option(help="Softmax temperature of the soft label loss")] = 1.0,
 ):
     """CLI entry point to run finetuning on a dataset."""
     # Expand user paths
@@ -192,7 +427,13 @@ def finetune(
         output_path=output_path,
         num_epochs=num_epochs,
         learning_rate=learning_rate,
-        batch_size=batch_size
+        batch_size=batch_size,
+        max_length=max_length,
+        group_by_length=group_by_length,
+        tokenized_cache_dir=str(Path(tokenized_cache_dir).expanduser()) if tokenized_cache_dir else None,
+        soft_label_field=soft_label_field,
+        distillation_alpha=distillation_alpha,
+        distillation_temperature=distillation_temperature,
     )
 
 
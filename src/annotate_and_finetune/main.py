@@ -1,17 +1,31 @@
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Dict, List
 import yaml
 import json
 import os
-import polars as pl
-from itertools import chain
 import typer
 from typer import Option
 
 from llmpipe import read_data, write_data
-from annotate_and_finetune.annotate import run_annotation
+from annotate_and_finetune.annotate import annotate_to_file, run_annotation
+from annotate_and_finetune.annotation_config import annotation_kwargs_from_config, build_annotation_configs, build_batches
+from annotate_and_finetune.batch_annotation import annotate_batches
+from annotate_and_finetune.cascade import annotate_cascade
+from annotate_and_finetune.checkpoint import append_records, is_annotated, read_completed_ids
+from annotate_and_finetune.dedup import dedup_samples, format_dedup_report, propagate_labels
+from annotate_and_finetune.streaming import iter_chunks, iter_jsonl, reservoir_sample
 from annotate_and_finetune.finetune import run_finetuning
-from annotate_and_finetune.split_data import split_data
+from annotate_and_finetune.metrics import AnnotationMetrics
+from annotate_and_finetune.split_data import split_data, split_jsonl
+
+
+# Annotation output fields that are not part of the training data
+ANNOTATION_FIELDS = ("thinking", "allowed_labels")
+
+
+def drop_annotation_fields(records: List[Dict]) -> List[Dict]:
+    """Remove the annotation-only fields (e.g. the model's reasoning) from annotated records."""
+    return [{k: v for k, v in x.items() if k not in ANNOTATION_FIELDS} for x in records]
 
 
 def load_config(config_path: str) -> dict:
@@ -24,6 +38,7 @@ def run_pipeline(
     config_path: Annotated[str, Option(help="Path to YAML config file")] = None,
     num_proc: Annotated[int, Option(help="Number of processes for annotation")] = 2,
     verbose: Annotated[bool, Option(help="Enable verbose output")] = False,
+    backend: Annotated[str, Option(help="Annotation backend: 'process' or 'async' (overrides the config)")] = None,
 ):
     """Run the full annotation and fine-tuning pipeline.
     
@@ -31,13 +46,13 @@ def run_pipeline(
         config_path: Path to YAML config file containing pipeline settings
         num_proc: Number of processes for parallel annotation
         verbose: Enable verbose output
+        backend: Annotation backend, 'process' (num_proc processes) or 'async' (concurrent calls in one process)
     """
     print("Loading config file...")
     config = load_config(config_path)
     
     # Extract config values
     model = config.get("model", "anthropic/claude-3-sonnet-20240229")
-    allowed_labels = config["allowed_labels"]
     task = config["task"]
     details = config.get("details")
     context_col = config["context_col"]
@@ -52,112 +67,205 @@ def run_pipeline(
     # Extract training parameters from config
     n_samples = config.get("n_samples", 10)
     annotation_batch_size = config.get("annotation_batch_size", 10)
+    annotation_token_budget = config.get("annotation_token_budget")
+    max_annotation_batch_size = config.get("max_annotation_batch_size", 50)
+    annotation_max_retries = config.get("annotation_max_retries", 3)
     num_epochs = config.get("num_epochs", 1)
     learning_rate = config.get("learning_rate", 0.00001)
     batch_size = config.get("batch_size", 8)
+    max_length = config.get("max_length")
+    group_by_length = config.get("group_by_length", True)
+    tokenized_cache_dir = config.get("tokenized_cache_dir")
+    soft_label_field = config.get("soft_label_field")
+    distillation_alpha = config.get("distillation_alpha", 0.5)
+    distillation_temperature = config.get("distillation_temperature", 1.0)
+    if tokenized_cache_dir is not None:
+        tokenized_cache_dir = str(Path(tokenized_cache_dir).expanduser())
+    seed = config.get("seed")
+    backend = backend or config.get("annotation_backend", "process")
+    streaming = config.get("streaming", False)
+    annotation_chunk_size = config.get("annotation_chunk_size", 1000)
+    resume = config.get("resume", False)
+    annotation_cascade = config.get("annotation_cascade")
+    dedup_threshold = config.get("dedup_threshold")
 
     print(f"Loading data from {data_path}...")
-    samples_df = read_data(data_path, as_df=True)
-    if "label" in samples_df.columns:
-        samples_df = samples_df.rename({"label": "gt_label"})
-    samples = samples_df.to_dicts()
+    if streaming:
+        # Lazily read the (jsonlines) data; only the samples being annotated are held in memory
+        samples = (
+            {id_col: i, **x} if id_col not in x else x
+            for i, x in enumerate(
+                {("gt_label" if k == "label" else k): v for k, v in x.items()}
+                for x in iter_jsonl(data_path)
+            )
+        )
+    else:
+        samples_df = read_data(data_path, as_df=True)
+        if "label" in samples_df.columns:
+            samples_df = samples_df.rename({"label": "gt_label"})
+        if id_col not in samples_df.columns:
+            samples_df = samples_df.with_row_index(id_col)
+        samples = samples_df.to_dicts()
+
+    # Annotate one representative of each cluster of near-duplicate texts
+    if dedup_threshold is not None:
+        if streaming:
+            print("Near-duplicate removal needs the data in memory; skipping it in streaming mode")
+            dedup_threshold = None
+        else:
+            print(f"Removing near-duplicates (Jaccard similarity >= {dedup_threshold})...")
+            all_samples = samples
+            samples, dedup_members = dedup_samples(
+                all_samples, context_col, threshold=dedup_threshold,
+                num_perm=config.get("dedup_num_perm", 128),
+            )
+            print(f"Kept {len(samples)} of {len(all_samples)} samples")
 
     # Configure annotation
-    single_annotation_config = f"""\
-task: {task}
-details: {details}
-outputs:
-  - name: thinking
-    description: Begin by thinking step by step
-  - name: label
-    description: A label selected from `allowed_labels`
-    inputs:
-      - name: {context_col}
-        description: {context_description}
-      - name: allowed_labels
-        description: The set of allowed labels
-"""
-
-    batch_annotation_config = f"""\
-task: {task}
-details: {details}
-inputs:
-  - name: annotation_inputs
-    description: A table of annotation inputs
-  - name: allowed_labels
-    description: The set of allowed labels
-outputs:
-  - name: thinking
-    description: Begin by thinking step by step
-  - name: labels
-    type: jsonlines
-    description: A table with annotated labels
-    fields:
-      - name: {id_col}
-        description: An id from `annotation_inputs`
-      - name: label
-        description: A label selected from `allowed_labels`
-"""
-
-    annotation_config = yaml.safe_load(
+    single_annotation_config, batch_annotation_config = build_annotation_configs(
+        task, details, context_col, context_description, id_col
+    )
+    annotation_config = (
         single_annotation_config
         if annotation_batch_size == 1 else
         batch_annotation_config
     )
+    fallback_config = single_annotation_config
 
     print("\nStarting annotation phase...")
-    print(f"Using model: {model}")
-    print(f"Annotation batch size: {annotation_batch_size}")
-    if annotation_batch_size == 1:
-        annotated_samples = run_annotation(
-            config=annotation_config,
-            samples=samples,
-            n_samples=n_samples,
-            num_proc=num_proc,
-            model=model,
-            verbose=verbose,
-            allowed_labels=allowed_labels
-        )
-        annotated_samples = (
-            pl.from_dicts(annotated_samples)
-            .drop("thinking", "allowed_labels")
-            .to_dicts()
-        )
+    if annotation_cascade:
+        print(f"Using model cascade: {' -> '.join(x['model'] for x in annotation_cascade)}")
+    else:
+        print(f"Using model: {model}")
+    if annotation_cascade:
+        print("Annotation batch size: 1 (cascade)")
+    elif annotation_batch_size != 1 and annotation_token_budget is not None:
+        print(f"Annotation token budget: {annotation_token_budget} (max batch size: {max_annotation_batch_size})")
     else:
-        batches = []
-        for i in range(0, len(samples), annotation_batch_size):
-            batch = [{k: x[k] for k in (id_col, context_col)} for x in samples[i: i + annotation_batch_size]]
-            batches.append("\n".join([json.dumps(x) for x in batch]))
-
-        batched_samples = [{"annotation_inputs": x} for x in batches]
-
-        batch_annotated_samples = run_annotation(
-            config=annotation_config,
-            samples=batched_samples,
-            n_samples=n_samples,
-            num_proc=num_proc,
-            model=model,
-            verbose=verbose,
-            allowed_labels=allowed_labels
+        print(f"Annotation batch size: {annotation_batch_size}")
+    print(f"Annotation backend: {backend}")
+    with AnnotationMetrics(
+        progress_interval=config.get("progress_interval", 30),
+        prometheus_path=config.get("prometheus_path"),
+    ) as metrics:
+        annotation_kwargs = annotation_kwargs_from_config(
+            config, num_proc=num_proc, verbose=verbose, backend=backend, metrics=metrics
         )
+        annotated_path = f"{data_output_path}/annotated.jsonl"
+        if streaming:
+            os.makedirs(data_output_path, exist_ok=True)
+            if not resume:
+                Path(annotated_path).unlink(missing_ok=True)
+
+        # Ids already in the checkpoint file of an interrupted streaming run
+        completed_ids = set()
+        if streaming:
+            completed_ids = read_completed_ids(annotated_path, id_col, ["label"])
+            if completed_ids:
+                print(f"Resuming: {len(completed_ids)} samples already annotated")
+
+        if annotation_cascade:
+            # Cascade annotation uses single-sample prompts, escalating uncertain samples to stronger models.
+            # Completed samples are skipped before sampling, so a resumed run tops up to n_samples
+            if streaming:
+                samples = (x for x in samples if x[id_col] not in completed_ids)
+            if n_samples is not None:
+                samples = reservoir_sample(samples, max(n_samples - len(completed_ids), 0), seed=seed)
+            if streaming:
+                for chunk in iter_chunks(samples, annotation_chunk_size):
+                    records = annotate_cascade(single_annotation_config, chunk, annotation_cascade, **annotation_kwargs)
+                    # Failed annotations aren't saved, so they are retried on resume
+                    append_records([x for x in records if is_annotated(x, ["label"])], annotated_path)
+            else:
+                annotated_samples = drop_annotation_fields(annotate_cascade(
+                    single_annotation_config, samples, annotation_cascade, **annotation_kwargs
+                ))
+        elif annotation_batch_size == 1:
+            if streaming:
+                annotate_to_file(
+                    config=annotation_config,
+                    samples=samples,
+                    output_path=annotated_path,
+                    id_col=id_col,
+                    n_samples=n_samples,
+                    chunk_size=annotation_chunk_size,
+                    resume=resume,
+                    seed=seed,
+                    **annotation_kwargs
+                )
+            else:
+                annotated_samples = drop_annotation_fields(run_annotation(
+                    config=annotation_config,
+                    samples=samples,
+                    n_samples=n_samples,
+                    seed=seed,
+                    **annotation_kwargs
+                ))
+        else:
+            # n_samples is the number of batches to annotate. Completed samples can't be counted in
+            # batches, so resuming needs a seed to select the same batches as the interrupted run
+            if streaming and resume and n_samples is not None and seed is None:
+                raise ValueError("Resuming batch annotation of n_samples random batches requires a seed")
+            batches = build_batches(samples, config)
+            if n_samples is not None:
+                batches = reservoir_sample(batches, n_samples, seed=seed)
 
-        labels = list(chain(*[x["labels"] for x in batch_annotated_samples if x["labels"] is not None]))
-        annotated_samples = pl.from_dicts(samples).join(
-            pl.from_dicts(labels).with_columns(pl.col(id_col).cast(pl.UInt32).alias(id_col)),
-            on=id_col, how="inner"
-        ).to_dicts()
+            if streaming:
+                # Annotate a chunk of batches at a time, appending results to disk
+                if completed_ids:
+                    batches = ([x for x in batch if x[id_col] not in completed_ids] for batch in batches)
+                    batches = (batch for batch in batches if batch)
+                # Packed batches have up to max_annotation_batch_size samples
+                samples_per_batch = annotation_batch_size if annotation_token_budget is None else max_annotation_batch_size
+                batches_per_chunk = max(annotation_chunk_size // samples_per_batch, 1)
+                for chunk in iter_chunks(batches, batches_per_chunk):
+                    records = annotate_batches(
+                        annotation_config, chunk, id_col, context_col,
+                        fallback_config=fallback_config,
+                        max_retries=annotation_max_retries,
+                        **annotation_kwargs
+                    )
+                    append_records([x for x in records if is_annotated(x, ["label"])], annotated_path)
+            else:
+                annotated_samples = annotate_batches(
+                    annotation_config, list(batches), id_col, context_col,
+                    fallback_config=fallback_config,
+                    max_retries=annotation_max_retries,
+                    **annotation_kwargs
+                )
+
+        if dedup_threshold is not None:
+            n_annotated = len(annotated_samples)
+            annotated_samples = propagate_labels(annotated_samples, all_samples, dedup_members, id_col)
+            print(format_dedup_report(len(all_samples), len(samples), n_annotated, len(annotated_samples) - n_annotated))
+
+        # Save the annotation metrics report next to the output data
+        os.makedirs(data_output_path, exist_ok=True)
+        metrics.write_report(f"{data_output_path}/annotation_metrics.json")
+        print(metrics.progress_line())
 
     print("\nSplitting data into train/val/test sets...")
-    train_samples, val_samples, test_samples = split_data(
-        annotated_samples,
-        [1 - 2 * val_test_prop, val_test_prop, val_test_prop]
+    # Near-duplicates are kept in the same split so they don't leak from train into val/test. Hash
+    # splits keep rows in their split when the data grows; stratified splits (split_stratify) don't
+    split_group_col = config.get("split_group_col") or ("dedup_cluster" if dedup_threshold is not None else None)
+    split_kwargs = dict(
+        key=id_col,
+        group_key=split_group_col,
+        stratify_key="label" if config.get("split_stratify", False) else None,
+        seed=seed or 0,
     )
-
-    print("\nSaving annotated dataset...")
+    proportions = [1 - 2 * val_test_prop, val_test_prop, val_test_prop]
+    split_paths = [f"{data_output_path}/{name}.jsonl" for name in ("train", "val", "test")]
     os.makedirs(data_output_path, exist_ok=True)
-    write_data(train_samples, f"{data_output_path}/train.jsonl")
-    write_data(val_samples, f"{data_output_path}/val.jsonl")
-    write_data(test_samples, f"{data_output_path}/test.jsonl")
+    if streaming:
+        # Split the annotations on disk; only the splits are loaded, for fine-tuning
+        split_jsonl(annotated_path, split_paths, proportions, drop_fields=ANNOTATION_FIELDS, **split_kwargs)
+        train_samples, val_samples, test_samples = [list(iter_jsonl(path)) for path in split_paths]
+    else:
+        train_samples, val_samples, test_samples = split_data(annotated_samples, proportions, **split_kwargs)
+        print("\nSaving annotated dataset...")
+        for split, path in zip((train_samples, val_samples, test_samples), split_paths):
+            write_data(split, path)
 
     print("\nStarting fine-tuning phase...")
     print(f"Using model: {model_path}")
@@ -172,6 +280,12 @@ outputs:
         num_epochs=num_epochs,
         learning_rate=learning_rate,
         batch_size=batch_size,
+        max_length=max_length,
+        group_by_length=group_by_length,
+        tokenized_cache_dir=tokenized_cache_dir,
+        soft_label_field=soft_label_field,
+        distillation_alpha=distillation_alpha,
+        distillation_temperature=distillation_temperature,
     )
 
 
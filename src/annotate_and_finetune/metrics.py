@@ -0,0 +1,319 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+import litellm
+from litellm.integrations.custom_logger import CustomLogger
+
+
+LATENCY_BUCKETS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128]
+
+
+def _seconds(value) -> float:
+    """Convert a LiteLLM callback timestamp (datetime or float) to seconds."""
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def usage_tokens(response_obj) -> Dict[str, int]:
+    """Read input, output, cached and cache-write token counts from a LiteLLM response.
+
+    Cached tokens are reported as `cached_tokens` in `prompt_tokens_details` (OpenAI, Gemini,
+    DeepSeek) or as `cache_read_input_tokens` (Anthropic).
+    """
+    usage = getattr(response_obj, "usage", None)
+    if usage is None:
+        return {"input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "input_tokens": getattr(usage, "prompt_tokens", None) or 0,
+        "output_tokens": getattr(usage, "completion_tokens", None) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", None) or 0,
+        "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+    }
+
+
+class AnnotationMetrics(CustomLogger):
+    """LiteLLM callback recording per-request latency, tokens and errors during annotation.
+
+    Each request is appended as a json line to an events file, so requests made by forked
+    worker processes (the "process" backend) are recorded alongside those of the parent.
+    Events are aggregated by the parent into throughput, latency, token and error summaries.
+
+    Worker processes only inherit the callback when they are forked. With the "spawn" or
+    "forkserver" start methods (the defaults on macOS and, from Python 3.14, on Linux),
+    requests made by worker processes are not recorded; the "async" backend makes all
+    requests from the parent process and is recorded with any start method.
+
+    The events file is removed by `close`, or when used as a context manager, on exit.
+
+    Args:
+        progress_interval: Seconds between progress lines while tracking (None to disable)
+        prometheus_path: If set, write metrics in Prometheus text format to this path with
+            every progress line and at the end of tracking
+    """
+
+    def __init__(self, progress_interval: float = 30, prometheus_path: str = None):
+        super().__init__()
+        fd, self.events_path = tempfile.mkstemp(prefix="annotation_metrics_", suffix=".jsonl")
+        os.close(fd)
+        self.progress_interval = progress_interval
+        self.prometheus_path = prometheus_path
+        self.start_time = None
+        self.n_samples = 0
+        self.lock = threading.Lock()
+        self._depth = 0
+        self._stop = threading.Event()
+        self._thread = None
+        # Aggregated state
+        self._offset = 0
+        self.latencies = defaultdict(list)
+        self.requests = Counter()
+        self.errors = Counter()
+        self.retries = Counter()
+        self.tokens = defaultdict(Counter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # LiteLLM callback hooks
+    def _write_event(self, event: Dict):
+        with open(self.events_path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        self._write_event({
+            "model": kwargs.get("model"),
+            "latency": _seconds(end_time) - _seconds(start_time),
+            "error": None,
+            **usage_tokens(response_obj),
+        })
+
+    def log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        exception = kwargs.get("exception")
+        self._write_event({
+            "model": kwargs.get("model"),
+            "latency": _seconds(end_time) - _seconds(start_time),
+            "error": type(exception).__name__ if exception is not None else "UnknownError",
+        })
+
+    async def async_log_success_event(self, kwargs, response_obj, start_time, end_time):
+        self.log_success_event(kwargs, response_obj, start_time, end_time)
+
+    async def async_log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        self.log_failure_event(kwargs, response_obj, start_time, end_time)
+
+    # Tracking
+    @contextmanager
+    def track(self):
+        """Register the callback with LiteLLM and print progress lines while in the context.
+
+        Nested calls are no-ops, so a caller can track several annotation runs as one job.
+        """
+        with self.lock:
+            self._depth += 1
+            outermost = self._depth == 1
+        if outermost:
+            if self.start_time is None:
+                self.start_time = time.time()
+            litellm.callbacks.append(self)
+            if self.progress_interval:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._progress_loop, daemon=True)
+                self._thread.start()
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self._depth -= 1
+            if outermost:
+                litellm.callbacks.remove(self)
+                if self._thread is not None:
+                    self._stop.set()
+                    self._thread.join()
+                    self._thread = None
+                if self.prometheus_path:
+                    self.write_prometheus(self.prometheus_path)
+
+    def add_samples(self, n: int):
+        """Count completed annotation prompts (one per batch in batch annotation)."""
+        with self.lock:
+            self.n_samples += n
+
+    def add_retries(self, reason: str, n: int = 1):
+        """Count samples retried by the annotation loop, e.g. after rate limit errors or in smaller batches."""
+        with self.lock:
+            self.retries[reason] += n
+
+    def _progress_loop(self):
+        while not self._stop.wait(self.progress_interval):
+            print(self.progress_line())
+            if self.prometheus_path:
+                self.write_prometheus(self.prometheus_path)
+
+    def _refresh(self):
+        """Aggregate events appended since the last refresh."""
+        if not os.path.exists(self.events_path):
+            return
+        with self.lock, open(self.events_path) as f:
+            f.seek(self._offset)
+            while True:
+                line = f.readline()
+                if not line.endswith("\n"):
+                    break
+                self._offset += len(line.encode("utf-8"))
+                event = json.loads(line)
+                model = event["model"] or "unknown"
+                self.latencies[model].append(event["latency"])
+                if event["error"] is None:
+                    self.requests[model, "success"] += 1
+                    for k in ("input_tokens", "output_tokens", "cached_tokens", "cache_write_tokens"):
+                        self.tokens[model][k] += event[k]
+                else:
+                    self.requests[model, "error"] += 1
+                    self.errors[model, event["error"]] += 1
+
+    # Reporting
+    def report(self) -> Dict:
+        """Summarize throughput, latency, tokens and errors, overall and by model."""
+        self._refresh()
+        # The progress thread refreshes the aggregates concurrently
+        with self.lock:
+            return self._report()
+
+    def _report(self) -> Dict:
+        elapsed = time.time() - self.start_time if self.start_time else 0
+        n_requests = sum(self.requests.values())
+        tokens = Counter()
+        for model_tokens in self.tokens.values():
+            tokens.update(model_tokens)
+        latencies = [x for values in self.latencies.values() for x in values]
+
+        def latency_summary(values):
+            return {
+                "mean": sum(values) / len(values) if values else None,
+                "p50": _percentile(values, 0.5),
+                "p90": _percentile(values, 0.9),
+                "p99": _percentile(values, 0.99),
+                "max": max(values) if values else None,
+                "histogram": self._histogram(values),
+            }
+
+        return {
+            "elapsed_seconds": elapsed,
+            "samples": self.n_samples,
+            "samples_per_second": self.n_samples / elapsed if elapsed else None,
+            "requests": n_requests,
+            "requests_per_second": n_requests / elapsed if elapsed else None,
+            "errors": sum(self.errors.values()),
+            "retries": dict(self.retries),
+            "latency_seconds": latency_summary(latencies),
+            "tokens": dict(tokens),
+            "models": {
+                model: {
+                    "requests": self.requests[model, "success"] + self.requests[model, "error"],
+                    "errors": {e: n for (m, e), n in self.errors.items() if m == model},
+                    "latency_seconds": latency_summary(self.latencies[model]),
+                    "tokens": dict(self.tokens[model]),
+                }
+                for model in self.latencies
+            },
+        }
+
+    @staticmethod
+    def _histogram(values: List[float]) -> Dict[str, int]:
+        """Count latencies per bucket, keyed by the bucket's upper bound."""
+        counts = Counter(bisect_left(LATENCY_BUCKETS, x) for x in values)
+        labels = [str(x) for x in LATENCY_BUCKETS] + ["+Inf"]
+        return {label: counts[i] for i, label in enumerate(labels)}
+
+    def progress_line(self) -> str:
+        report = self.report()
+        latency = report["latency_seconds"]
+        p50 = f"{latency['p50']:.2f}s" if latency["p50"] is not None else "n/a"
+        p90 = f"{latency['p90']:.2f}s" if latency["p90"] is not None else "n/a"
+        rate = report["samples_per_second"] or 0
+        return (
+            f"[annotation] {report['samples']} samples ({rate:.2f}/s), {report['requests']} requests, "
+            f"{report['errors']} errors, {sum(report['retries'].values())} retries, latency p50 {p50} p90 {p90}, "
+            f"{report['tokens'].get('input_tokens', 0)} input / {report['tokens'].get('output_tokens', 0)} output tokens"
+        )
+
+    def write_report(self, path: str):
+        """Write the json report to `path`."""
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Render metrics in the Prometheus text exposition format."""
+        self._refresh()
+        with self.lock:
+            return self._prometheus()
+
+    def _prometheus(self) -> str:
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+        metric("annotation_samples_total", "counter", "Annotated samples", [({}, self.n_samples)])
+        metric(
+            "annotation_requests_total", "counter", "LLM requests by status",
+            [({"model": m, "status": s}, n) for (m, s), n in self.requests.items()]
+        )
+        metric(
+            "annotation_errors_total", "counter", "Failed LLM requests by error class",
+            [({"model": m, "error": e}, n) for (m, e), n in self.errors.items()]
+        )
+        metric(
+            "annotation_retries_total", "counter", "Samples retried by reason",
+            [({"reason": r}, n) for r, n in self.retries.items()]
+        )
+        for key in ("input_tokens", "output_tokens", "cached_tokens"):
+            metric(
+                f"annotation_{key}_total", "counter", f"{key.replace('_', ' ').capitalize()}",
+                [({"model": m}, t[key]) for m, t in self.tokens.items()]
+            )
+
+        lines.append("# HELP annotation_request_latency_seconds LLM request latency")
+        lines.append("# TYPE annotation_request_latency_seconds histogram")
+        for model, values in self.latencies.items():
+            cumulative = 0
+            for bound, count in self._histogram(values).items():
+                cumulative += count
+                lines.append(f'annotation_request_latency_seconds_bucket{{model="{model}",le="{bound}"}} {cumulative}')
+            lines.append(f'annotation_request_latency_seconds_sum{{model="{model}"}} {sum(values)}')
+            lines.append(f'annotation_request_latency_seconds_count{{model="{model}"}} {len(values)}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write metrics in Prometheus text format, e.g. for the node exporter textfile collector."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def close(self):
+        """Remove the events file."""
+        if os.path.exists(self.events_path):
+            os.remove(self.events_path)
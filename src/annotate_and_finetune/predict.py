@@ -0,0 +1,169 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Annotated, Dict, List
+import multiprocessing
+import os
+import shutil
+import time
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+import typer
+from typer import Option
+
+from annotate_and_finetune.checkpoint import append_records
+from annotate_and_finetune.finetune import resolve_max_length
+from annotate_and_finetune.streaming import byte_ranges, iter_chunks, iter_jsonl, iter_jsonl_range
+
+
+def load_classifier(model_path: str, num_threads: int = None):
+    """Load a fine-tuned classifier and its tokenizer for CPU inference.
+
+    Args:
+        model_path: Path to a model saved by `run_finetuning`
+        num_threads: Torch intra-op threads (None for the torch default)
+
+    Returns:
+        Tuple of the model (in eval mode) and tokenizer
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    return model, tokenizer
+
+
+def predict_batch(model, tokenizer, samples: List[Dict], input_field: str, batch_size: int = 32, max_length: int = None) -> List[Dict]:
+    """Classify samples, returning each sample with `predicted_label` and `probabilities` fields.
+
+    Samples are sorted by token length and each batch is padded to its longest sample, so
+    short samples aren't padded to the model's maximum length.
+
+    Args:
+        model: Sequence classification model
+        tokenizer: Tokenizer
+        samples: Samples to classify
+        input_field: The field to use as input to the transformer
+        batch_size: Samples per forward pass
+        max_length: Maximum tokens per sample (defaults to the tokenizer's maximum, at most 512)
+
+    Returns:
+        Classified samples, in the input order
+    """
+    id2label = model.config.id2label
+    encodings = tokenizer(
+        [x[input_field] for x in samples],
+        truncation=True,
+        max_length=resolve_max_length(tokenizer, max_length),
+    )
+    features = [{k: v[i] for k, v in encodings.items()} for i in range(len(samples))]
+    order = sorted(range(len(samples)), key=lambda i: len(features[i]["input_ids"]))
+
+    results = [None] * len(samples)
+    with torch.inference_mode():
+        for batch_idx in iter_chunks(order, batch_size):
+            batch = tokenizer.pad([features[i] for i in batch_idx], return_tensors="pt")
+            probs = torch.softmax(model(**batch).logits, dim=-1).tolist()
+            for i, p in zip(batch_idx, probs):
+                best = max(range(len(p)), key=p.__getitem__)
+                results[i] = samples[i] | {
+                    "predicted_label": id2label[best],
+                    "probabilities": {id2label[j]: round(x, 6) for j, x in enumerate(p)},
+                }
+    return results
+
+
+def _predict_shard(
+    model_path: str,
+    input_data_path: str,
+    output_data_path: str,
+    input_field: str,
+    batch_size: int,
+    max_length: int,
+    num_threads: int,
+    chunk_size: int,
+    start: int = 0,
+    end: int = None,
+) -> int:
+    """Classify the lines of a jsonlines file starting in the byte range [start, end) (the whole
+    file if `end` is None), appending results to `output_data_path` a chunk at a time."""
+    model, tokenizer = load_classifier(model_path, num_threads)
+    samples = iter_jsonl(input_data_path) if end is None else iter_jsonl_range(input_data_path, start, end)
+    n_samples = 0
+    for chunk in iter_chunks(samples, chunk_size):
+        append_records(predict_batch(model, tokenizer, chunk, input_field, batch_size, max_length), output_data_path)
+        n_samples += len(chunk)
+    return n_samples
+
+
+def _merge_shards(shard_paths: List[str], output_path: str):
+    """Concatenate shard outputs in order; shards are consecutive byte ranges of the input, so
+    this restores the input order."""
+    with open(output_path, "w") as out:
+        for path in shard_paths:
+            # Shards without records have no output file
+            if Path(path).exists():
+                with open(path) as f:
+                    shutil.copyfileobj(f, out)
+                os.remove(path)
+
+
+def predict(
+    model_path: Annotated[str, Option(help="Path to a model saved by finetune")],
+    input_data_path: Annotated[str, Option(help="Path to jsonlines data to classify")],
+    output_data_path: Annotated[str, Option(help="Path to save jsonlines predictions")],
+    input_field: Annotated[str, Option(help="The field to use as input to the transformer")] = "text",
+    batch_size: Annotated[int, Option(help="Samples per forward pass")] = 32,
+    max_length: Annotated[int, Option(help="Maximum tokens per sample (defaults to the tokenizer's maximum, at most 512)")] = None,
+    num_threads: Annotated[int, Option(help="Torch intra-op threads per process")] = None,
+    num_proc: Annotated[int, Option(help="Number of processes, each classifying a byte range of the input")] = 1,
+    chunk_size: Annotated[int, Option(help="Samples classified between writes to the output file")] = 1000,
+):
+    """CLI entry point to classify a jsonlines dataset with a fine-tuned model."""
+    # Expand user paths
+    model_path = str(Path(model_path).expanduser())
+    input_data_path = str(Path(input_data_path).expanduser())
+    output_data_path = str(Path(output_data_path).expanduser())
+    Path(output_data_path).unlink(missing_ok=True)
+
+    start = time.time()
+    kwargs = dict(
+        model_path=model_path,
+        input_data_path=input_data_path,
+        input_field=input_field,
+        batch_size=batch_size,
+        max_length=max_length,
+        num_threads=num_threads,
+        chunk_size=chunk_size,
+    )
+    ranges = byte_ranges(input_data_path, num_proc)
+    if len(ranges) <= 1:
+        n_samples = _predict_shard(output_data_path=output_data_path, **kwargs)
+    else:
+        # Each process reads and classifies a contiguous byte range of the input into its own file
+        shard_paths = [f"{output_data_path}.shard{i}" for i in range(len(ranges))]
+        for path in shard_paths:
+            Path(path).unlink(missing_ok=True)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context) as executor:
+            futures = [
+                executor.submit(_predict_shard, output_data_path=path, start=start, end=end, **kwargs)
+                for path, (start, end) in zip(shard_paths, ranges)
+            ]
+            n_samples = sum(x.result() for x in futures)
+        _merge_shards(shard_paths, output_data_path)
+
+    elapsed = time.time() - start
+    print(f"Classified {n_samples} samples in {elapsed:.1f}s ({n_samples / elapsed:.1f} samples/s), saved to {output_data_path}")
+
+
+def main():
+    """CLI entry point."""
+    app = typer.Typer(add_completion=False, pretty_exceptions_show_locals=False)
+    app.command()(predict)
+    app()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+from copy import deepcopy
+from typing import Dict
+
+
+ALLOWED_LABELS_FIELD = "allowed_labels"
+
+
+def inline_allowed_labels(config: Dict, classes_md: str) -> Dict:
+    """Move the allowed labels from a per-sample input into the static prompt preamble.
+
+    Providers cache the longest shared prefix of repeated requests, so placing the label set
+    in the prompt details (ahead of any per-sample inputs) lets every request after the first
+    reuse it.
+
+    Args:
+        config: Prompt configuration dictionary
+        classes_md: Markdown list of allowed labels
+
+    Returns:
+        A copy of the config without an `allowed_labels` input and with the labels in its details
+    """
+    config = deepcopy(config)
+
+    def drop_input(inputs):
+        return [x for x in inputs if x.get("name") != ALLOWED_LABELS_FIELD]
+
+    if "inputs" in config:
+        config["inputs"] = drop_input(config["inputs"])
+    for output in config.get("outputs", []):
+        if "inputs" in output:
+            output["inputs"] = drop_input(output["inputs"])
+
+    details = config.get("details") or ""
+    config["details"] = (
+        f"{details}\n\nThe set of allowed labels (`{ALLOWED_LABELS_FIELD}`):\n\n{classes_md}".strip()
+    )
+    return config
+
+
+def format_cache_summary(tokens: Dict[str, int]) -> str:
+    """Describe cached vs uncached input tokens from `AnnotationMetrics` token totals."""
+    input_tokens = tokens.get("input_tokens", 0)
+    cached_tokens = tokens.get("cached_tokens", 0)
+    share = cached_tokens / input_tokens if input_tokens else 0
+    return (
+        f"Prompt cache: {cached_tokens} cached and {input_tokens - cached_tokens} uncached input tokens "
+        f"({share:.1%} cached, {tokens.get('cache_write_tokens', 0)} tokens written to cache)"
+    )
@@ -0,0 +1,224 @@
+"""Mergeable sketches for summarizing data streams in bounded memory.
+
+Each sketch consumes chunks of values with `update` and combines with a sketch built
+from other chunks (e.g. in another process) with `merge`, so partial summaries can be
+computed in parallel and merged in any order.
+"""
+import math
+import random
+from collections import Counter
+from typing import Hashable, List, Sequence, Tuple
+
+import numpy as np
+import polars as pl
+
+
+class Welford:
+    """Count, mean, variance, minimum and maximum, exact up to floating point rounding.
+
+    Chunks are combined with the parallel variance update of Chan et al., which is
+    numerically stable like Welford's one-value-at-a-time update.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, values: Sequence[float]):
+        if not len(values):
+            return
+        x = np.asarray(values, dtype=np.float64)
+        other = Welford()
+        other.n, other.mean = len(x), x.mean()
+        other.m2 = ((x - other.mean) ** 2).sum()
+        other.min, other.max = min(values), max(values)
+        self.merge(other)
+
+    def merge(self, other: "Welford"):
+        if not other.n:
+            return
+        if not self.n:
+            self.n, self.mean, self.m2, self.min, self.max = other.n, other.mean, other.m2, other.min, other.max
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta ** 2 * self.n * other.n / n
+        self.n = n
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation (0 for fewer than 2 values)."""
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang and Liberty, 2016).
+
+    Values are kept in levels of compactors, where a value at level `h` stands for `2^h`
+    values. A full level is sorted and every other value (from a random offset) is promoted
+    to the next level, so memory stays O(k) values plus a few per level.
+
+    The rank of a returned quantile differs from the requested rank by at most about 1.65% of
+    the number of values with 99% confidence for the default k=200 (the error is proportional
+    to `1 / k`, and typically under 1%); the sketch is exact until it holds more than `k` values.
+    """
+
+    def __init__(self, k: int = 200, seed: int = None):
+        self.k = k
+        self.n = 0
+        self.levels = [[]]
+        self.rng = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items = sorted(self.levels[level])
+                # Keep one value at this level if the count is odd, so weights are preserved
+                kept = [items.pop()] if len(items) % 2 else []
+                self.levels[level + 1].extend(items[self.rng.randint(0, 1)::2])
+                self.levels[level] = kept
+            level += 1
+
+    def update(self, values: Sequence[float]):
+        self.levels[0].extend(values)
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._compress()
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        """Estimate the values at the given quantiles (between 0 and 1) of the values seen."""
+        weighted = sorted((x, 2 ** level) for level, items in enumerate(self.levels) for x in items)
+        results = []
+        for q in qs:
+            # Average the two middle values of an even count at the median, as `statistics.median`
+            target, cumulative = q * self.n, 0
+            results.append(None)
+            for i, (x, weight) in enumerate(weighted):
+                cumulative += weight
+                if cumulative > target or (cumulative == target and i == len(weighted) - 1):
+                    results[-1] = x
+                    break
+                if cumulative == target:
+                    results[-1] = (x + weighted[i + 1][0]) / 2
+                    break
+        return results
+
+
+def hash_values(values: Sequence) -> np.ndarray:
+    """Hash numbers or strings to 64-bit integers (numbers by float value, so 1 and 1.0 match).
+
+    Hashes are consistent within a Polars version, so sketches from processes using the same
+    environment can be merged.
+    """
+    numbers = [x for x in values if isinstance(x, (int, float))]
+    others = [str(x) for x in values if not isinstance(x, (int, float))]
+    hashes = []
+    if numbers:
+        hashes.append(pl.Series(numbers, dtype=pl.Float64).hash(seed=0).to_numpy())
+    if others:
+        hashes.append(pl.Series(others, dtype=pl.String).hash(seed=0).to_numpy())
+    return np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct count sketch (Flajolet et al., 2007) with `2^p` one-byte registers.
+
+    The relative standard error of the estimate is about `1.04 / sqrt(2^p)` (1.6% for the
+    default p=12, using 4 KiB); small counts use linear counting and are nearly exact.
+    """
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.registers = np.zeros(2 ** p, dtype=np.uint8)
+
+    def update(self, values: Sequence):
+        hashes = hash_values(values)
+        if not len(hashes):
+            return
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        # Position of the first set bit of the remaining bits, from the exponent of their top 53 bits
+        top = (rest >> np.uint64(11)).astype(np.float64)
+        leading_zeros = 53 - np.frexp(top)[1]
+        rank = np.minimum(leading_zeros + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        if other.p != self.p:
+            raise ValueError("Can't merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.power(2.0, -self.registers.astype(np.float64)).sum()
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+class SpaceSaving:
+    """Space-saving heavy hitters sketch (Metwally et al., 2005) keeping `capacity` counters.
+
+    Counts are exact while there are at most `capacity` distinct values. Beyond that, each
+    reported count overestimates the true count by at most `n / capacity` (n values seen), and
+    every value occurring more than `n / capacity` times is reported. Summaries are merged as
+    in Agarwal et al. (2012), preserving these bounds.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.n = 0
+        self.counts = {}
+        self.errors = {}
+        # Whether a counter has ever been dropped; until then, all counts are exact
+        self.evicted = False
+
+    def _floor(self) -> int:
+        """Largest possible count of a value without a counter."""
+        return min(self.counts.values()) if self.evicted else 0
+
+    def _combine(self, counts: dict, errors: dict, floor: int, n: int):
+        self_floor = self._floor()
+        merged, merged_errors = {}, {}
+        for x in self.counts.keys() | counts.keys():
+            merged[x] = self.counts.get(x, self_floor) + counts.get(x, floor)
+            merged_errors[x] = self.errors.get(x, self_floor) + errors.get(x, floor)
+        top = sorted(merged, key=merged.__getitem__, reverse=True)[:self.capacity]
+        self.counts = {x: merged[x] for x in top}
+        self.errors = {x: merged_errors[x] for x in top}
+        self.evicted = self.evicted or len(merged) > self.capacity
+        self.n += n
+
+    def update(self, values: Sequence[Hashable]):
+        # A chunk's exact counts form a summary without error
+        counts = Counter(values)
+        self._combine(counts, {}, 0, len(values))
+
+    def merge(self, other: "SpaceSaving"):
+        self._combine(other.counts, other.errors, other._floor(), other.n)
+        self.evicted = self.evicted or other.evicted
+
+    def top(self, n: int) -> List[Tuple[Hashable, int]]:
+        """The `n` values with the highest estimated counts, by count (descending) then value (numbers before strings)."""
+        return sorted(self.counts.items(), key=lambda x: (-x[1], isinstance(x[0], str), x[0]))[:n]
@@ -1,14 +1,137 @@
+import hashlib
+import json
 import random
-from typing import List, Dict, Any
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Annotated, List, Dict, Any, Hashable, Iterable
 
+import typer
+from typer import Option
 
-def split_data(data: List[Dict[Any, Any]], proportions: List[float]) -> List[List[Dict[Any, Any]]]:
+from annotate_and_finetune.streaming import iter_jsonl
+
+
+def _validate_proportions(proportions: List[float]):
+    if not proportions:
+        raise ValueError("Proportions list cannot be empty")
+
+    if any(p < 0 for p in proportions):
+        raise ValueError("Proportions cannot be negative")
+
+    if not 0.99999 <= sum(proportions) <= 1.00001:  # Account for floating point imprecision
+        raise ValueError(f"Proportions must sum to 1, got {sum(proportions)}")
+
+
+def hash_fraction(value: Any, seed: int = 0) -> float:
+    """Map a value to a stable pseudo-random number in [0, 1), independent of the Python process."""
+    digest = hashlib.blake2b(f"{seed}:{json.dumps(value, default=str)}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+def hash_split(value: Any, proportions: List[float], seed: int = 0) -> int:
+    """Assign a value to a split with probability given by `proportions`, by hashing it."""
+    u = hash_fraction(value, seed)
+    cumulative = 0.0
+    for i, proportion in enumerate(proportions):
+        cumulative += proportion
+        if u < cumulative:
+            return i
+    return len(proportions) - 1
+
+
+def _largest_remainder(quotas: List[float]) -> List[int]:
+    """Round quotas down, then round up the ones with the largest remainders so the counts keep the quotas' total."""
+    counts = [int(q + 1e-9) for q in quotas]
+    order = sorted(range(len(quotas)), key=lambda j: counts[j] - quotas[j])
+    for j in order[:round(sum(quotas)) - sum(counts)]:
+        counts[j] += 1
+    return counts
+
+
+def _stratified_targets(sizes: Dict[Hashable, int], proportions: List[float]) -> Dict[Hashable, List[int]]:
+    """Split the size of each stratum into per-split target counts.
+
+    Each stratum gets the floor of its quotas, and the items left over are handed out across
+    all strata by largest remainder, so the split totals match the proportions of the whole data
+    and strata smaller than the number of splits still fill the small splits.
+    """
+    totals = _largest_remainder([p * sum(sizes.values()) for p in proportions])
+    targets, seats = {}, []
+    for stratum, size in sizes.items():
+        quotas = [p * size for p in proportions]
+        targets[stratum] = [int(q + 1e-9) for q in quotas]
+        seats.extend((q - n, stratum, j) for j, (q, n) in enumerate(zip(quotas, targets[stratum])))
+    columns = [sum(x[j] for x in targets.values()) for j in range(len(proportions))]
+    remaining = {stratum: size - sum(targets[stratum]) for stratum, size in sizes.items()}
+    for _, stratum, j in sorted(seats, key=lambda x: -x[0]):
+        if remaining[stratum] and columns[j] < totals[j]:
+            targets[stratum][j] += 1
+            columns[j] += 1
+            remaining[stratum] -= 1
+    # Give any items still left over to the splits furthest below their totals
+    for stratum in sizes:
+        for _ in range(remaining[stratum]):
+            j = max(range(len(proportions)), key=lambda j: totals[j] - columns[j])
+            targets[stratum][j] += 1
+            columns[j] += 1
+    return targets
+
+
+def _stratified_split(units: Dict[Hashable, Counter], proportions: List[float], seed: int) -> Dict[Hashable, int]:
+    """Assign units (rows or groups) to splits so every stratum is split in the given proportions.
+
+    Args:
+        units: Count of rows per stratum value of each unit; a unit's stratum is its most common value
+        proportions: List of float values that sum to 1, one per split
+        seed: Random seed for hashing
+
+    Returns:
+        Split index of each unit
+    """
+    strata = {unit: values.most_common(1)[0][0] for unit, values in units.items()}
+    sizes = Counter()
+    ordered = sorted(units, key=lambda x: hash_fraction(x, seed))
+    for unit in ordered:
+        sizes[strata[unit]] += sum(units[unit].values())
+    targets = _stratified_targets(sizes, proportions)
+
+    # Visit units in hash order, assigning each to the split furthest below its stratum's target
+    counts = defaultdict(lambda: [0] * len(proportions))
+    unit_split = {}
+    for unit in ordered:
+        stratum_targets, stratum_counts = targets[strata[unit]], counts[strata[unit]]
+        split = max(range(len(proportions)), key=lambda j: stratum_targets[j] - stratum_counts[j])
+        stratum_counts[split] += sum(units[unit].values())
+        unit_split[unit] = split
+    return unit_split
+
+
+def split_data(
+    data: List[Dict[Any, Any]],
+    proportions: List[float],
+    key: str = None,
+    group_key: str = None,
+    stratify_key: str = None,
+    seed: int = None,
+) -> List[List[Dict[Any, Any]]]:
     """
-    Randomly shuffle a list of dictionaries and split it into sublists according to given proportions.
+    Split a list of dictionaries into sublists according to given proportions.
+
+    Without keys, the data is shuffled (with `seed`, if given) and cut into splits of exactly
+    the given proportions. With a `key` or `group_key`, each row (or group of rows sharing a
+    `group_key` value) is assigned to a split by a stable hash of its key, so the assignment is
+    reproducible across runs and unchanged when rows are added. With a `stratify_key`, the rows
+    of each stratum (e.g. label) are split in the given proportions, taking groups in hash order.
+    Stratified splits are reproducible for the same data, but not stable as data grows: the
+    per-stratum quotas change when rows are added, which can move existing rows between splits.
 
     Args:
         data: List of dictionaries to be split
         proportions: List of float values that sum to 1, representing the proportion of data for each split
+        key: Field uniquely identifying each row
+        group_key: Field whose rows must all be in the same split (e.g. a conversation id)
+        stratify_key: Field whose values are split in the given proportions (e.g. the label)
+        seed: Random seed for shuffling or hashing
 
     Returns:
         List of lists, where each inner list contains dictionaries according to the specified proportions
@@ -17,24 +140,23 @@ def split_data(data: List[Dict[Any, Any]], proportions: List[float]) -> List[Lis
         ValueError: If proportions don't sum to 1 (within floating point precision)
         ValueError: If any proportion is negative
         ValueError: If proportions list is empty
+        ValueError: If `stratify_key` is given without `key` or `group_key`
     """
     # Input validation
-    if not proportions:
-        raise ValueError("Proportions list cannot be empty")
-
-    if any(p < 0 for p in proportions):
-        raise ValueError("Proportions cannot be negative")
-
-    if not 0.99999 <= sum(proportions) <= 1.00001:  # Account for floating point imprecision
-        raise ValueError(f"Proportions must sum to 1, got {sum(proportions)}")
+    _validate_proportions(proportions)
 
     # Handle empty input data
     if not data:
         return [[] for _ in proportions]
 
+    if key is not None or group_key is not None:
+        return _hash_split_data(data, proportions, key, group_key, stratify_key, seed or 0)
+    if stratify_key is not None:
+        raise ValueError("Stratified splitting requires a key or group_key")
+
     # Create a copy and shuffle it
     shuffled_data = data.copy()
-    random.shuffle(shuffled_data)
+    random.Random(seed).shuffle(shuffled_data)
 
     # Calculate the actual number of items for each split
     total_items = len(shuffled_data)
@@ -59,3 +181,121 @@ def split_data(data: List[Dict[Any, Any]], proportions: List[float]) -> List[Lis
         start_idx += size
 
     return result
+
+
+def _hash_split_data(
+    data: List[Dict[Any, Any]],
+    proportions: List[float],
+    key: str,
+    group_key: str,
+    stratify_key: str,
+    seed: int,
+) -> List[List[Dict[Any, Any]]]:
+    """Split rows by hashed keys, keeping groups together and optionally stratifying (see `split_data`)."""
+    unit_key = group_key or key
+    if stratify_key is None:
+        unit_split = {row[unit_key]: hash_split(row[unit_key], proportions, seed) for row in data}
+    else:
+        units = defaultdict(Counter)
+        for row in data:
+            units[row[unit_key]][row.get(stratify_key)] += 1
+        unit_split = _stratified_split(units, proportions, seed)
+
+    result = [[] for _ in proportions]
+    for row in data:
+        result[unit_split[row[unit_key]]].append(row)
+    return result
+
+
+def split_jsonl(
+    input_path: str,
+    output_paths: List[str],
+    proportions: List[float],
+    key: str,
+    group_key: str = None,
+    stratify_key: str = None,
+    seed: int = 0,
+    drop_fields: Iterable[str] = (),
+) -> List[int]:
+    """Split a jsonlines file into one file per split without loading it into memory.
+
+    Rows (or groups of rows sharing a `group_key` value) are assigned by a stable hash of their
+    key, as in `split_data`. With a `stratify_key`, a first pass collects the key and stratum of
+    each row (but not the rows themselves), so the splits match the stratified `split_data` exactly
+    (including its instability as the data grows).
+
+    Args:
+        input_path: Path to the jsonlines file to split
+        output_paths: Paths of the output jsonlines files, one per split
+        proportions: List of float values that sum to 1, one per split
+        key: Field uniquely identifying each row
+        group_key: Field whose rows must all be in the same split (e.g. a conversation id)
+        stratify_key: Field whose values are split in the given proportions (e.g. the label)
+        seed: Random seed for hashing
+        drop_fields: Fields to leave out of the output rows
+
+    Returns:
+        Number of rows written to each split
+    """
+    _validate_proportions(proportions)
+    if len(output_paths) != len(proportions):
+        raise ValueError("There must be one output path per proportion")
+
+    unit_key = group_key or key
+    unit_split = None
+    if stratify_key is not None:
+        units = defaultdict(Counter)
+        for row in iter_jsonl(input_path):
+            units[row[unit_key]][row.get(stratify_key)] += 1
+        unit_split = _stratified_split(units, proportions, seed)
+
+    counts = [0] * len(proportions)
+    for path in output_paths:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+    files = [open(path, "w") for path in output_paths]
+    try:
+        for row in iter_jsonl(input_path):
+            if unit_split is not None:
+                split = unit_split[row[unit_key]]
+            else:
+                split = hash_split(row[unit_key], proportions, seed)
+            if drop_fields:
+                row = {k: v for k, v in row.items() if k not in drop_fields}
+            files[split].write(json.dumps(row) + "\n")
+            counts[split] += 1
+    finally:
+        for f in files:
+            f.close()
+    return counts
+
+
+def split(
+    input_data_path: Annotated[str, Option(help="Path to jsonlines data to split")],
+    output_path: Annotated[str, Option(help="Directory to save the splits to")],
+    proportions: Annotated[str, Option(help="Comma separated split proportions")] = "0.8,0.1,0.1",
+    names: Annotated[str, Option(help="Comma separated split names")] = "train,val,test",
+    key: Annotated[str, Option(help="Field uniquely identifying each row")] = "id",
+    group_key: Annotated[str, Option(help="Field whose rows must all be in the same split")] = None,
+    stratify_key: Annotated[str, Option(help="Field whose values are split in the given proportions (adding rows can then move existing rows between splits)")] = None,
+    seed: Annotated[int, Option(help="Random seed for hashing")] = 0,
+):
+    """CLI entry point to split a jsonlines dataset without loading it into memory."""
+    input_data_path = str(Path(input_data_path).expanduser())
+    output_path = str(Path(output_path).expanduser())
+    proportions = [float(x) for x in proportions.split(",")]
+    names = names.split(",")
+    output_paths = [f"{output_path}/{name}.jsonl" for name in names]
+    counts = split_jsonl(input_data_path, output_paths, proportions, key, group_key, stratify_key, seed)
+    for path, count in zip(output_paths, counts):
+        print(f"Saved {count} rows to {path}")
+
+
+def main():
+    """CLI entry point."""
+    app = typer.Typer(add_completion=False, pretty_exceptions_show_locals=False)
+    app.command()(split)
+    app()
+
+
+if __name__ == "__main__":
+    main()
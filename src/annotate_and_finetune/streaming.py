@@ -0,0 +1,138 @@
+import json
+import os
+import random
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+import numpy as np
+
+
+T = TypeVar("T")
+
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    """Lazily read records from a jsonlines file, one line at a time."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def byte_ranges(path: str, n: int) -> List[Tuple[int, int]]:
+    """Split a file into `n` contiguous byte ranges of about equal size (for `iter_jsonl_range`)."""
+    size = os.path.getsize(path)
+    bounds = [size * i // n for i in range(n + 1)]
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def iter_jsonl_range(path: str, start: int, end: int) -> Iterator[Dict]:
+    """Lazily read the records of a jsonlines file whose lines start in the byte range [start, end).
+
+    Ranges from `byte_ranges` cover every line of the file exactly once, so each range can be
+    read by a different process.
+    """
+    with open(path, "rb") as f:
+        if start > 0:
+            # Skip to the first line starting at or after `start`
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                yield json.loads(line)
+
+
+def count_lines(path: str, block_size: int = 2 ** 24) -> int:
+    """Count the lines of a file (including a last line without a newline) by scanning raw bytes."""
+    n_lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            n_lines += block.count(b"\n")
+            last = block[-1:]
+    return n_lines + (last != b"\n")
+
+
+def line_offsets(path: str, line_numbers: Iterable[int], block_size: int = 2 ** 24) -> Dict[int, int]:
+    """Find the byte offsets at which the given (0-based) lines of a file start, in one pass.
+
+    Blocks without a requested line are skipped after counting their newlines, so only the
+    requested offsets are held in memory.
+    """
+    targets = sorted(set(line_numbers))
+    # Line 0 starts at offset 0; line t starts after the t-th newline
+    offsets = {0: 0} if targets and targets[0] == 0 else {}
+    i = len(offsets)
+    line, position = 0, 0
+    with open(path, "rb") as f:
+        while i < len(targets) and (block := f.read(block_size)):
+            n_newlines = block.count(b"\n")
+            if targets[i] <= line + n_newlines:
+                newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord("\n"))
+                while i < len(targets) and targets[i] <= line + n_newlines:
+                    offsets[targets[i]] = position + int(newlines[targets[i] - line - 1]) + 1
+                    i += 1
+            line += n_newlines
+            position += len(block)
+    return offsets
+
+
+def sample_jsonl(path: str, n: int, seed: int = None) -> List[Dict]:
+    """Uniformly sample `n` records of a jsonlines file, parsing only the sampled lines.
+
+    Lines are counted and the sampled lines located by scanning raw bytes, then read by seeking
+    to their offsets, so memory holds only the samples. Blank sampled lines are skipped, so
+    fewer than `n` records may be returned if the file has blank lines.
+
+    Args:
+        path: Path to the jsonlines file
+        n: Number of records to sample
+        seed: Random seed
+
+    Returns:
+        List of at most `n` sampled records, in random order
+    """
+    n_lines = count_lines(path)
+    line_numbers = random.Random(seed).sample(range(n_lines), min(n, n_lines))
+    offsets = line_offsets(path, line_numbers)
+    records = []
+    with open(path, "rb") as f:
+        for line_number in line_numbers:
+            f.seek(offsets[line_number])
+            line = f.readline()
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def iter_chunks(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Split an iterable into lists of at most `size` items."""
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def reservoir_sample(items: Iterable[T], n: int, seed: int = None) -> List[T]:
+    """Uniformly sample `n` items from an iterable of unknown length in a single pass.
+
+    Only the `n` sampled items are held in memory.
+
+    Args:
+        items: Iterable to sample from
+        n: Number of items to sample
+        seed: Random seed
+
+    Returns:
+        List of at most `n` sampled items
+    """
+    rng = random.Random(seed)
+    reservoir = []
+    for i, item in enumerate(items):
+        if i < n:
+            reservoir.append(item)
+        else:
+            j = rng.randint(0, i)
+            if j < n:
+                reservoir[j] = item
+    return reservoir
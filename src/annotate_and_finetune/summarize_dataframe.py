@@ -0,0 +1,128 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Annotated, List, Tuple, Union
+
+import polars as pl
+import typer
+from typer import Option
+
+from llmpipe import read_data
+from annotate_and_finetune.streaming import count_lines, sample_jsonl
+from annotate_and_finetune.summarize_list import summarize_series
+
+
+def load_dataframe(data_path: str, max_rows: int = None, seed: int = None) -> Tuple[pl.DataFrame, bool]:
+    """Load a dataset into a DataFrame, reading jsonlines files directly into Arrow memory.
+
+    Args:
+        data_path: Dataset path
+        max_rows: Load a random sample of at most this many rows (None for all rows). Jsonlines
+            files are sampled by line offsets, so only the sampled rows are read into memory.
+        seed: Random seed for sampling
+
+    Returns:
+        DataFrame of the (sampled) rows, and whether rows were sampled (False if the dataset
+        has at most `max_rows` rows and was loaded whole)
+    """
+    if data_path.endswith(".jsonl"):
+        if max_rows is not None and count_lines(data_path) > max_rows:
+            return pl.from_dicts(sample_jsonl(data_path, max_rows, seed), infer_schema_length=100000), True
+        return pl.read_ndjson(data_path, infer_schema_length=100000), False
+    data = read_data(data_path)
+    if max_rows is not None and len(data) > max_rows:
+        return pl.from_dicts(random.Random(seed).sample(data, max_rows), infer_schema_length=100000), True
+    return pl.from_dicts(data, infer_schema_length=100000), False
+
+
+def flatten_columns(df: pl.DataFrame) -> List[Tuple[str, pl.Series]]:
+    """List the columns of a DataFrame to summarize, with struct fields as separate columns.
+
+    Struct fields are named `column.field`, and the struct fields of lists of structs
+    `column[].field` (summarizing the values of all list elements).
+    """
+    columns = []
+    pending = [(name, df[name]) for name in df.columns]
+    while pending:
+        name, series = pending.pop(0)
+        dtype = series.dtype
+        if isinstance(dtype, pl.List) and isinstance(dtype.inner, pl.Struct):
+            name, series, dtype = f"{name}[]", series.drop_nulls().explode(empty_as_null=False), dtype.inner
+        if isinstance(dtype, pl.Struct):
+            fields = series.struct.unnest()
+            pending = [(f"{name}.{x}", fields[x]) for x in fields.columns] + pending
+        else:
+            columns.append((name, series))
+    return columns
+
+
+def summarize_dataframe(
+    data: Union[pl.DataFrame, str],
+    n_examples: int = 10,
+    num_threads: int = None,
+    max_rows: int = None,
+    seed: int = None,
+) -> str:
+    """
+    Generate a markdown report with the `summarize_list` summary of every column of a dataset.
+
+    Columns are summarized in parallel on a thread pool; the summaries are computed from the
+    columns' Arrow buffers, which Polars processes without holding the GIL.
+
+    Args:
+        data: DataFrame or path to a dataset
+        n_examples: Number of most frequent values to show in each count table
+        num_threads: Number of threads (default: one per CPU)
+        max_rows: Summarize a random sample of at most this many rows (None for all rows)
+        seed: Random seed for sampling
+
+    Returns:
+        str: Markdown report with a section per column (and per struct field)
+    """
+    if isinstance(data, str):
+        df, sampled = load_dataframe(data, max_rows, seed)
+    else:
+        sampled = max_rows is not None and data.height > max_rows
+        df = data.sample(max_rows, seed=seed) if sampled else data
+    columns = flatten_columns(df)
+
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        summaries = list(pool.map(lambda x: summarize_series(x[1], n_examples), columns))
+
+    if sampled:
+        report = f"The summary is based on a random sample of {df.height} rows with {df.width} columns.\n"
+    else:
+        report = f"The dataset contains {df.height} rows and {df.width} columns.\n"
+    for (name, series), summary in zip(columns, summaries):
+        report += f"\n## {name} ({series.dtype})\n\n{summary.strip()}\n"
+    return report
+
+
+def summarize_data(
+    data_path: Annotated[str, Option(help="Dataset path")],
+    output_path: Annotated[str, Option(help="Path to save the summary")] = None,
+    n_examples: Annotated[int, Option(help="Number of most frequent values to show per column")] = 10,
+    num_threads: Annotated[int, Option(help="Number of threads (default: one per CPU)")] = None,
+    max_rows: Annotated[int, Option(help="Summarize a random sample of at most this many rows (default: all rows)")] = None,
+    seed: Annotated[int, Option(help="Random seed for sampling")] = None,
+):
+    """Summarize every column of a dataset and print the report or save it."""
+    report = summarize_dataframe(str(Path(data_path).expanduser()), n_examples, num_threads, max_rows, seed)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write("Data summary:\n\n")
+            f.write(report)
+        print(f"Saved data summary to {output_path}")
+    else:
+        print(report)
+
+
+def main():
+    """CLI entry point."""
+    app = typer.Typer(add_completion=False, pretty_exceptions_show_locals=False)
+    app.command()(summarize_data)
+    app()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
-from typing import List, Dict, Union, Optional, TypeVar
+from typing import Any, Callable, List, Dict, Tuple, Union, Optional, TypeVar
 import statistics
+import sys
 from collections import Counter
+from itertools import chain
+import json
 import re
 
+import polars as pl
+
 
 T = TypeVar('T', int, float, str)
 NestedList = List[Optional[Union[T, List[Optional[T]]]]]
 
+# Largest magnitude at which every integer is exactly representable as a float
+MAX_EXACT_FLOAT = 2 ** 53
+
 
 def summarize_list(values: NestedList, n_examples: int = 10) -> str:
     """
@@ -22,78 +30,275 @@ def summarize_list(values: NestedList, n_examples: int = 10) -> str:
     Returns:
         str: A descriptive summary of the list's statistical properties
     """
-    # Check if we have a list of lists
-    has_nested_lists = any(isinstance(x, list) for x in values if x is not None)
+    # Values that fit a flat column can't contain nested lists, so only check the others
+    series = _to_series(values)
+    has_nested_lists = series is None and any(isinstance(x, list) for x in values if x is not None)
 
     if not has_nested_lists:
-        return _summarize_flat_list(values, n_examples)
+        return _summarize_flat_list(values, n_examples, series)
 
     return _summarize_nested_list(values, n_examples)
 
 
-def _summarize_flat_list(values: List[Optional[T]], n_examples: int) -> str:
-    """Helper function to summarize a flat list (original functionality)."""
-    # Count total items and None values
-    total_items = len(values)
-    none_count = sum(1 for x in values if x is None)
+def summarize_series(series: pl.Series, n_examples: int = 10) -> str:
+    """
+    Generate the `summarize_list` summary of a Polars Series, computing it from the Series'
+    Arrow buffers rather than Python objects where possible.
+
+    List columns are summarized as nested lists. Temporal values are summarized as strings,
+    and values of other types (e.g. structs) as JSON strings.
 
-    # Get list of non-None values
-    valid_values = [x for x in values if x is not None]
+    Args:
+        series: Series to summarize
+        n_examples: Number of most frequent values to show in count table
+
+    Returns:
+        str: A descriptive summary of the Series' statistical properties
+    """
+    if isinstance(series.dtype, pl.List):
+        return _summarize_nested_list(None, n_examples, series)
+    native = _native_series(series)
+    if native is not None:
+        return _summarize_flat_list(None, n_examples, native)
+    return summarize_list([None if x is None else json.dumps(x, default=str) for x in series.to_list()], n_examples)
+
+
+def _round_safely(approx: float, error: float, exact: Callable[[], float]) -> float:
+    """Return a floating point estimate, or the exact value if an `error` could change its rounding to 2 decimals."""
+    if f"{approx - error:.2f}" != f"{approx + error:.2f}":
+        return exact()
+    return approx
+
+
+def _to_series(values: List[Any]) -> Optional[pl.Series]:
+    """Convert a list to an integer, float or string Series, or return None if its values
+    don't all fit one of these types."""
+    first = next((x for x in values if x is not None), None)
+    if isinstance(first, list):
+        return None
+    dtypes = [pl.String] if isinstance(first, str) else [pl.Int64, pl.Float64]
+    for dtype in dtypes:
+        try:
+            return pl.Series("value", values, dtype=dtype, strict=True)
+        except (TypeError, ValueError, OverflowError, pl.exceptions.PolarsError):
+            continue
+    return None
+
+
+def _native_series(series: pl.Series) -> Optional[pl.Series]:
+    """Cast a Series to the integer, float or string type used by `_series_stats`, or return None
+    if its values don't fit one of these types."""
+    dtype = series.dtype
+    if dtype.is_integer() or dtype == pl.Boolean:
+        target = pl.Int64
+    elif dtype.is_float():
+        target = pl.Float64
+    elif dtype in (pl.String, pl.Categorical) or isinstance(dtype, pl.Enum) or dtype.is_temporal():
+        target = pl.String
+    else:
+        return None
+    try:
+        return series.cast(target, strict=True).rename("value")
+    except pl.exceptions.PolarsError:
+        return None
+
+
+def _series_stats(valid: pl.Series, n_examples: int) -> Optional[Dict]:
+    """Compute the summary statistics of a Series without nulls in a few vectorized passes.
+
+    Returns None for values whose statistics or counts could differ from `_python_stats`
+    (NaN, infinity, negative zero, integers not exactly representable as floats).
+    """
+    is_numeric = valid.dtype != pl.String
+    stats = {"n_valid": len(valid), "is_numeric": is_numeric}
+    if is_numeric:
+        n = len(valid)
+        min_val, max_val = valid.min(), valid.max()
+        magnitude = max(abs(min_val), abs(max_val))
+        if valid.dtype == pl.Float64:
+            zeros = valid.filter(valid == 0)
+            if (
+                valid.is_nan().any() or valid.is_infinite().any() or magnitude >= MAX_EXACT_FLOAT
+                or (1 / zeros < 0).any()  # Negative zeros, which Counter merges with positive zeros
+            ):
+                return None
+            # Summation error bound, falling back to the exact mean of `statistics.mean` near rounding ties
+            mean_val = _round_safely(
+                valid.mean(), n * sys.float_info.epsilon * valid.abs().mean(),
+                lambda: statistics.mean(valid.to_list())
+            )
+        else:
+            if magnitude * n >= 2 ** 63:
+                return None
+            # The integer sum is exact, so the mean is correctly rounded as with `statistics.mean`
+            mean_val = valid.sum() / n
+        median_val = _round_safely(
+            valid.median(), 4 * sys.float_info.epsilon * magnitude, lambda: statistics.median(valid.to_list())
+        )
+        std_val = 0
+        if n > 1:
+            std_val = valid.std()
+            std_val = _round_safely(
+                std_val, n * sys.float_info.epsilon * (std_val + magnitude), lambda: statistics.stdev(valid.to_list())
+            )
+        stats |= {"min": min_val, "max": max_val, "mean": mean_val, "median": median_val, "std": std_val}
+
+    # Select the top values by count (descending), then by value (ascending), without sorting all values
+    value_counts = valid.value_counts()
+    top_counts = value_counts.top_k(n_examples, by=["count", "value"], reverse=[False, True])
+    top_counts = top_counts.sort(["count", "value"], descending=[True, False])
+    stats["n_unique"] = len(value_counts)
+    stats["top_counts"] = top_counts.rows()
+    return stats
+
+
+def _python_stats(valid_values: List[T], n_examples: int) -> Dict:
+    """Compute the summary statistics of a list without None values, for any mix of types."""
+    is_numeric = all(isinstance(x, (int, float)) for x in valid_values)
+    stats = {"n_valid": len(valid_values), "is_numeric": is_numeric}
+    if is_numeric:
+        stats |= {
+            "min": min(valid_values),
+            "max": max(valid_values),
+            "mean": statistics.mean(valid_values),
+            "median": statistics.median(valid_values),
+            "std": statistics.stdev(valid_values) if len(valid_values) > 1 else 0,
+        }
+
+    value_counts = Counter(valid_values)
+    # Sort by count (descending), then by value (ascending)
+    stats["n_unique"] = len(value_counts)
+    stats["top_counts"] = sorted(value_counts.items(), key=lambda x: (-x[1], x[0]))[:n_examples]
+    return stats
+
+
+def _count_and_stats(values: List[Optional[T]], series: Optional[pl.Series], n_examples: int) -> Tuple[int, Optional[Dict]]:
+    """Count the None values of a list and compute the statistics of the others, vectorized when possible.
 
+    Args:
+        values: List of values (None to take them from `series`)
+        series: The values as returned by `_to_series` or `_native_series`
+        n_examples: Number of most frequent values to return
+
+    Returns:
+        Tuple of the None count and the statistics (None if all values are None)
+    """
+    if series is not None:
+        valid = series.drop_nulls()
+        stats = _series_stats(valid, n_examples) if len(valid) else None
+        if stats is not None or not len(valid):
+            return len(series) - len(valid), stats
+        values = series.to_list() if values is None else values
+
+    # Fall back to the original values if they don't fit a vectorized type
+    valid_values = [x for x in values if x is not None]
+    return len(values) - len(valid_values), _python_stats(valid_values, n_examples) if valid_values else None
+
+
+def _summarize_flat_list(values: Optional[List[Optional[T]]], n_examples: int, series: Optional[pl.Series] = None) -> str:
+    """Helper function to summarize a flat list (original functionality), given as a list, a Series
+    returned by `_to_series` or `_native_series`, or both."""
+    # Count total items and None values, and compute statistics of the others
+    total_items = len(values) if values is not None else len(series)
+    none_count, stats = _count_and_stats(values, series, n_examples)
+    return _format_flat_summary(total_items, none_count, stats, n_examples)
+
+
+def _format_flat_summary(
+    total_items: int,
+    none_count: int,
+    stats: Optional[Dict],
+    n_examples: int,
+    approximate: bool = False,
+    approximate_counts: bool = False,
+) -> str:
+    """Describe the statistics of a flat list (see `_python_stats`), marking the estimated median and
+    number of unique values if `approximate`, and the estimated value counts if `approximate_counts`."""
     # If no valid values, return early summary
-    if not valid_values:
+    if stats is None:
         return f"Contains {total_items} items, all of which are None values."
 
-    # Check if values are numeric (int or float)
-    is_numeric = all(isinstance(x, (int, float)) for x in valid_values)
+    n_valid = stats["n_valid"]
+    about = "approximately " if approximate else ""
 
     # Create initial summary
     summary = f"Contains {total_items} items, including {none_count} None "
     summary += f"value{'s' if none_count != 1 else ''}. "
 
-    if is_numeric:
-        # Calculate statistics for numeric data
-        min_val = min(valid_values)
-        max_val = max(valid_values)
-        mean_val = statistics.mean(valid_values)
-        median_val = statistics.median(valid_values)
-        std_dev = statistics.stdev(valid_values) if len(valid_values) > 1 else 0
-
-        summary += (f"Among the {len(valid_values)} numeric value{'s' if len(valid_values) != 1 else ''}, "
-                   f"the minimum is {min_val:.2f} and the maximum is {max_val:.2f}. The mean is "
-                   f"{mean_val:.2f} with a median of {median_val:.2f}")
+    if stats["is_numeric"]:
+        summary += (f"Among the {n_valid} numeric value{'s' if n_valid != 1 else ''}, "
+                   f"the minimum is {stats['min']:.2f} and the maximum is {stats['max']:.2f}. The mean is "
+                   f"{stats['mean']:.2f} with a median of {about}{stats['median']:.2f}")
 
         # Add standard deviation if there are at least 2 values
-        if len(valid_values) > 1:
-            summary += f" and a standard deviation of {std_dev:.2f}"
+        if n_valid > 1:
+            summary += f" and a standard deviation of {stats['std']:.2f}"
 
         summary += "."
     else:
         # Summary for string data
-        summary += f"There are {len(valid_values)} non-None value{'s' if len(valid_values) != 1 else ''} "
-        summary += f"with {len(set(valid_values))} unique value{'s' if len(set(valid_values)) != 1 else ''}."
+        summary += f"There are {n_valid} non-None value{'s' if n_valid != 1 else ''} "
+        summary += f"with {about}{stats['n_unique']} unique value{'s' if stats['n_unique'] != 1 else ''}."
 
     # Add value counts table
-    summary += _create_value_counts_table(valid_values, none_count, is_numeric, n_examples)
+    summary += _create_value_counts_table(stats["top_counts"], none_count, stats["is_numeric"], n_examples, approximate_counts)
 
     return summary
 
 
-def _summarize_nested_list(values: List[Optional[List[Optional[T]]]], n_examples: int) -> str:
-    """Helper function to summarize a list of lists."""
+def _summarize_nested_list(
+    values: Optional[List[Optional[List[Optional[T]]]]],
+    n_examples: int,
+    series: Optional[pl.Series] = None,
+) -> str:
+    """Helper function to summarize a list of lists, given as a list or a Series of lists."""
     # Count total lists and None values at top level
-    total_lists = len(values)
-    none_count = sum(1 for x in values if x is None)
-    valid_lists = [x for x in values if x is not None]
+    if series is not None:
+        total_lists = len(series)
+        valid_lists = series.drop_nulls()
+        list_sizes = valid_lists.list.len().to_list()
+    else:
+        total_lists = len(values)
+        valid_lists = [x for x in values if x is not None]
+        list_sizes = [len(lst) for lst in valid_lists]
+    none_count = total_lists - len(valid_lists)
 
-    if not valid_lists:
+    if not len(valid_lists):
+        return _format_nested_summary(total_lists, none_count, None, 0, None, n_examples)
+
+    # Calculate list size statistics (the integer sum is exact, so the mean matches `statistics.mean`)
+    size_stats = (sum(list_sizes) / len(list_sizes), min(list_sizes), max(list_sizes))
+
+    # Flatten all values for statistical analysis
+    if series is not None:
+        all_values = valid_lists.explode(empty_as_null=False)
+        all_series = _native_series(all_values)
+        all_values = all_values.to_list() if all_series is None else None
+    else:
+        all_values = list(chain.from_iterable(valid_lists))
+        all_series = _to_series(all_values)
+    none_count_inner, stats = _count_and_stats(all_values, all_series, n_examples)
+    return _format_nested_summary(total_lists, none_count, size_stats, none_count_inner, stats, n_examples)
+
+
+def _format_nested_summary(
+    total_lists: int,
+    none_count: int,
+    size_stats: Optional[Tuple[float, int, int]],
+    none_count_inner: int,
+    stats: Optional[Dict],
+    n_examples: int,
+    approximate: bool = False,
+    approximate_counts: bool = False,
+) -> str:
+    """Describe the statistics of a list of lists, given the average, minimum and maximum list
+    sizes (None if all lists are None) and the statistics of the nested values (see `_python_stats`).
+    Estimated values are marked as in `_format_flat_summary`."""
+    if size_stats is None:
         return f"The nested structure contains {total_lists} lists, all of which are None values."
 
-    # Calculate list size statistics
-    list_sizes = [len(lst) for lst in valid_lists]
-    avg_size = statistics.mean(list_sizes)
-    min_size = min(list_sizes)
-    max_size = max(list_sizes)
+    avg_size, min_size, max_size = size_stats
+    about = "approximately " if approximate else ""
 
     # Create initial summary
     summary = (f"The nested structure contains {total_lists} lists, including {none_count} None "
@@ -104,56 +309,42 @@ def _summarize_nested_list(values: List[Optional[List[Optional[T]]]], n_examples
                 f"- Minimum size: {min_size}\n"
                 f"- Maximum size: {max_size}\n\n")
 
-    # Flatten all values for statistical analysis
-    all_values = [item for sublist in valid_lists for item in sublist]
-    none_count_inner = sum(1 for x in all_values if x is None)
-    valid_values = [x for x in all_values if x is not None]
-
-    if not valid_values:
+    if stats is None:
         # Add None count table even when all values are None
         return summary + "All nested lists contain only None values." + _create_value_counts_table([], none_count_inner, False, n_examples)
 
-    # Check if values are numeric
-    is_numeric = all(isinstance(x, (int, float)) for x in valid_values)
-
-    if is_numeric:
-        # Calculate statistics for numeric data
-        min_val = min(valid_values)
-        max_val = max(valid_values)
-        mean_val = statistics.mean(valid_values)
-        median_val = statistics.median(valid_values)
-        std_dev = statistics.stdev(valid_values) if len(valid_values) > 1 else 0
+    n_valid = stats["n_valid"]
+    if stats["is_numeric"]:
+        summary += (f"Among all nested values, there are {n_valid} numeric values. "
+                   f"The minimum is {stats['min']:.2f} and the maximum is {stats['max']:.2f}. The mean is "
+                   f"{stats['mean']:.2f} with a median of {about}{stats['median']:.2f}")
 
-        summary += (f"Among all nested values, there are {len(valid_values)} numeric values. "
-                   f"The minimum is {min_val:.2f} and the maximum is {max_val:.2f}. The mean is "
-                   f"{mean_val:.2f} with a median of {median_val:.2f}")
-
-        if len(valid_values) > 1:
-            summary += f" and a standard deviation of {std_dev:.2f}"
+        if n_valid > 1:
+            summary += f" and a standard deviation of {stats['std']:.2f}"
 
         summary += "."
     else:
         # Summary for string data
-        summary += (f"Among all nested values, there are {len(valid_values)} non-None values "
-                   f"with {len(set(valid_values))} unique values.")
+        summary += (f"Among all nested values, there are {n_valid} non-None values "
+                   f"with {about}{stats['n_unique']} unique values.")
 
     # Add value counts table
-    summary += _create_value_counts_table(valid_values, none_count_inner, is_numeric, n_examples)
+    summary += _create_value_counts_table(stats["top_counts"], none_count_inner, stats["is_numeric"], n_examples, approximate_counts)
 
     return summary
 
-def _create_value_counts_table(valid_values: List[T], none_count: int, is_numeric: bool, n_examples: int) -> str:
-    """Helper function to create the value counts table."""
-    value_counts = Counter(valid_values)
-    # Sort by count (descending), then by value (ascending)
-    sorted_counts = sorted(value_counts.items(), key=lambda x: (-x[1], x[0]))
-
-    # Take only the top n_examples
-    sorted_counts = sorted_counts[:n_examples]
-
+def _create_value_counts_table(
+    sorted_counts: List[Tuple[T, int]],
+    none_count: int,
+    is_numeric: bool,
+    n_examples: int,
+    approximate: bool = False,
+) -> str:
+    """Helper function to create the value counts table from the top (value, count) pairs."""
     # Create markdown table
     table = "\n\n**Value Counts (Top "
     table += f"{min(n_examples, len(sorted_counts))}" if len(sorted_counts) < n_examples else f"{n_examples}"
+    table += ", approximate" if approximate else ""
     table += "):**\n\n"
     table += "| Value | Count |\n"
     table += "|------:|------:|\n"
@@ -0,0 +1,267 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Annotated, Dict, Iterable, List, Optional
+
+import typer
+from typer import Option
+
+from annotate_and_finetune.sketches import HyperLogLog, KLLSketch, SpaceSaving, Welford
+from annotate_and_finetune.streaming import byte_ranges, iter_chunks, iter_jsonl_range
+from annotate_and_finetune.summarize_list import _format_flat_summary, _format_nested_summary
+
+
+class StreamingSummary:
+    """Summary of a stream of values in bounded memory, described like `summarize_list`.
+
+    Values are consumed in chunks with `update`, and summaries of different parts of a
+    stream (e.g. from different processes) are combined with `merge`. Compared with the
+    exact `summarize_list` path:
+
+    - Counts, None counts, minimum, maximum, mean, standard deviation and list sizes are exact
+      (up to floating point rounding of the mean and standard deviation)
+    - The median comes from a KLL sketch; for k=200, its rank is within 1.65% of the number
+      of values of the middle with 99% confidence
+    - The number of unique values comes from a HyperLogLog sketch with `2^p` registers, with a
+      relative standard error of `1.04 / sqrt(2^p)` (1.6% for p=12)
+    - Value counts come from a space-saving sketch with `capacity` counters; they are exact with
+      at most `capacity` unique values, and otherwise overestimate by at most
+      `n_values / capacity` (and are then marked as approximate)
+
+    Memory is O(k + 2^p + capacity) regardless of the number of values.
+
+    Args:
+        k: KLL sketch size
+        p: HyperLogLog precision
+        capacity: Number of space-saving counters
+        seed: Random seed of the KLL sketch
+    """
+
+    def __init__(self, k: int = 200, p: int = 12, capacity: int = 1000, seed: int = None):
+        self.total = 0
+        self.none_count = 0
+        self.nested = False
+        self.list_sizes = Welford()
+        self.inner_none_count = 0
+        self.n_valid = 0
+        self.is_numeric = True
+        self.moments = Welford()
+        self.quantiles = KLLSketch(k, seed)
+        self.distinct = HyperLogLog(p)
+        self.top = SpaceSaving(capacity)
+
+    def update(self, values: List):
+        """Add a chunk of values (numbers, strings, None, or lists of these).
+
+        Other values (e.g. dicts, or lists inside lists) are counted by their JSON encoding.
+        """
+        self.total += len(values)
+        lists = [x for x in values if isinstance(x, list)]
+        valid = [x for x in values if x is not None and not isinstance(x, list)]
+        self.none_count += sum(1 for x in values if x is None)
+        if lists:
+            self.nested = True
+            self.list_sizes.update([len(x) for x in lists])
+            inner = list(chain.from_iterable(lists))
+            inner_valid = [x for x in inner if x is not None]
+            self.inner_none_count += len(inner) - len(inner_valid)
+            valid += inner_valid
+        valid = [json.dumps(x, sort_keys=True) if isinstance(x, (dict, list)) else x for x in valid]
+
+        numeric = [x for x in valid if isinstance(x, (int, float))]
+        self.is_numeric = self.is_numeric and len(numeric) == len(valid)
+        self.n_valid += len(valid)
+        self.moments.update(numeric)
+        self.quantiles.update(numeric)
+        self.distinct.update(valid)
+        self.top.update(valid)
+
+    def add_missing(self, n: int):
+        """Add `n` None values."""
+        self.total += n
+        self.none_count += n
+
+    def merge(self, other: "StreamingSummary"):
+        """Add the values summarized by another summary with the same sketch parameters."""
+        self.total += other.total
+        self.none_count += other.none_count
+        self.nested = self.nested or other.nested
+        self.list_sizes.merge(other.list_sizes)
+        self.inner_none_count += other.inner_none_count
+        self.n_valid += other.n_valid
+        self.is_numeric = self.is_numeric and other.is_numeric
+        self.moments.merge(other.moments)
+        self.quantiles.merge(other.quantiles)
+        self.distinct.merge(other.distinct)
+        self.top.merge(other.top)
+
+    def stats(self, n_examples: int = 10) -> Optional[Dict]:
+        """Statistics of the non-None values, as computed by `summarize_list` (None if there are none)."""
+        if not self.n_valid:
+            return None
+        stats = {"n_valid": self.n_valid, "is_numeric": self.is_numeric}
+        if self.is_numeric:
+            stats |= {
+                "min": self.moments.min,
+                "max": self.moments.max,
+                "mean": self.moments.mean,
+                "median": self.quantiles.quantiles([0.5])[0],
+                "std": self.moments.std,
+            }
+        stats["n_unique"] = self.distinct.count()
+        top_counts = self.top.top(n_examples)
+        # Values are described as strings unless all of them are numbers
+        stats["top_counts"] = top_counts if self.is_numeric else [(str(x), n) for x, n in top_counts]
+        return stats
+
+    def to_text(self, n_examples: int = 10) -> str:
+        """Describe the summary like `summarize_list`, marking estimated values as approximate."""
+        stats = self.stats(n_examples)
+        if not self.nested:
+            return _format_flat_summary(
+                self.total, self.none_count, stats, n_examples, approximate=True, approximate_counts=self.top.evicted
+            )
+        sizes = self.list_sizes
+        size_stats = (sizes.mean, int(sizes.min), int(sizes.max)) if sizes.n else None
+        return _format_nested_summary(
+            self.total, self.none_count, size_stats, self.inner_none_count, stats, n_examples,
+            approximate=True, approximate_counts=self.top.evicted
+        )
+
+
+def summarize_stream(values: Iterable, chunk_size: int = 10000, **kwargs) -> StreamingSummary:
+    """Summarize an iterable of values in chunks (see `StreamingSummary` for the sketch arguments)."""
+    summary = StreamingSummary(**kwargs)
+    for chunk in iter_chunks(values, chunk_size):
+        summary.update(chunk)
+    return summary
+
+
+def _flatten_record(record: Dict, prefix: str = "") -> Dict:
+    """Flatten the dict fields of a record into separate fields, named like `flatten_columns` columns.
+
+    The fields of a dict are named `field.subfield`, and the fields of a list of dicts
+    `field[].subfield`, holding the list of the elements' values.
+    """
+    flat = {}
+    for name, value in record.items():
+        name = f"{prefix}{name}"
+        elements = [x for x in value if x is not None] if isinstance(value, list) else None
+        if isinstance(value, dict):
+            flat |= _flatten_record(value, f"{name}.")
+        elif elements and all(isinstance(x, dict) for x in elements):
+            elements = [_flatten_record(x) for x in elements]
+            for field in dict.fromkeys(chain.from_iterable(elements)):
+                flat[f"{name}[].{field}"] = [x.get(field) for x in elements]
+        else:
+            flat[name] = value
+    return flat
+
+
+def _summarize_records(records: Iterable[Dict], chunk_size: int, **kwargs) -> Dict[str, StreamingSummary]:
+    """Summarize each field of a stream of records; fields missing from a record count as None.
+
+    Dict fields are summarized per subfield (see `_flatten_record`).
+    """
+    summaries = {}
+    n_rows = 0
+    for chunk in iter_chunks(map(_flatten_record, records), chunk_size):
+        for record in chunk:
+            for name in record:
+                if name not in summaries:
+                    summaries[name] = StreamingSummary(**kwargs)
+                    summaries[name].add_missing(n_rows)
+        for name, summary in summaries.items():
+            summary.update([x.get(name) for x in chunk])
+        n_rows += len(chunk)
+    return summaries
+
+
+def _summarize_jsonl_range(path: str, start: int, end: int, chunk_size: int, kwargs: Dict) -> Dict[str, StreamingSummary]:
+    return _summarize_records(iter_jsonl_range(path, start, end), chunk_size, **kwargs)
+
+
+def summarize_jsonl_stream(
+    path: str,
+    num_proc: int = 1,
+    chunk_size: int = 10000,
+    **kwargs,
+) -> Dict[str, StreamingSummary]:
+    """Summarize each field of a jsonlines file without loading it into memory.
+
+    With `num_proc` > 1, the file is split into byte ranges summarized by separate processes,
+    and the partial summaries are merged.
+
+    Args:
+        path: Path to the jsonlines file
+        num_proc: Number of processes
+        chunk_size: Records per chunk
+        kwargs: Sketch arguments of `StreamingSummary`
+
+    Returns:
+        Summary of each field (with dict fields flattened into their subfields), in order of first appearance
+    """
+    ranges = byte_ranges(path, num_proc)
+    if num_proc > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=num_proc) as pool:
+            parts = list(pool.map(
+                _summarize_jsonl_range, *zip(*[(path, start, end, chunk_size, kwargs) for start, end in ranges])
+            ))
+    else:
+        parts = [_summarize_jsonl_range(path, start, end, chunk_size, kwargs) for start, end in ranges]
+
+    summaries = {}
+    rows_before = 0
+    for part in parts:
+        rows = max((x.total for x in part.values()), default=0)
+        for name in summaries.keys() - part.keys():
+            # Fields missing from a whole part are None in all its rows
+            summaries[name].add_missing(rows)
+        for name, summary in part.items():
+            if name not in summaries:
+                summaries[name] = StreamingSummary(**kwargs)
+                summaries[name].add_missing(rows_before)
+            summaries[name].merge(summary)
+        rows_before += rows
+    # Drop dict fields that only have values (None or empty lists) where they have no subfields
+    return {
+        name: summary for name, summary in summaries.items()
+        if summary.n_valid or not any(x.startswith((f"{name}.", f"{name}[].")) for x in summaries)
+    }
+
+
+def summarize_jsonl(
+    data_path: Annotated[str, Option(help="Path to a jsonlines dataset")],
+    output_path: Annotated[str, Option(help="Path to save the summary")] = None,
+    n_examples: Annotated[int, Option(help="Number of most frequent values to show per column")] = 10,
+    num_proc: Annotated[int, Option(help="Number of processes")] = 1,
+    chunk_size: Annotated[int, Option(help="Records per chunk")] = 10000,
+    capacity: Annotated[int, Option(help="Number of value counters per column")] = 1000,
+):
+    """Summarize every column of a jsonlines dataset in bounded memory, with approximate medians, unique and value counts."""
+    summaries = summarize_jsonl_stream(
+        str(Path(data_path).expanduser()), num_proc=num_proc, chunk_size=chunk_size, capacity=capacity
+    )
+    n_rows = max((x.total for x in summaries.values()), default=0)
+    report = f"The dataset contains {n_rows} rows and {len(summaries)} columns.\n"
+    for name, summary in summaries.items():
+        report += f"\n## {name}\n\n{summary.to_text(n_examples).strip()}\n"
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write("Data summary:\n\n")
+            f.write(report)
+        print(f"Saved data summary to {output_path}")
+    else:
+        print(report)
+
+
+def main():
+    """CLI entry point."""
+    app = typer.Typer(add_completion=False, pretty_exceptions_show_locals=False)
+    app.command()(summarize_jsonl)
+    app()
+
+
+if __name__ == "__main__":
+    main()
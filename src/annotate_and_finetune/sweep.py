@@ -0,0 +1,249 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from pathlib import Path
+from typing import Annotated, Dict, List
+import inspect
+import json
+import math
+import multiprocessing
+import os
+import random
+import yaml
+
+import torch
+from transformers import TrainerCallback
+import typer
+from typer import Option
+
+from llmpipe import read_data
+from annotate_and_finetune.finetune import run_finetuning
+
+
+# run_finetuning arguments set by the sweep itself rather than by trial parameters
+SWEEP_ARGUMENTS = ("train_data", "val_data", "test_data", "output_path", "callbacks", "model_path", "input_field", "tokenized_cache_dir")
+
+
+def validate_parameters(parameters: Dict):
+    """Check that every sweep parameter is a `run_finetuning` argument, before any trial starts."""
+    allowed = [x for x in inspect.signature(run_finetuning).parameters if x not in SWEEP_ARGUMENTS]
+    unknown = [x for x in parameters if x not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(unknown)} (expected some of: {', '.join(allowed)})")
+
+
+def grid_trials(parameters: Dict[str, List]) -> List[Dict]:
+    """Every combination of the listed parameter values."""
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in product(*[parameters[x] for x in names])]
+
+
+def random_trials(parameters: Dict, n_trials: int, seed: int = None) -> List[Dict]:
+    """Randomly sampled parameter combinations.
+
+    Each parameter is either a list of values to choose from, or a range dictionary with
+    `min`, `max` and optional `log` (sample uniformly in log space) fields. Ranges with integer
+    bounds sample integers.
+    """
+    rng = random.Random(seed)
+
+    def sample(spec):
+        if isinstance(spec, list):
+            return rng.choice(spec)
+        low, high = spec["min"], spec["max"]
+        if spec.get("log"):
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        return round(value) if isinstance(low, int) and isinstance(high, int) else value
+
+    return [{name: sample(spec) for name, spec in parameters.items()} for _ in range(n_trials)]
+
+
+def should_prune(value: float, others: List[float], quantile: float = 0.5, min_trials: int = 2) -> bool:
+    """Whether a trial's metric is below the `quantile` of other trials' metrics at the same epoch."""
+    if len(others) < min_trials:
+        return False
+    others = sorted(others)
+    return value < others[min(int(quantile * len(others)), len(others) - 1)]
+
+
+class PruningCallback(TrainerCallback):
+    """Stop a trial whose epoch-level validation metric falls behind other trials.
+
+    Validation metrics of all trials are shared through `board`, a dictionary (shared between
+    processes) mapping each epoch to the list of metric values reported at that epoch.
+
+    Args:
+        board: Shared dictionary of metric values by epoch
+        lock: Lock guarding `board`
+        metric: Validation metric to compare (higher is better)
+        prune_after_epochs: First epoch at which a trial may be pruned
+        quantile: Trials below this quantile of the other trials' metrics are pruned
+    """
+
+    def __init__(self, board, lock, metric: str = "eval_accuracy", prune_after_epochs: int = 1, quantile: float = 0.5):
+        self.board = board
+        self.lock = lock
+        self.metric = metric
+        self.prune_after_epochs = prune_after_epochs
+        self.quantile = quantile
+        self.pruned_at = None
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        if not metrics or self.metric not in metrics or state.epoch is None or self.pruned_at is not None:
+            return
+        epoch = round(state.epoch)
+        value = metrics[self.metric]
+        with self.lock:
+            others = list(self.board.get(epoch, []))
+            self.board[epoch] = others + [value]
+        if self.quantile > 0 and epoch >= self.prune_after_epochs and should_prune(value, others, self.quantile):
+            print(f"Pruning trial at epoch {epoch}: {self.metric}={value:.4f}")
+            self.pruned_at = epoch
+            control.should_training_stop = True
+
+
+def _init_worker(threads_per_trial: int):
+    """Limit the threads used by each trial so that concurrent trials don't oversubscribe cores."""
+    # OMP_NUM_THREADS would be read when torch is imported, before the initializer runs
+    torch.set_num_threads(threads_per_trial)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+def _run_trial(
+    trial_idx: int,
+    params: Dict,
+    data_paths: Dict[str, str],
+    output_path: str,
+    board,
+    lock,
+    metric: str,
+    prune_after_epochs: int,
+    prune_quantile: float,
+    **kwargs,
+) -> Dict:
+    """Run a single fine-tuning trial, returning its leaderboard entry."""
+    trial_path = str(Path(output_path) / f"trial_{trial_idx:03d}")
+    os.makedirs(trial_path, exist_ok=True)
+    pruning = PruningCallback(board, lock, f"eval_{metric}", prune_after_epochs, prune_quantile)
+    metrics = run_finetuning(
+        train_data=read_data(data_paths["train"]),
+        val_data=read_data(data_paths["val"]),
+        test_data=read_data(data_paths["test"]),
+        output_path=trial_path,
+        callbacks=[pruning],
+        **kwargs,
+        **params,
+    )
+    return {
+        "trial": trial_idx,
+        "params": params,
+        "status": "pruned" if pruning.pruned_at is not None else "complete",
+        "pruned_at_epoch": pruning.pruned_at,
+        "validation": metrics["validation"].get(f"eval_{metric}"),
+        "test": metrics["test"].get(f"eval_{metric}"),
+        "output_path": trial_path,
+    }
+
+
+def sweep(
+    spec_path: Annotated[str, Option(help="Path to YAML sweep spec with `method` (grid or random) and `parameters`")],
+    train_input_data_path: Annotated[str, Option(help="Path to training data")],
+    val_input_data_path: Annotated[str, Option(help="Path to validation data")],
+    test_input_data_path: Annotated[str, Option(help="Path to test data")],
+    output_path: Annotated[str, Option(help="Path to save trial models, metrics and the leaderboard")],
+    model_path: Annotated[str, Option(help="Local or HuggingFace model path")] = "roberta-base",
+    input_field: Annotated[str, Option(help="The field to use as input to the transformer")] = "text",
+    n_trials: Annotated[int, Option(help="Number of trials (random search)")] = 10,
+    seed: Annotated[int, Option(help="Random seed for random search")] = None,
+    n_workers: Annotated[int, Option(help="Concurrent trials (defaults to available cores / threads per trial)")] = None,
+    threads_per_trial: Annotated[int, Option(help="Torch threads per trial")] = 1,
+    metric: Annotated[str, Option(help="Validation metric to rank and prune trials by (higher is better)")] = "accuracy",
+    prune_after_epochs: Annotated[int, Option(help="First epoch at which a trial may be pruned")] = 1,
+    prune_quantile: Annotated[float, Option(help="Prune trials below this quantile of other trials' metrics (0 to disable)")] = 0.5,
+):
+    """CLI entry point to search fine-tuning hyperparameters.
+
+    Example spec:
+
+        method: random
+        parameters:
+          learning_rate: {min: 0.000001, max: 0.0001, log: true}
+          batch_size: [8, 16, 32]
+          num_epochs: [2, 3]
+    """
+    output_path = str(Path(output_path).expanduser())
+    os.makedirs(output_path, exist_ok=True)
+    with open(spec_path) as f:
+        spec = yaml.safe_load(f)
+
+    validate_parameters(spec["parameters"])
+    method = spec.get("method", "grid")
+    if method == "grid":
+        trials = grid_trials(spec["parameters"])
+    elif method == "random":
+        trials = random_trials(spec["parameters"], n_trials, seed=seed)
+    else:
+        raise ValueError(f"Unknown sweep method: {method}")
+
+    n_workers = n_workers or max((os.cpu_count() or 1) // threads_per_trial, 1)
+    n_workers = min(n_workers, len(trials))
+    print(f"Running {len(trials)} trials with {n_workers} workers ({threads_per_trial} threads each)")
+
+    data_paths = {
+        "train": str(Path(train_input_data_path).expanduser()),
+        "val": str(Path(val_input_data_path).expanduser()),
+        "test": str(Path(test_input_data_path).expanduser()),
+    }
+    trial_kwargs = dict(
+        model_path=model_path,
+        input_field=input_field,
+        tokenized_cache_dir=str(Path(output_path) / "tokenized_cache"),
+    )
+
+    # Spawn workers so each trial gets a fresh torch runtime
+    context = multiprocessing.get_context("spawn")
+    leaderboard = []
+    with context.Manager() as manager, ProcessPoolExecutor(
+        max_workers=n_workers, mp_context=context, initializer=_init_worker, initargs=(threads_per_trial,)
+    ) as executor:
+        board, lock = manager.dict(), manager.Lock()
+        futures = {
+            executor.submit(
+                _run_trial, i, params, data_paths, output_path, board, lock,
+                metric, prune_after_epochs, prune_quantile, **trial_kwargs
+            ): i
+            for i, params in enumerate(trials)
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"trial": futures[future], "params": trials[futures[future]], "status": "failed", "error": repr(e)}
+            print(f"Trial {result['trial']} {result['status']}: {result['params']} {metric}={result.get('validation')}")
+            leaderboard.append(result)
+
+    leaderboard.sort(key=lambda x: x.get("validation") if x.get("validation") is not None else -math.inf, reverse=True)
+    leaderboard_path = Path(output_path) / "leaderboard.json"
+    with open(leaderboard_path, "w") as f:
+        json.dump(leaderboard, f, indent=2)
+
+    print(f"\n| Rank | Trial | Status | Validation {metric} | Test {metric} | Parameters |")
+    print("|---|---|---|---|---|---|")
+    for rank, result in enumerate(leaderboard, 1):
+        print(
+            f"| {rank} | {result['trial']} | {result['status']} | {result.get('validation')} | "
+            f"{result.get('test')} | {json.dumps(result['params'])} |"
+        )
+    print(f"\nSaved leaderboard to {leaderboard_path}")
+
+
+def main():
+    """CLI entry point."""
+    app = typer.Typer(add_completion=False, pretty_exceptions_show_locals=False)
+    app.command()(sweep)
+    app()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import json
+from typing import Any, Callable, Dict
+
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a string using a characters-per-token heuristic."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_request_tokens(prompt_text: str, inputs: Dict[str, Any]) -> int:
+    """Estimate the input tokens of a prompt rendered with the given inputs."""
+    n_chars = len(prompt_text)
+    for value in inputs.values():
+        n_chars += len(value) if isinstance(value, str) else len(json.dumps(value, default=str))
+    return n_chars // CHARS_PER_TOKEN + 1
+
+
+def get_token_estimator(tokenizer: str = None, model: str = None) -> Callable[[str], int]:
+    """Get a function that counts the tokens in a string.
+
+    Args:
+        tokenizer: Local or HuggingFace tokenizer path
+        model: LiteLLM model identifier, used to count tokens with `litellm.token_counter`
+            if no tokenizer is given
+
+    Returns:
+        Function mapping a string to its (estimated) number of tokens; uses the
+        characters-per-token heuristic if neither a tokenizer nor a model is given
+    """
+    if tokenizer is not None:
+        from transformers import AutoTokenizer
+        hf_tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+        return lambda text: len(hf_tokenizer.encode(text, add_special_tokens=False))
+
+    if model is not None:
+        import litellm
+        return lambda text: litellm.token_counter(model=model, text=text)
+
+    return estimate_tokens
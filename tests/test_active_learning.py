@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+
+from annotate_and_finetune.active_learning import entropy_scores, kmeans, margin_scores, select_samples
+
+
+class TestUncertaintyScores(unittest.TestCase):
+    def setUp(self):
+        self.probs = np.array([
+            [1.0, 0.0, 0.0],
+            [0.5, 0.5, 0.0],
+            [1 / 3, 1 / 3, 1 / 3],
+            [0.7, 0.2, 0.1],
+        ])
+
+    def test_entropy_scores(self):
+        scores = entropy_scores(self.probs)
+        expected = [0.0, np.log(2), np.log(3), -(0.7 * np.log(0.7) + 0.2 * np.log(0.2) + 0.1 * np.log(0.1))]
+        np.testing.assert_allclose(scores, expected, atol=1e-9)
+
+    def test_margin_scores(self):
+        scores = margin_scores(self.probs)
+        np.testing.assert_allclose(scores, [-1.0, 0.0, 0.0, -0.5], atol=1e-9)
+
+    def test_margin_scores_single_class(self):
+        np.testing.assert_array_equal(margin_scores(np.ones((3, 1))), np.zeros(3))
+
+
+class TestKmeans(unittest.TestCase):
+    def test_separated_clusters(self):
+        x = np.array([[0.0, 0.0], [0.1, 0.0], [0.0, 0.1], [10.0, 10.0], [10.1, 10.0], [10.0, 10.1]])
+        assignments = kmeans(x, 2, seed=0)
+        self.assertEqual(len(set(assignments[:3])), 1)
+        self.assertEqual(len(set(assignments[3:])), 1)
+        self.assertNotEqual(assignments[0], assignments[3])
+
+    def test_matches_broadcast_distances(self):
+        # Reference Lloyd's algorithm computing distances from an (n, k, d) difference array
+        def reference(x, k, n_iter, seed):
+            rng = np.random.default_rng(seed)
+            centers = x[rng.choice(len(x), size=k, replace=False)].astype(np.float64)
+            for _ in range(n_iter):
+                assignments = ((x[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1).argmin(axis=1)
+                for j in range(k):
+                    if (assignments == j).any():
+                        centers[j] = x[assignments == j].mean(axis=0)
+            return assignments
+
+        x = np.random.default_rng(0).normal(size=(60, 8))
+        np.testing.assert_array_equal(kmeans(x, 4, n_iter=10, seed=1), reference(x, 4, 10, 1))
+
+
+class TestSelectSamples(unittest.TestCase):
+    def setUp(self):
+        # Uncertainty increases with the index
+        self.probs = np.array([[1 - p, p] for p in np.linspace(0.0, 0.5, 10)])
+
+    def test_entropy_and_margin_select_most_uncertain(self):
+        for strategy in ("entropy", "margin"):
+            self.assertEqual(select_samples(self.probs, 3, strategy), [9, 8, 7])
+
+    def test_n_is_capped_at_pool_size(self):
+        self.assertEqual(len(select_samples(self.probs, 20, "entropy")), 10)
+
+    def test_random(self):
+        selected = select_samples(self.probs, 4, "random", seed=0)
+        self.assertEqual(len(set(selected)), 4)
+        self.assertEqual(selected, select_samples(self.probs, 4, "random", seed=0))
+
+    def test_cluster_covers_each_cluster(self):
+        # The 4 most uncertain samples share one embedding cluster, the next 4 another
+        embeddings = np.array([[0.0, 0.0]] * 2 + [[10.0, 10.0]] * 4 + [[0.0, 0.0]] * 4, dtype=float)
+        embeddings += np.random.default_rng(0).normal(scale=0.01, size=embeddings.shape)
+        selected = select_samples(self.probs, 2, "cluster", embeddings, oversample=4, seed=0)
+        # The cluster picks are ordered by uncertainty
+        self.assertEqual(selected, [9, 5])
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            select_samples(self.probs, 2, "unknown")
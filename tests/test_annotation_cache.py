@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from annotate_and_finetune.annotation_cache import AnnotationCache, cache_key
+
+
+class TestAnnotationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp_dir.name) / "cache.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cache_key_depends_on_prompt_model_and_inputs(self):
+        key = cache_key("prompt", "model", {"dialog": "hi"})
+        self.assertEqual(key, cache_key("prompt", "model", {"dialog": "hi"}))
+        self.assertNotEqual(key, cache_key("other prompt", "model", {"dialog": "hi"}))
+        self.assertNotEqual(key, cache_key("prompt", "other model", {"dialog": "hi"}))
+        self.assertNotEqual(key, cache_key("prompt", "model", {"dialog": "bye"}))
+
+    def test_hits_and_misses(self):
+        with AnnotationCache(self.path) as cache:
+            self.assertIsNone(cache.get("a"))
+            cache.put("a", {"label": "SPORTS"})
+            self.assertEqual(cache.get("a"), {"label": "SPORTS"})
+            self.assertEqual(cache.stats()["hits"], 1)
+            self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_persists_across_sessions(self):
+        with AnnotationCache(self.path) as cache:
+            cache.put("a", {"label": "SPORTS"})
+        with AnnotationCache(self.path) as cache:
+            self.assertEqual(cache.get("a"), {"label": "SPORTS"})
+
+    def test_evicts_least_recently_used(self):
+        with AnnotationCache(self.path, max_size_mb=100 / 1024 / 1024) as cache:
+            cache.put("a", {"label": "x" * 30})
+            cache.put("b", {"label": "y" * 30})
+            cache.get("a")
+            cache.put("c", {"label": "z" * 30})
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNotNone(cache.get("a"))
+            self.assertIsNotNone(cache.get("c"))
+            self.assertLessEqual(cache.size_bytes(), 100)
+
+    def test_get_many_and_put_many(self):
+        with AnnotationCache(self.path) as cache:
+            cache.put_many({"a": {"label": "A"}, "b": {"label": "B"}})
+            self.assertEqual(cache.get_many(["b", "x", "a", "b"]), [{"label": "B"}, None, {"label": "A"}, {"label": "B"}])
+            self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (3, 1))
+
+    def test_size_is_tracked_without_scanning_the_table(self):
+        with AnnotationCache(self.path, max_size_mb=100 / 1024 / 1024) as cache:
+            statements = []
+            cache.conn.set_trace_callback(statements.append)
+            for i in range(10):
+                cache.put(f"k{i % 4}", {"label": "x" * (10 + i)})
+            cache.conn.set_trace_callback(None)
+            self.assertFalse([x for x in statements if "SUM(" in x])
+            actual = cache.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            self.assertEqual(cache.size_bytes(), actual)
+            self.assertLessEqual(actual, 100)
+        # The total size is restored when the cache is reopened
+        with AnnotationCache(self.path) as cache:
+            self.assertEqual(cache.size_bytes(), actual)
+
+    def test_one_commit_per_chunk(self):
+        with AnnotationCache(self.path) as cache:
+            statements = []
+            cache.conn.set_trace_callback(statements.append)
+            cache.put_many({f"k{i}": {"label": "A"} for i in range(50)})
+            cache.get_many([f"k{i}" for i in range(50)])
+            cache.conn.set_trace_callback(None)
+            self.assertEqual(sum(x.strip().upper() == "COMMIT" for x in statements), 2)
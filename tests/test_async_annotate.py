@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from annotate_and_finetune.async_annotate import RateLimiter, TokenBucket, _annotate_all, run_async_annotation
+
+
+class RateLimitedError(Exception):
+    status_code = 429
+
+
+class FakePrompt:
+    """Prompt module that labels samples after a short delay, recording call start times."""
+
+    prompt = "Label the text"
+
+    def __init__(self, delay: float = 0.01, n_rate_limited: int = 0, fail_ids=()):
+        self.delay = delay
+        self.n_rate_limited = n_rate_limited
+        self.fail_ids = set(fail_ids)
+        self.starts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, **sample):
+        with self.lock:
+            self.starts.append(time.monotonic())
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            rate_limited = self.n_rate_limited > 0
+            self.n_rate_limited -= rate_limited
+        try:
+            time.sleep(self.delay)
+            if rate_limited:
+                raise RateLimitedError("Too many requests")
+            if sample["id"] in self.fail_ids:
+                raise ValueError("Bad response")
+            return {"label": f"label {sample['id']}"}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_waits_for_refill(self):
+        async def run():
+            bucket = TokenBucket(600)  # 10 tokens per second
+            start = time.monotonic()
+            await bucket.acquire(600)
+            self.assertLess(time.monotonic() - start, 0.05)
+            await bucket.acquire(1)
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.09)
+
+    def test_large_requests_are_capped_at_capacity(self):
+        async def run():
+            bucket = TokenBucket(600)
+            await bucket.acquire(10 ** 6)
+            return bucket.tokens
+
+        self.assertLess(asyncio.run(run()), 1)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_pause_doubles_and_resets(self):
+        limiter = RateLimiter(initial_backoff=0.05, max_backoff=0.15)
+        start = time.monotonic()
+        limiter.on_rate_limit()
+        self.assertGreaterEqual(limiter.paused_until - start, 0.05)
+        self.assertLessEqual(limiter.paused_until - start, 0.1 + 0.01)
+        self.assertEqual(limiter.backoff, 0.1)
+        limiter.on_rate_limit()
+        limiter.on_rate_limit()
+        self.assertEqual(limiter.backoff, 0.15)
+        limiter.on_success()
+        self.assertEqual(limiter.backoff, 0.05)
+
+    def test_acquire_waits_for_pause(self):
+        async def run():
+            limiter = RateLimiter(initial_backoff=0.05)
+            limiter.on_rate_limit()
+            start = time.monotonic()
+            await limiter.acquire(10)
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.05)
+
+
+class TestRunAsyncAnnotation(unittest.TestCase):
+    def test_results_in_input_order(self):
+        prompt = FakePrompt()
+        samples = [{"id": i} for i in range(20)]
+        results = run_async_annotation(prompt, samples, output_names=["label"], max_concurrency=4)
+        self.assertEqual(results, [{"id": i, "label": f"label {i}"} for i in range(20)])
+        self.assertLessEqual(prompt.max_in_flight, 4)
+
+    def test_failed_samples_have_none_outputs(self):
+        prompt = FakePrompt(fail_ids={3})
+        results = run_async_annotation(prompt, [{"id": i} for i in range(5)], output_names=["label"])
+        self.assertEqual(results[3], {"id": 3, "label": None})
+        self.assertEqual(results[4], {"id": 4, "label": "label 4"})
+
+    def test_rate_limit_pauses_calls_not_yet_started(self):
+        prompt = FakePrompt(delay=0.01, n_rate_limited=1)
+        limiter = RateLimiter(initial_backoff=0.2)
+        samples = [{"id": i} for i in range(6)]
+        results = asyncio.run(_annotate_all(prompt, samples, ["label"], 1, limiter, 3))
+        self.assertEqual([x["label"] for x in results], [f"label {i}" for i in range(6)])
+        self.assertEqual(limiter.n_rate_limited, 1)
+        # With one slot, every call after the rate limited one waits for the pause
+        self.assertEqual(len(prompt.starts), 7)
+        self.assertGreaterEqual(prompt.starts[1] - prompt.starts[0], 0.2)
+
+    def test_running_event_loop(self):
+        async def run():
+            return run_async_annotation(FakePrompt(), [{"id": 1}], output_names=["label"])
+
+        self.assertEqual(asyncio.run(run()), [{"id": 1, "label": "label 1"}])
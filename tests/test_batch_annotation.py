@@ -0,0 +1,101 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from annotate_and_finetune.batch_annotation import (
+    _collect_labels, annotate_batches, format_batch, iter_batches, pack_batches
+)
+
+
+class TestBatching(unittest.TestCase):
+    def setUp(self):
+        self.samples = [{"id": i, "dialog": "x" * (10 if i % 2 else 100)} for i in range(10)]
+
+    def count_tokens(self, text: str) -> int:
+        return len(text)
+
+    def test_iter_batches(self):
+        batches = list(iter_batches(self.samples, 4))
+        self.assertEqual([len(x) for x in batches], [4, 4, 2])
+
+    def test_pack_batches_respects_budget(self):
+        budget = 200
+        batches = list(pack_batches(self.samples, "id", "dialog", budget, count_tokens=self.count_tokens))
+        self.assertEqual([x["id"] for batch in batches for x in batch], list(range(10)))
+        for batch in batches:
+            self.assertLessEqual(len(format_batch(batch, "id", "dialog")), budget)
+
+    def test_pack_batches_short_samples_share_requests(self):
+        short = [{"id": i, "dialog": "hi"} for i in range(20)]
+        batches = list(pack_batches(short, "id", "dialog", 1000, count_tokens=self.count_tokens))
+        self.assertEqual(len(batches), 1)
+
+    def test_pack_batches_max_batch_size(self):
+        short = [{"id": i, "dialog": "hi"} for i in range(20)]
+        batches = list(pack_batches(short, "id", "dialog", 1000, max_batch_size=6, count_tokens=self.count_tokens))
+        self.assertEqual([len(x) for x in batches], [6, 6, 6, 2])
+
+    def test_oversized_sample_gets_its_own_batch(self):
+        samples = [{"id": 0, "dialog": "hi"}, {"id": 1, "dialog": "x" * 500}, {"id": 2, "dialog": "hi"}]
+        batches = list(pack_batches(samples, "id", "dialog", 100, count_tokens=self.count_tokens))
+        self.assertEqual([[x["id"] for x in batch] for batch in batches], [[0], [1], [2]])
+
+
+class TestCollectLabels(unittest.TestCase):
+    def test_missing_hallucinated_and_invalid_labels(self):
+        batches = [[{"id": 0}, {"id": 1}, {"id": 2}], [{"id": 3}]]
+        responses = [
+            {"labels": [
+                {"id": 0, "label": "A"},
+                {"id": "2", "label": "NOT_ALLOWED"},
+                {"id": 7, "label": "A"},
+            ]},
+            {"labels": None},
+        ]
+        labels, missing = _collect_labels(batches, responses, "id", allowed={"A", "B"})
+        self.assertEqual(labels, {"0": "A"})
+        self.assertEqual(missing, [[{"id": 1}, {"id": 2}], [{"id": 3}]])
+
+    def test_first_label_wins(self):
+        batches = [[{"id": 0}]]
+        responses = [{"labels": [{"id": 0, "label": "A"}, {"id": 0, "label": "B"}]}]
+        labels, missing = _collect_labels(batches, responses, "id")
+        self.assertEqual(labels, {"0": "A"})
+        self.assertEqual(missing, [[]])
+
+
+class TestAnnotateBatches(unittest.TestCase):
+    def test_rebatching_and_single_sample_fallback(self):
+        calls = []
+
+        def fake_run_annotation(config, samples, **kwargs):
+            if config["name"] == "single":
+                calls.append(("single", [x["id"] for x in samples]))
+                return [x | {"label": "B"} for x in samples]
+            responses = []
+            for sample in samples:
+                ids = [json.loads(line)["id"] for line in sample["annotation_inputs"].splitlines()]
+                calls.append(("batch", ids))
+                # Batches of 4 miss their last id, and id 5 is never labeled in a batch
+                labeled = ids[:-1] if len(ids) == 4 else ids
+                responses.append(sample | {"labels": [{"id": i, "label": "A"} for i in labeled if i != 5]})
+            return responses
+
+        batches = [[{"id": i, "text": "t"} for i in range(4)], [{"id": i, "text": "t"} for i in (4, 5)]]
+        with patch("annotate_and_finetune.batch_annotation.run_annotation", side_effect=fake_run_annotation):
+            records = annotate_batches({"name": "batch"}, batches, "id", "text", fallback_config={"name": "single"})
+
+        self.assertEqual(calls, [
+            ("batch", [0, 1, 2, 3]), ("batch", [4, 5]),
+            ("batch", [3]), ("batch", [5]),
+            ("single", [5]),
+        ])
+        self.assertEqual([(x["id"], x["label"]) for x in records], [(0, "A"), (1, "A"), (2, "A"), (3, "A"), (4, "A"), (5, "B")])
+
+    def test_unlabeled_samples_are_dropped_without_fallback(self):
+        def fake_run_annotation(config, samples, **kwargs):
+            return [x | {"labels": []} for x in samples]
+
+        with patch("annotate_and_finetune.batch_annotation.run_annotation", side_effect=fake_run_annotation):
+            records = annotate_batches({"name": "batch"}, [[{"id": 0, "text": "t"}]], "id", "text")
+        self.assertEqual(records, [])
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch
+
+from annotate_and_finetune.cascade import aggregate_votes, annotate_cascade, escalation_reason, parse_confidence
+
+
+class TestVotes(unittest.TestCase):
+    def test_parse_confidence(self):
+        self.assertEqual(parse_confidence("0.8"), 0.8)
+        self.assertEqual(parse_confidence("90%"), 0.9)
+        self.assertEqual(parse_confidence("high"), 0.0)
+        self.assertEqual(parse_confidence(None), 0.0)
+
+    def test_aggregate_votes(self):
+        vote = aggregate_votes(
+            [{"label": "A", "confidence": "0.9"}, {"label": "A", "confidence": "0.7"}, {"label": "B", "confidence": "1"}],
+            allowed={"A", "B"},
+        )
+        self.assertEqual(vote["label"], "A")
+        self.assertAlmostEqual(vote["agreement"], 2 / 3)
+        self.assertAlmostEqual(vote["confidence"], 0.8)
+        self.assertEqual([x["label"] for x in vote["label_scores"]], ["A", "B"])
+        self.assertAlmostEqual(vote["label_scores"][0]["score"], 2 / 3)
+        self.assertIsNone(aggregate_votes([{"label": "C"}], allowed={"A"})["label"])
+
+    def test_single_vote_label_scores_use_confidence(self):
+        vote = aggregate_votes([{"label": "A", "confidence": "0.7"}], allowed={"A", "B", "C"})
+        scores = {x["label"]: x["score"] for x in vote["label_scores"]}
+        self.assertAlmostEqual(scores["A"], 0.7)
+        self.assertAlmostEqual(scores["B"], 0.15)
+
+    def test_escalation_reason(self):
+        self.assertEqual(escalation_reason({"label": None, "agreement": 0, "confidence": 0}), "invalid")
+        self.assertEqual(escalation_reason({"label": "A", "agreement": 0.5, "confidence": 1}), "disagreement")
+        self.assertEqual(escalation_reason({"label": "A", "agreement": 1, "confidence": 0.5}, 0.8), "low_confidence")
+        self.assertIsNone(escalation_reason({"label": "A", "agreement": 1, "confidence": 0.9}, 0.8))
+
+
+class TestAnnotateCascade(unittest.TestCase):
+    def test_escalates_uncertain_samples(self):
+        def fake_run_annotation(config, samples, model, **kwargs):
+            if model == "cheap":
+                return [x | {"label": "A", "confidence": "0.9" if x["id"] % 2 else "0.1"} for x in samples]
+            return [x | {"label": "B", "confidence": "0.6"} for x in samples]
+
+        samples = [{"id": i, "text": "t"} for i in range(4)]
+        with patch("annotate_and_finetune.cascade.run_annotation", side_effect=fake_run_annotation):
+            records = annotate_cascade(
+                {"outputs": [{"name": "label"}]}, samples,
+                tiers=[{"model": "cheap", "confidence_threshold": 0.5}, {"model": "strong", "confidence_threshold": 0.9}],
+                allowed_labels=[{"label": "A"}, {"label": "B"}],
+            )
+        by_id = {x["id"]: x for x in records}
+        self.assertEqual(len(records), 4)
+        self.assertEqual([by_id[i]["annotation_model"] for i in range(4)], ["strong", "cheap", "strong", "cheap"])
+        self.assertEqual(by_id[0]["label"], "B")
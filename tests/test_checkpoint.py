@@ -0,0 +1,35 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from annotate_and_finetune.checkpoint import append_records, read_completed_ids
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp_dir.name) / "out.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_missing_file(self):
+        self.assertEqual(read_completed_ids(self.path, "id"), set())
+
+    def test_append_and_read(self):
+        append_records([{"id": 1, "label": "a"}, {"id": 2, "label": "b"}], self.path)
+        append_records([{"id": 3, "label": "c"}], self.path)
+        self.assertEqual(read_completed_ids(self.path, "id"), {1, 2, 3})
+
+    def test_failed_annotations_are_not_completed(self):
+        append_records([{"id": 1, "label": "a"}, {"id": 2, "label": None}], self.path)
+        self.assertEqual(read_completed_ids(self.path, "id", ["label"]), {1})
+        self.assertEqual(read_completed_ids(self.path, "id"), {1, 2})
+
+    def test_truncated_trailing_line_is_dropped(self):
+        append_records([{"id": 1, "label": "a"}], self.path)
+        with open(self.path, "a") as f:
+            f.write('{"id": 2, "lab')
+        self.assertEqual(read_completed_ids(self.path, "id"), {1})
+        append_records([{"id": 2, "label": "b"}], self.path)
+        self.assertEqual(read_completed_ids(self.path, "id"), {1, 2})
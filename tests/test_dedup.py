@@ -0,0 +1,35 @@
+import unittest
+
+from annotate_and_finetune.dedup import dedup_samples, lsh_params, propagate_labels
+
+
+class TestDedup(unittest.TestCase):
+    def setUp(self):
+        base = "USER: I'd like to book a table for two at an Italian restaurant tonight at seven."
+        self.samples = [
+            {"id": 0, "text": base},
+            {"id": 1, "text": "Hello, what's the weather going to be like in Seattle tomorrow morning?"},
+            {"id": 2, "text": base.upper() + "  "},
+            {"id": 3, "text": base.replace("seven", "eight")},
+            {"id": 4, "text": "Play some jazz music in the living room please."},
+        ]
+
+    def test_lsh_params(self):
+        bands, rows = lsh_params(128, 0.8)
+        self.assertEqual(bands * rows, 128)
+        self.assertAlmostEqual((1 / bands) ** (1 / rows), 0.8, delta=0.1)
+
+    def test_near_duplicates_are_clustered(self):
+        representatives, members = dedup_samples(self.samples, "text", threshold=0.8)
+        self.assertEqual([x["id"] for x in representatives], [0, 1, 4])
+        self.assertEqual(sorted(x["id"] for x in members[0]), [2, 3])
+
+    def test_propagate_labels(self):
+        representatives, members = dedup_samples(self.samples, "text", threshold=0.8)
+        annotated = [x | {"label": f"L{x['id']}"} for x in representatives]
+        records = {x["id"]: x for x in propagate_labels(annotated, self.samples, members, "id")}
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[3]["label"], "L0")
+        self.assertEqual(records[3]["dedup_cluster"], 0)
+        self.assertEqual(records[3]["text"], self.samples[3]["text"])
+        self.assertEqual(records[4]["label"], "L4")
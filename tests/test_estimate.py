@@ -0,0 +1,79 @@
+import io
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import yaml
+
+from annotate_and_finetune.annotation_config import build_batches
+from annotate_and_finetune.estimate import _mean, estimate, estimate_costs
+from annotate_and_finetune.token_estimation import get_token_estimator
+from tests.test_predict import WORDS, save_tiny_classifier
+
+
+class TestEstimateCosts(unittest.TestCase):
+    def test_totals(self):
+        result = estimate_costs(100, 500, 200, model="not-a-model", concurrency=10)
+        self.assertEqual(result["requests"], 100)
+        self.assertEqual(result["input_tokens"], 50000)
+        self.assertEqual(result["output_tokens"], 20000)
+
+    def test_duration_is_bound_by_slowest_limit(self):
+        # 100 requests * 5s / 10 in flight = 50s
+        result = estimate_costs(100, 500, 200, model="m", concurrency=10, base_latency=1, output_tokens_per_second=50)
+        self.assertAlmostEqual(result["duration_minutes"], 50 / 60)
+        result = estimate_costs(100, 500, 200, model="m", concurrency=10, requests_per_minute=20)
+        self.assertAlmostEqual(result["duration_minutes"], 5)
+        result = estimate_costs(100, 500, 200, model="m", concurrency=10, tokens_per_minute=5000)
+        self.assertAlmostEqual(result["duration_minutes"], 10)
+
+
+class TestEstimate(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        tmp = Path(self.tmp_dir.name)
+        self.tokenizer_path = str(tmp / "tokenizer")
+        save_tiny_classifier(self.tokenizer_path)
+        self.rows = [{"id": i, "text": " ".join(WORDS[j % 5] for j in range(60))} for i in range(30)]
+        (tmp / "data.jsonl").write_text("".join(json.dumps(x) + "\n" for x in self.rows))
+        self.config = {
+            "task": "Label the text",
+            "context_col": "text",
+            "context_description": "A text",
+            "allowed_labels": [{"label": "A", "description": "First"}, {"label": "B", "description": "Second"}],
+            "data_path": str(tmp / "data.jsonl"),
+            "n_samples": 2,
+            "annotation_token_budget": 400,
+        }
+        self.output_path = tmp / "estimate.json"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def estimate(self, **kwargs) -> dict:
+        config_path = Path(self.tmp_dir.name) / "config.yaml"
+        config_path.write_text(yaml.safe_dump(self.config))
+        with redirect_stdout(io.StringIO()) as stdout:
+            estimate(str(config_path), output_path=str(self.output_path), **kwargs)
+        self.stdout = stdout.getvalue()
+        return json.loads(self.output_path.read_text())
+
+    def test_batches_are_packed_with_the_chosen_tokenizer(self):
+        count_tokens = get_token_estimator(self.tokenizer_path)
+        expected = _mean([len(x) for x in build_batches(self.rows, self.config, count_tokens)])
+        heuristic = _mean([len(x) for x in build_batches(self.rows, self.config)])
+        self.assertNotEqual(round(expected, 2), round(heuristic, 2))
+
+        result = self.estimate(tokenizer=self.tokenizer_path)
+        self.assertEqual(result["estimates"]["batch"]["mean_batch_size"], round(expected, 2))
+
+    def test_cascade_is_reported_as_not_estimated(self):
+        self.config["annotation_cascade"] = [{"model": "small"}, {"model": "large"}]
+        result = self.estimate(tokenizer=self.tokenizer_path)
+        self.assertEqual(result["configured_mode"], "cascade")
+        self.assertNotIn("cascade", result["estimates"])
+        # Cascades annotate one sample per request, so n_samples counts samples
+        self.assertEqual(result["samples"], 2)
+        self.assertIn("small -> large) is not estimated", self.stdout)
@@ -0,0 +1,64 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForSequenceClassification
+
+from annotate_and_finetune.export import export, format_export_report, load_quantized, quantize_dynamic
+from tests.test_predict import WORDS, save_tiny_classifier
+
+
+class TestExportReport(unittest.TestCase):
+    def test_format_export_report(self):
+        report = {
+            "fp32": {
+                "accuracy": 0.9, "accuracy_delta": 0.0, "agreement_with_fp32": 1.0,
+                "samples_per_second": 120.04, "latency_ms_p50": 8.26, "size_mb": 475.5,
+            },
+            "int8": {
+                "accuracy": 0.875, "accuracy_delta": -0.025, "agreement_with_fp32": 0.95,
+                "samples_per_second": 250.0, "latency_ms_p50": 4.0, "size_mb": 120.25,
+            },
+        }
+        self.assertEqual(format_export_report(report).splitlines(), [
+            "| Model | Accuracy | Delta | Agreement | Samples/s | Latency p50 (ms) | Size (MB) |",
+            "|---|---|---|---|---|---|---|",
+            "| fp32 | 0.9000 | +0.0000 | 1.0000 | 120.0 | 8.3 | 475.5 |",
+            "| int8 | 0.8750 | -0.0250 | 0.9500 | 250.0 | 4.0 | 120.2 |",
+        ])
+
+    def test_missing_metrics_are_not_available(self):
+        report = {"fp32": {
+            "accuracy": None, "accuracy_delta": None, "agreement_with_fp32": 1.0,
+            "samples_per_second": 100.0, "latency_ms_p50": None, "size_mb": 1.0,
+        }}
+        self.assertEqual(
+            format_export_report(report).splitlines()[-1],
+            "| fp32 | n/a | n/a | 1.0000 | 100.0 | n/a | 1.0 |"
+        )
+
+
+class TestExport(unittest.TestCase):
+    def test_quantized_export_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_path, output_path = f"{tmp_dir}/model", f"{tmp_dir}/export"
+            save_tiny_classifier(model_path)
+            test_path = Path(tmp_dir) / "test.jsonl"
+            samples = [{"text": " ".join(WORDS[j % 5] for j in range(i % 4 + 1)), "label": ["NEG", "POS"][i % 2]} for i in range(8)]
+            test_path.write_text("".join(json.dumps(x) + "\n" for x in samples))
+
+            export(model_path, str(test_path), output_path, quantize=True, onnx=False, batch_size=4, n_latency=2)
+
+            report = json.loads(Path(f"{output_path}/export_report.json").read_text())
+            self.assertEqual(list(report), ["fp32", "int8"])
+            self.assertEqual(report["fp32"]["accuracy_delta"], 0.0)
+            self.assertEqual(report["fp32"]["agreement_with_fp32"], 1.0)
+
+            # The saved int8 weights reload into the same quantized model
+            reloaded = load_quantized(output_path)
+            quantized = quantize_dynamic(AutoModelForSequenceClassification.from_pretrained(model_path).eval())
+            input_ids = torch.tensor([[2, 3, 4, 5]])
+            with torch.inference_mode():
+                torch.testing.assert_close(reloaded(input_ids=input_ids).logits, quantized(input_ids=input_ids).logits)
@@ -0,0 +1,128 @@
+import os
+import random
+import tempfile
+import unittest
+from types import SimpleNamespace
+from typing import List
+from unittest.mock import patch
+
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+
+from annotate_and_finetune.finetune import (
+    DistillationTrainer, length_grouped_batches, padding_ratio, resolve_max_length, run_finetuning, soft_targets,
+    tokenize_dataset, tokenized_fingerprint
+)
+
+
+class TestPadding(unittest.TestCase):
+    def test_padding_ratio(self):
+        batches = [[4, 2], [3]]
+        # Per batch padding: 2 pad tokens out of 11
+        self.assertAlmostEqual(padding_ratio(batches), 2 / 11)
+        # Fixed length padding: 6 * 3 tokens with 9 real tokens
+        self.assertAlmostEqual(padding_ratio(batches, pad_to=6), 1 - 9 / 18)
+        self.assertEqual(padding_ratio([]), 0.0)
+
+    def test_length_grouped_batches(self):
+        lengths = list(range(1, 1001))
+        batches = length_grouped_batches(lengths, 8, seed=0)
+        self.assertEqual(sorted(x for batch in batches for x in batch), lengths)
+        self.assertTrue(all(len(batch) <= 8 for batch in batches))
+        self.assertTrue(all(batch == sorted(batch, reverse=True) for batch in batches))
+        self.assertEqual(batches, length_grouped_batches(lengths, 8, seed=0))
+        # Sorting within mega-batches leaves much less padding than random batches
+        shuffled = random.Random(0).sample(lengths, len(lengths))
+        random_batches = [shuffled[i:i + 8] for i in range(0, len(shuffled), 8)]
+        self.assertLess(padding_ratio(batches), padding_ratio(random_batches) / 10)
+
+    def test_resolve_max_length(self):
+        self.assertEqual(resolve_max_length(SimpleNamespace(model_max_length=int(1e30))), 512)
+        self.assertEqual(resolve_max_length(SimpleNamespace(model_max_length=128)), 128)
+        self.assertEqual(resolve_max_length(SimpleNamespace(model_max_length=int(1e30)), 1024), 1024)
+
+
+def make_tokenizer(path: str, words: List[str]) -> PreTrainedTokenizerFast:
+    """Save a word-level tokenizer over `words` to `path` and load it like a pretrained tokenizer."""
+    vocab = {"[PAD]": 0, "[UNK]": 1} | {w: i + 2 for i, w in enumerate(words)}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="[PAD]", unk_token="[UNK]").save_pretrained(path)
+    return PreTrainedTokenizerFast.from_pretrained(path)
+
+
+class TestTokenizedCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tokenizer = make_tokenizer(f"{self.tmp_dir.name}/tokenizer", ["a", "b", "c"])
+        self.samples = [{"text": "a b c", "label": 0}, {"text": "c a", "label": 1}]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_fingerprint_changes_with_inputs(self):
+        fingerprint = tokenized_fingerprint(self.samples, "text", self.tokenizer, 16)
+        self.assertEqual(fingerprint, tokenized_fingerprint([dict(x) for x in self.samples], "text", self.tokenizer, 16))
+        other_tokenizer = make_tokenizer(f"{self.tmp_dir.name}/other", ["a", "b", "c", "d"])
+        self.assertNotEqual(fingerprint, tokenized_fingerprint(self.samples, "text", other_tokenizer, 16))
+        self.assertNotEqual(fingerprint, tokenized_fingerprint(self.samples, "text", self.tokenizer, 8))
+        changed_text = [self.samples[0], {"text": "c b", "label": 1}]
+        self.assertNotEqual(fingerprint, tokenized_fingerprint(changed_text, "text", self.tokenizer, 16))
+        changed_label = [self.samples[0], {"text": "c a", "label": 0}]
+        self.assertNotEqual(fingerprint, tokenized_fingerprint(changed_label, "text", self.tokenizer, 16))
+
+    def test_second_call_loads_from_cache(self):
+        cache_dir = f"{self.tmp_dir.name}/cache"
+        dataset = tokenize_dataset(self.samples, "text", self.tokenizer, 16, cache_dir=cache_dir)
+        self.assertEqual(dataset["input_ids"], [[2, 3, 4], [4, 2]])
+        self.assertEqual(dataset["length"], [3, 2])
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        with patch("annotate_and_finetune.finetune.Dataset.from_list", side_effect=AssertionError("not cached")):
+            cached = tokenize_dataset(self.samples, "text", self.tokenizer, 16, cache_dir=cache_dir)
+        self.assertEqual(cached.to_list(), dataset.to_list())
+
+        # Other inputs are tokenized and cached separately
+        tokenize_dataset(self.samples, "text", self.tokenizer, 2, cache_dir=cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+
+class TestDistillation(unittest.TestCase):
+    def test_soft_targets(self):
+        label2id = {"A": 0, "B": 1, "C": 2}
+        sample = {"label": "A", "scores": [{"label": "A", "score": 0.6}, {"label": "B", "score": 0.2}, {"label": "D", "score": 0.2}]}
+        for x, y in zip(soft_targets(sample, label2id, "scores"), [0.75, 0.25, 0.0]):
+            self.assertAlmostEqual(x, y)
+        self.assertEqual(soft_targets({"label": "B"}, label2id, "scores"), [0.0, 1.0, 0.0])
+        self.assertEqual(soft_targets({"label": "C", "scores": [{"label": "A", "score": None}]}, label2id, "scores"), [0.0, 0.0, 1.0])
+
+    def compute_loss(self, logits, soft_labels, alpha, temperature=1.0):
+        labels = torch.tensor([0, 1])
+        model = lambda **inputs: SimpleNamespace(logits=logits, loss=torch.nn.functional.cross_entropy(logits, inputs["labels"]))
+        trainer = SimpleNamespace(distillation_alpha=alpha, distillation_temperature=temperature)
+        inputs = {"labels": labels, "soft_labels": soft_labels, "length": torch.tensor([3, 4])}
+        return DistillationTrainer.compute_loss(trainer, model, inputs)
+
+    def test_distillation_loss(self):
+        logits = torch.tensor([[2.0, 0.0], [0.5, 1.5]])
+        hard_loss = torch.nn.functional.cross_entropy(logits, torch.tensor([0, 1]))
+        soft_labels = torch.tensor([[0.7, 0.3], [0.4, 0.6]])
+
+        self.assertAlmostEqual(self.compute_loss(logits, soft_labels, alpha=0).item(), hard_loss.item(), places=5)
+        # The soft loss is the KL divergence from the soft labels, zero when the model matches them
+        soft_loss = (soft_labels * (soft_labels.log() - torch.log_softmax(logits, -1))).sum(-1).mean()
+        self.assertAlmostEqual(self.compute_loss(logits, soft_labels, alpha=1).item(), soft_loss.item(), places=5)
+        self.assertAlmostEqual(self.compute_loss(logits, torch.softmax(logits, -1), alpha=1).item(), 0, places=5)
+        mixed = self.compute_loss(logits, soft_labels, alpha=0.25).item()
+        self.assertAlmostEqual(mixed, 0.25 * soft_loss.item() + 0.75 * hard_loss.item(), places=5)
+        # With a temperature, both distributions are softened and the loss is scaled by t^2
+        t = 2.0
+        targets = torch.softmax(soft_labels.log() / t, -1)
+        tempered = (targets * (targets.log() - torch.log_softmax(logits / t, -1))).sum(-1).mean() * t ** 2
+        self.assertAlmostEqual(self.compute_loss(logits, soft_labels, alpha=1, temperature=t).item(), tempered.item(), places=5)
+
+    def test_missing_soft_labels_raise(self):
+        samples = [{"text": "a", "label": "A"}, {"text": "b", "label": "B"}]
+        with self.assertRaises(ValueError):
+            run_finetuning(samples, samples, samples, soft_label_field="label_scores")
@@ -0,0 +1,102 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml
+
+from annotate_and_finetune.main import run_pipeline
+
+
+class FakePromptModule:
+    """Prompt module labeling every sample "A" and recording the ids it annotates."""
+
+    annotated_ids = []
+
+    def __init__(self, **config):
+        self.prompt = config["task"]
+
+    def __call__(self, num_proc: int = 1, **data):
+        FakePromptModule.annotated_ids.extend(data["id"])
+        return data | {"thinking": ["t"] * len(data["id"]), "label": ["A"] * len(data["id"])}
+
+
+class TestRunPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        tmp = Path(self.tmp_dir.name)
+        self.data_output_path = tmp / "data_out"
+        self.data_output_path.mkdir()
+        self.annotated_path = self.data_output_path / "annotated.jsonl"
+        (tmp / "data.jsonl").write_text("".join(json.dumps({"id": i, "text": f"text {i}"}) + "\n" for i in range(10)))
+        self.config = {
+            "task": "Label the text",
+            "context_col": "text",
+            "context_description": "A text",
+            "allowed_labels": [{"label": "A", "description": "First"}, {"label": "B", "description": "Second"}],
+            "data_path": str(tmp / "data.jsonl"),
+            "model_path": "unused",
+            "model_output_path": str(tmp / "model_out"),
+            "data_output_path": str(self.data_output_path),
+            "n_samples": 10,
+            "seed": 0,
+            "streaming": True,
+        }
+        FakePromptModule.annotated_ids = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_pipeline(self, **config):
+        config_path = Path(self.tmp_dir.name) / "config.yaml"
+        config_path.write_text(yaml.safe_dump(self.config | config))
+        with (
+            patch("annotate_and_finetune.annotate.PromptModule", FakePromptModule),
+            patch("annotate_and_finetune.main.run_finetuning") as run_finetuning,
+        ):
+            run_pipeline(str(config_path), num_proc=1)
+        return run_finetuning.call_args.kwargs
+
+    def test_resume_single_sample_annotation(self):
+        previous = [{"id": i, "text": f"text {i}", "thinking": "t", "label": "B"} for i in range(2)]
+        self.annotated_path.write_text("".join(json.dumps(x) + "\n" for x in previous))
+
+        finetune_kwargs = self.run_pipeline(annotation_batch_size=1, resume=True)
+
+        self.assertEqual(sorted(FakePromptModule.annotated_ids), list(range(2, 10)))
+        records = [json.loads(line) for line in self.annotated_path.read_text().splitlines()]
+        self.assertEqual(sorted(x["id"] for x in records), list(range(10)))
+        self.assertEqual({x["id"]: x["label"] for x in records if x["id"] < 2}, {0: "B", 1: "B"})
+        splits = [finetune_kwargs[x] for x in ("train_data", "val_data", "test_data")]
+        self.assertEqual(sorted(x["id"] for split in splits for x in split), list(range(10)))
+        # The splits are written without the model's reasoning
+        for name, split in zip(("train", "val", "test"), splits):
+            saved = [json.loads(line) for line in (self.data_output_path / f"{name}.jsonl").read_text().splitlines()]
+            self.assertEqual(saved, split)
+            self.assertFalse(any("thinking" in x for x in split))
+
+    def test_resumed_cascade_tops_up_to_n_samples(self):
+        annotated_ids = []
+
+        def fake_annotate_cascade(config, samples, cascade, **kwargs):
+            annotated_ids.extend(x["id"] for x in samples)
+            return [x | {"label": "A"} for x in samples]
+
+        previous = [{"id": i, "text": f"text {i}", "label": "B"} for i in (3, 7)]
+        self.annotated_path.write_text("".join(json.dumps(x) + "\n" for x in previous))
+        with patch("annotate_and_finetune.main.annotate_cascade", side_effect=fake_annotate_cascade):
+            self.run_pipeline(annotation_cascade=[{"model": "small"}], n_samples=6, seed=None, resume=True)
+
+        self.assertEqual(len(annotated_ids), 4)
+        self.assertFalse({3, 7} & set(annotated_ids))
+        self.assertEqual(len(self.annotated_path.read_text().splitlines()), 6)
+
+    def test_resumed_batch_annotation_requires_seed(self):
+        with self.assertRaises(ValueError):
+            self.run_pipeline(annotation_batch_size=4, n_samples=2, seed=None, resume=True)
+
+    def test_without_resume_the_file_is_overwritten(self):
+        self.annotated_path.write_text(json.dumps({"id": 0, "text": "text 0", "label": "B"}) + "\n")
+        self.run_pipeline(annotation_batch_size=1)
+        self.assertEqual(sorted(FakePromptModule.annotated_ids), list(range(10)))
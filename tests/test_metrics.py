@@ -0,0 +1,91 @@
+import os
+import threading
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from annotate_and_finetune.metrics import AnnotationMetrics, usage_tokens
+
+
+def make_response(prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0):
+    return SimpleNamespace(usage=SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+    ))
+
+
+class TestAnnotationMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = AnnotationMetrics(progress_interval=None)
+        start = datetime(2024, 1, 1)
+        for seconds in (0.1, 0.3, 3.0):
+            self.metrics.log_success_event(
+                {"model": "haiku"}, make_response(100, 10, 40), start, start + timedelta(seconds=seconds)
+            )
+        self.metrics.log_failure_event(
+            {"model": "haiku", "exception": TimeoutError()}, None, start, start + timedelta(seconds=60)
+        )
+        self.metrics.add_samples(3)
+
+    def tearDown(self):
+        self.metrics.close()
+
+    def test_usage_tokens(self):
+        tokens = usage_tokens(make_response(100, 10, 40))
+        self.assertEqual(tokens["input_tokens"], 100)
+        self.assertEqual(tokens["output_tokens"], 10)
+        self.assertEqual(tokens["cached_tokens"], 40)
+        self.assertEqual(usage_tokens(None)["input_tokens"], 0)
+
+    def test_report(self):
+        report = self.metrics.report()
+        self.assertEqual(report["samples"], 3)
+        self.assertEqual(report["requests"], 4)
+        self.assertEqual(report["errors"], 1)
+        self.assertEqual(report["tokens"]["input_tokens"], 300)
+        self.assertEqual(report["tokens"]["cached_tokens"], 120)
+        self.assertEqual(report["models"]["haiku"]["errors"], {"TimeoutError": 1})
+        histogram = report["latency_seconds"]["histogram"]
+        self.assertEqual(histogram["0.25"], 1)
+        self.assertEqual(histogram["0.5"], 1)
+        self.assertEqual(histogram["4"], 1)
+        self.assertEqual(histogram["64"], 1)
+
+    def test_report_is_incremental(self):
+        self.metrics.report()
+        self.metrics.log_success_event({"model": "haiku"}, make_response(100, 10), 0.0, 1.0)
+        self.assertEqual(self.metrics.report()["requests"], 5)
+
+    def test_retries(self):
+        self.metrics.add_retries("rate_limit", 2)
+        self.metrics.add_retries("rebatch", 3)
+        self.assertEqual(self.metrics.report()["retries"], {"rate_limit": 2, "rebatch": 3})
+        self.assertIn("5 retries", self.metrics.progress_line())
+        self.assertIn('annotation_retries_total{reason="rebatch"} 3', self.metrics.to_prometheus())
+
+    def test_report_while_events_are_refreshed(self):
+        def refresh():
+            for i in range(300):
+                self.metrics.log_success_event({"model": f"model {i}"}, make_response(1, 1), 0.0, 1.0)
+                self.metrics._refresh()
+
+        thread = threading.Thread(target=refresh)
+        thread.start()
+        while thread.is_alive():
+            self.metrics.report()
+            self.metrics.to_prometheus()
+        thread.join()
+        self.assertEqual(self.metrics.report()["requests"], 304)
+
+    def test_context_manager_removes_events_file(self):
+        with AnnotationMetrics(progress_interval=None) as metrics:
+            self.assertTrue(os.path.exists(metrics.events_path))
+        self.assertFalse(os.path.exists(metrics.events_path))
+
+    def test_prometheus(self):
+        text = self.metrics.to_prometheus()
+        self.assertIn('annotation_requests_total{model="haiku",status="success"} 3', text)
+        self.assertIn('annotation_errors_total{model="haiku",error="TimeoutError"} 1', text)
+        self.assertIn('annotation_request_latency_seconds_bucket{model="haiku",le="+Inf"} 4', text)
+        self.assertIn('annotation_request_latency_seconds_count{model="haiku"} 4', text)
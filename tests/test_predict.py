@@ -0,0 +1,76 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import BertConfig, BertForSequenceClassification, PreTrainedTokenizerFast
+
+from annotate_and_finetune.predict import _merge_shards, _predict_shard, load_classifier, predict, predict_batch
+from annotate_and_finetune.streaming import byte_ranges
+
+
+WORDS = ["good", "bad", "fine", "awful", "great"]
+
+
+def save_tiny_classifier(path: str):
+    """Save a randomly initialized one-layer classifier and word-level tokenizer."""
+    vocab = {"[PAD]": 0, "[UNK]": 1} | {w: i + 2 for i, w in enumerate(WORDS)}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="[PAD]", unk_token="[UNK]").save_pretrained(path)
+    config = BertConfig(
+        vocab_size=len(vocab), hidden_size=16, num_hidden_layers=1, num_attention_heads=2, intermediate_size=32,
+        max_position_embeddings=64, id2label={0: "NEG", 1: "POS"}, label2id={"NEG": 0, "POS": 1},
+    )
+    BertForSequenceClassification(config).save_pretrained(path)
+
+
+class TestPredict(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.model_path = f"{cls.tmp_dir.name}/model"
+        save_tiny_classifier(cls.model_path)
+        cls.samples = [{"id": i, "text": " ".join(WORDS[j % 5] for j in range(i % 7 + 1))} for i in range(25)]
+        cls.input_path = f"{cls.tmp_dir.name}/input.jsonl"
+        Path(cls.input_path).write_text("".join(json.dumps(x) + "\n" for x in cls.samples))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def read(self, path):
+        return [json.loads(line) for line in Path(path).read_text().splitlines()]
+
+    def test_predict_batch_keeps_input_order(self):
+        model, tokenizer = load_classifier(self.model_path)
+        results = predict_batch(model, tokenizer, self.samples, "text", batch_size=4)
+        self.assertEqual([x["id"] for x in results], list(range(25)))
+        for x in results:
+            self.assertIn(x["predicted_label"], ("NEG", "POS"))
+            self.assertAlmostEqual(sum(x["probabilities"].values()), 1, places=4)
+            self.assertEqual(x["predicted_label"], max(x["probabilities"], key=x["probabilities"].get))
+        # Batching doesn't change predictions
+        single = predict_batch(model, tokenizer, self.samples[:3], "text", batch_size=1)
+        self.assertEqual([x["predicted_label"] for x in single], [x["predicted_label"] for x in results[:3]])
+
+    def test_predict(self):
+        output_path = f"{self.tmp_dir.name}/predictions.jsonl"
+        predict(self.model_path, self.input_path, output_path, batch_size=4, chunk_size=10)
+        results = self.read(output_path)
+        self.assertEqual([x["id"] for x in results], list(range(25)))
+
+    def test_byte_range_shards_restore_input_order(self):
+        output_path = f"{self.tmp_dir.name}/sharded.jsonl"
+        kwargs = dict(
+            model_path=self.model_path, input_data_path=self.input_path, input_field="text",
+            batch_size=4, max_length=None, num_threads=None, chunk_size=3,
+        )
+        shard_paths = []
+        for i, (start, end) in enumerate(byte_ranges(self.input_path, 3)):
+            shard_paths.append(f"{output_path}.shard{i}")
+            _predict_shard(output_data_path=shard_paths[-1], start=start, end=end, **kwargs)
+        _merge_shards(shard_paths + [f"{output_path}.empty"], output_path)
+        self.assertEqual([x["id"] for x in self.read(output_path)], list(range(25)))
+        self.assertFalse(any(Path(x).exists() for x in shard_paths))
@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import patch
+
+from annotate_and_finetune.annotate import run_annotation
+from annotate_and_finetune.annotation_config import build_annotation_configs
+from annotate_and_finetune.prompt_cache import format_cache_summary, inline_allowed_labels
+
+
+ALLOWED_LABELS = [{"label": "A", "description": "First"}, {"label": "B", "description": "Second"}]
+
+
+class FakePromptModule:
+    """Prompt module recording its config and the inputs it is called with."""
+
+    instances = []
+
+    def __init__(self, **config):
+        self.config = config
+        self.prompt = f"{config['task']}\n{config.get('details')}"
+        self.calls = []
+        FakePromptModule.instances.append(self)
+
+    def __call__(self, num_proc: int = 1, **data):
+        self.calls.append(data)
+        return data | {"thinking": ["t"] * len(data["text"]), "label": ["A"] * len(data["text"])}
+
+
+class TestInlineAllowedLabels(unittest.TestCase):
+    def setUp(self):
+        self.single_config, self.batch_config = build_annotation_configs("Label the text", "Be concise", "text", "A text", "id")
+
+    def test_labels_move_to_static_details(self):
+        for config in (self.single_config, self.batch_config):
+            inlined = inline_allowed_labels(config, "- A: First\n- B: Second")
+            self.assertTrue(inlined["details"].startswith("Be concise\n\n"))
+            self.assertTrue(inlined["details"].endswith("- A: First\n- B: Second"))
+            input_names = [x["name"] for x in inlined.get("inputs", [])]
+            input_names += [x["name"] for output in inlined["outputs"] for x in output.get("inputs", [])]
+            self.assertNotIn("allowed_labels", input_names)
+            # The original config is unchanged
+            self.assertEqual(config["details"], "Be concise")
+
+    def test_per_sample_inputs_no_longer_carry_labels(self):
+        samples = [{"id": i, "text": f"text {i}"} for i in range(3)]
+        for prompt_caching in (False, True):
+            FakePromptModule.instances = []
+            with patch("annotate_and_finetune.annotate.PromptModule", FakePromptModule):
+                results = run_annotation(
+                    dict(self.single_config), samples, allowed_labels=ALLOWED_LABELS, prompt_caching=prompt_caching
+                )
+            prompt = FakePromptModule.instances[0]
+            self.assertEqual(len(results), 3)
+            self.assertEqual("allowed_labels" in prompt.calls[0], not prompt_caching)
+            self.assertEqual("- A: First" in prompt.config["details"], prompt_caching)
+
+    def test_format_cache_summary(self):
+        summary = format_cache_summary({"input_tokens": 1000, "cached_tokens": 250, "cache_write_tokens": 50})
+        self.assertEqual(
+            summary,
+            "Prompt cache: 250 cached and 750 uncached input tokens (25.0% cached, 50 tokens written to cache)"
+        )
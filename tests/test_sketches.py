@@ -0,0 +1,124 @@
+import json
+import random
+import statistics
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+
+from annotate_and_finetune.sketches import HyperLogLog, KLLSketch, SpaceSaving, Welford
+from annotate_and_finetune.summarize_list import summarize_list
+from annotate_and_finetune.summarize_stream import StreamingSummary, summarize_jsonl_stream, summarize_stream
+
+
+class TestSketches(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.values = [rng.gauss(10, 3) for _ in range(20000)]
+
+    def test_welford_merge(self):
+        a, b = Welford(), Welford()
+        a.update(self.values[:5000])
+        b.update(self.values[5000:])
+        a.merge(b)
+        self.assertAlmostEqual(a.mean, statistics.mean(self.values), places=9)
+        self.assertAlmostEqual(a.std, statistics.stdev(self.values), places=9)
+        self.assertEqual((a.min, a.max), (min(self.values), max(self.values)))
+
+    def test_kll_quantiles(self):
+        exact = KLLSketch(k=200)
+        exact.update([3, 1, 2, 4])
+        self.assertEqual(exact.quantiles([0.5]), [2.5])
+
+        sketch, other = KLLSketch(k=200, seed=0), KLLSketch(k=200, seed=1)
+        sketch.update(self.values[:10000])
+        other.update(self.values[10000:])
+        sketch.merge(other)
+        ordered = sorted(self.values)
+        for q, x in zip([0.1, 0.5, 0.9], sketch.quantiles([0.1, 0.5, 0.9])):
+            self.assertAlmostEqual(ordered.index(x) / len(ordered), q, delta=0.0165)
+
+    def test_hyperloglog_count(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        a.update([str(i) for i in range(30000)])
+        b.update([str(i) for i in range(20000, 50000)])
+        a.merge(b)
+        self.assertAlmostEqual(a.count() / 50000, 1, delta=4 * 1.04 / 64)
+        small = HyperLogLog()
+        small.update([1, 1.0, 2, "a"])
+        self.assertEqual(small.count(), 3)
+
+    def test_space_saving_bounds(self):
+        rng = random.Random(0)
+        values = [min(int(rng.paretovariate(1)), 500) for _ in range(20000)]
+        a, b = SpaceSaving(capacity=50), SpaceSaving(capacity=50)
+        a.update(values[:10000])
+        b.update(values[10000:])
+        a.merge(b)
+        counts = Counter(values)
+        for value, count in a.top(10):
+            self.assertGreaterEqual(count, counts[value])
+            self.assertLessEqual(count - counts[value], len(values) / 50)
+        self.assertEqual([x for x, _ in a.top(3)], [x for x, _ in counts.most_common(3)])
+        self.assertTrue(a.evicted)
+
+    def test_space_saving_exact_at_capacity(self):
+        a, b = SpaceSaving(capacity=3), SpaceSaving(capacity=3)
+        a.update(["a", "a", "b"])
+        b.update(["c"])
+        a.merge(b)
+        a.update(["a"])
+        self.assertEqual(a.top(3), [("a", 3), ("b", 1), ("c", 1)])
+        self.assertFalse(a.evicted)
+        a.update(["d"])
+        self.assertTrue(a.evicted)
+
+
+class TestStreamingSummary(unittest.TestCase):
+    def test_exact_for_small_data(self):
+        values = [3, 1, None, 2, [1, None], 2, 5] * 10
+        flat = [x for x in values if not isinstance(x, list)]
+        self.assertEqual(
+            summarize_stream(flat, chunk_size=7).to_text(3).replace("approximately ", "").replace(", approximate", ""),
+            summarize_list(flat, 3),
+        )
+        self.assertTrue(summarize_stream(values, chunk_size=7).to_text().startswith("The nested structure contains 70 lists"))
+
+    def test_value_counts_approximate_only_after_eviction(self):
+        values = [str(i % 20) for i in range(100)]
+        self.assertNotIn(", approximate", summarize_stream(values, capacity=20).to_text())
+        self.assertIn(", approximate", summarize_stream(values, capacity=10).to_text())
+
+    def test_struct_fields(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "data.jsonl"
+            records = [
+                {"meta": {"a": 1}, "tags": [{"x": 1}]},
+                {"meta": {"a": 2, "b": "q"}, "tags": [{"x": 2, "y": [1, 2]}, {"x": 3}]},
+                {"meta": None, "tags": []},
+            ]
+            path.write_text("".join(json.dumps(x) + "\n" for x in records))
+            summaries = summarize_jsonl_stream(str(path))
+        self.assertEqual(list(summaries), ["meta.a", "tags[].x", "meta.b", "tags[].y"])
+        self.assertEqual((summaries["meta.a"].total, summaries["meta.a"].none_count), (3, 1))
+        self.assertEqual(summaries["tags[].x"].stats()["top_counts"], [(1, 1), (2, 1), (3, 1)])
+        # Lists inside lists are counted by their JSON encoding
+        self.assertEqual(summaries["tags[].y"].stats()["top_counts"], [("[1, 2]", 1)])
+
+    def test_merge_matches_single_pass(self):
+        values = [random.Random(i).choice(["a", "b", None, "c"]) for i in range(1000)]
+        merged = summarize_stream(values[:300])
+        merged.merge(summarize_stream(values[300:]))
+        self.assertEqual(merged.to_text(), summarize_stream(values).to_text())
+
+    def test_jsonl_with_processes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "data.jsonl"
+            records = [{"id": i, "label": ["a", "b"][i % 2]} | ({"extra": i} if i >= 150 else {}) for i in range(200)]
+            path.write_text("".join(json.dumps(x) + "\n" for x in records))
+            single = summarize_jsonl_stream(str(path), chunk_size=16)
+            parallel = summarize_jsonl_stream(str(path), num_proc=3, chunk_size=16)
+        self.assertEqual(list(parallel), ["id", "label", "extra"])
+        for name in single:
+            self.assertEqual(parallel[name].to_text(), single[name].to_text())
+        self.assertEqual((parallel["extra"].total, parallel["extra"].none_count), (200, 150))
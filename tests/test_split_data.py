@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+import unittest
+from collections import Counter
+
+from annotate_and_finetune.split_data import split_data, split_jsonl
+
+
+class TestSplitData(unittest.TestCase):
+    def setUp(self):
+        self.data = [{"id": i, "conversation": i // 4, "label": "A" if i % 5 else "B"} for i in range(1000)]
+
+    def test_shuffle_split_sizes(self):
+        splits = split_data(self.data, [0.8, 0.1, 0.1], seed=0)
+        self.assertEqual([len(x) for x in splits], [800, 100, 100])
+        self.assertEqual(splits, split_data(self.data, [0.8, 0.1, 0.1], seed=0))
+
+    def test_hash_split_is_stable(self):
+        splits = split_data(self.data, [0.8, 0.1, 0.1], key="id")
+        more = split_data(self.data + [{"id": 1000, "label": "A"}], [0.8, 0.1, 0.1], key="id")
+        for before, after in zip(splits, more):
+            self.assertEqual([x["id"] for x in before], [x["id"] for x in after if x["id"] < 1000])
+        self.assertTrue(700 < len(splits[0]) < 900)
+
+    def test_groups_stay_together(self):
+        splits = split_data(self.data, [0.8, 0.1, 0.1], group_key="conversation")
+        groups = [{x["conversation"] for x in split} for split in splits]
+        self.assertFalse(groups[0] & groups[1] or groups[0] & groups[2] or groups[1] & groups[2])
+
+    def test_stratified(self):
+        splits = split_data(self.data, [0.8, 0.1, 0.1], key="id", stratify_key="label")
+        self.assertEqual([Counter(x["label"] for x in split) for split in splits], [
+            {"A": 640, "B": 160}, {"A": 80, "B": 20}, {"A": 80, "B": 20}
+        ])
+
+    def test_split_jsonl(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, "data.jsonl")
+            with open(input_path, "w") as f:
+                f.writelines(json.dumps(x) + "\n" for x in self.data)
+            output_paths = [os.path.join(tmp_dir, f"{name}.jsonl") for name in ("train", "val", "test")]
+            counts = split_jsonl(input_path, output_paths, [0.8, 0.1, 0.1], key="id")
+            self.assertEqual(sum(counts), 1000)
+            in_memory = split_data(self.data, [0.8, 0.1, 0.1], key="id")
+            self.assertEqual(counts, [len(x) for x in in_memory])
+
+    def test_stratified_small_strata_fill_every_split(self):
+        # Strata smaller than the number of splits used to all go to train and val
+        data = [{"id": i, "label": i % 5} for i in range(10)]
+        splits = split_data(data, [0.6, 0.2, 0.2], key="id", stratify_key="label")
+        self.assertEqual([len(x) for x in splits], [6, 2, 2])
+        for label in range(5):
+            self.assertEqual(sum(x["label"] == label for split in splits for x in split), 2)
+
+    def test_stratified_groups(self):
+        splits = split_data(self.data, [0.8, 0.1, 0.1], group_key="conversation", stratify_key="label")
+        groups = [{x["conversation"] for x in split} for split in splits]
+        self.assertFalse(groups[0] & groups[1] or groups[0] & groups[2] or groups[1] & groups[2])
+        self.assertEqual(sum(len(x) for x in splits), 1000)
+
+    def test_split_jsonl_stratified_matches_split_data(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, "data.jsonl")
+            with open(input_path, "w") as f:
+                f.writelines(json.dumps(x) + "\n" for x in self.data)
+            output_paths = [os.path.join(tmp_dir, f"{name}.jsonl") for name in ("train", "val", "test")]
+            split_jsonl(input_path, output_paths, [0.8, 0.1, 0.1], key="id", stratify_key="label", seed=3)
+            in_memory = split_data(self.data, [0.8, 0.1, 0.1], key="id", stratify_key="label", seed=3)
+            for path, split in zip(output_paths, in_memory):
+                with open(path) as f:
+                    self.assertEqual([json.loads(line)["id"] for line in f], [x["id"] for x in split])
@@ -0,0 +1,68 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from annotate_and_finetune.streaming import (
+    byte_ranges, count_lines, iter_chunks, iter_jsonl, iter_jsonl_range, line_offsets, reservoir_sample, sample_jsonl
+)
+
+
+class TestStreaming(unittest.TestCase):
+    def test_iter_jsonl(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "data.jsonl"
+            path.write_text('{"id": 1}\n\n{"id": 2}\n')
+            self.assertEqual(list(iter_jsonl(str(path))), [{"id": 1}, {"id": 2}])
+
+    def test_byte_ranges_cover_each_line_once(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "data.jsonl"
+            path.write_text("".join(json.dumps({"id": i, "text": "x" * (i % 7)}) + "\n" for i in range(50)))
+            for n in (1, 3, 8, 1000):
+                records = [x for start, end in byte_ranges(str(path), n) for x in iter_jsonl_range(str(path), start, end)]
+                self.assertEqual([x["id"] for x in records], list(range(50)))
+
+    def test_line_offsets(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "data.jsonl"
+            lines = [json.dumps({"id": i, "text": "x" * (i % 7)}) for i in range(50)]
+            path.write_text("\n".join(lines))
+            data = path.read_bytes()
+            self.assertEqual(count_lines(str(path)), 50)
+            for block_size in (5, 64, 2 ** 24):
+                offsets = line_offsets(str(path), range(50), block_size)
+                self.assertEqual([data[offsets[i]:].split(b"\n")[0].decode() for i in range(50)], lines)
+
+    def test_sample_jsonl(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "data.jsonl"
+            path.write_text("".join(json.dumps({"id": i}) + "\n" for i in range(100)))
+            samples = sample_jsonl(str(path), 10, seed=0)
+            self.assertEqual(len({x["id"] for x in samples}), 10)
+            self.assertEqual(samples, sample_jsonl(str(path), 10, seed=0))
+            self.assertEqual(sorted(x["id"] for x in sample_jsonl(str(path), 1000)), list(range(100)))
+
+    def test_iter_chunks(self):
+        chunks = list(iter_chunks(iter(range(7)), 3))
+        self.assertEqual(chunks, [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(iter_chunks([], 3)), [])
+
+    def test_reservoir_sample_size(self):
+        self.assertEqual(len(reservoir_sample(iter(range(1000)), 10, seed=0)), 10)
+        self.assertEqual(sorted(reservoir_sample(iter(range(5)), 10, seed=0)), [0, 1, 2, 3, 4])
+
+    def test_reservoir_sample_is_reproducible(self):
+        self.assertEqual(
+            reservoir_sample(iter(range(1000)), 10, seed=42),
+            reservoir_sample(iter(range(1000)), 10, seed=42)
+        )
+
+    def test_reservoir_sample_is_uniform(self):
+        counts = [0] * 10
+        for seed in range(2000):
+            for x in reservoir_sample(iter(range(10)), 3, seed=seed):
+                counts[x] += 1
+        # Each item is selected with probability 0.3
+        for count in counts:
+            self.assertAlmostEqual(count / 2000, 0.3, delta=0.05)
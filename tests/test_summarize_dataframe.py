@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+import unittest
+
+import polars as pl
+
+from annotate_and_finetune.summarize_dataframe import flatten_columns, load_dataframe, summarize_dataframe
+from annotate_and_finetune.summarize_list import summarize_list
+
+
+class TestSummarizeDataframe(unittest.TestCase):
+    def setUp(self):
+        self.df = pl.DataFrame({
+            "id": [1, 2, 3],
+            "name": ["a", None, "a"],
+            "tags": [["x", "y"], [], None],
+            "scores": [{"math": 90, "art": None}, {"math": 80, "art": 70}, None],
+            "events": [[{"kind": "click"}], [], [{"kind": "view"}, {"kind": "click"}]],
+        })
+
+    def test_flatten_columns(self):
+        names = [name for name, _ in flatten_columns(self.df)]
+        self.assertEqual(names, ["id", "name", "tags", "scores.math", "scores.art", "events[].kind"])
+
+    def test_columns_match_summarize_list(self):
+        report = summarize_dataframe(self.df, n_examples=3, num_threads=2)
+        self.assertTrue(report.startswith("The dataset contains 3 rows and 5 columns."))
+        for name in ["id", "name", "tags"]:
+            self.assertIn(summarize_list(self.df[name].to_list(), 3).strip(), report)
+        self.assertIn(summarize_list([90, 80, None], 3).strip(), report)
+        self.assertIn("## events[].kind (String)", report)
+        self.assertIn(summarize_list(["click", "view", "click"], 3).strip(), report)
+
+    def test_max_rows_samples_jsonl(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "data.jsonl")
+            with open(path, "w") as f:
+                f.writelines(json.dumps({"id": i, "meta": {"n": i}}) + "\n" for i in range(100))
+            df, sampled = load_dataframe(path, max_rows=10, seed=0)
+            self.assertTrue(sampled)
+            self.assertEqual(df.height, 10)
+            self.assertEqual(len(set(df["id"].to_list())), 10)
+            df, sampled = load_dataframe(path, max_rows=1000)
+            self.assertFalse(sampled)
+            self.assertEqual(df.height, 100)
+
+            report = summarize_dataframe(path, max_rows=10, seed=0)
+            self.assertTrue(report.startswith("The summary is based on a random sample of 10 rows with 2 columns."))
+            self.assertIn("## meta.n (Int64)", report)
+
+            # A file with exactly max_rows rows is summarized whole
+            report = summarize_dataframe(path, max_rows=100, seed=0)
+            self.assertTrue(report.startswith("The dataset contains 100 rows and 2 columns."))
+
+    def test_max_rows_samples_dataframe(self):
+        report = summarize_dataframe(self.df, max_rows=2, seed=0)
+        self.assertTrue(report.startswith("The summary is based on a random sample of 2 rows with 5 columns."))
+        report = summarize_dataframe(self.df, max_rows=10)
+        self.assertTrue(report.startswith("The dataset contains 3 rows and 5 columns."))
+        report = summarize_dataframe(self.df, max_rows=3)
+        self.assertTrue(report.startswith("The dataset contains 3 rows and 5 columns."))
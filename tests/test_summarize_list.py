@@ -1,7 +1,7 @@
 import unittest
 from typing import List, Optional, Union
 
-from annotate_and_finetune.summarize_list import summarize_list
+from annotate_and_finetune.summarize_list import summarize_list, _summarize_flat_list
 
 
 class TestSummarizeNumbers(unittest.TestCase):
@@ -241,4 +241,26 @@ class TestSummarizeNumbers(unittest.TestCase):
         # Should only show top 2 values
         value_counts_section = result[result.find("Value Counts"):]
         count_lines = value_counts_section.count("\n|") - 2
-        self.assertEqual(count_lines, 2, "Should only show top 2 values in count table")
\ No newline at end of file
+        self.assertEqual(count_lines, 2, "Should only show top 2 values in count table")
+
+class TestVectorizedSummary(unittest.TestCase):
+    """The vectorized path must produce the same text as the pure Python fallback."""
+
+    def assertSameAsFallback(self, values, n_examples=10):
+        self.assertEqual(summarize_list(values, n_examples), _summarize_flat_list(values, n_examples, series=None))
+
+    def test_integers(self):
+        self.assertSameAsFallback([3, 1, None, 2, 2, 5, 1, 1, None], n_examples=2)
+
+    def test_floats(self):
+        self.assertSameAsFallback([1000000.123, 2000000.456, 3000000.789, 4000000.012, None])
+
+    def test_mixed_int_and_float(self):
+        self.assertSameAsFallback([1, 2.0, 3, 4.5, 2])
+
+    def test_strings(self):
+        self.assertSameAsFallback(["b", "a\nb", None, "b", "é", "a\nb", "c"], n_examples=3)
+
+    def test_fallback_values(self):
+        for values in ([0.0, -0.0, 1.0], [2 ** 70, 1], [True, 2.5, 1]):
+            self.assertSameAsFallback(values)
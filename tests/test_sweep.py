@@ -0,0 +1,49 @@
+import math
+import unittest
+
+from annotate_and_finetune.sweep import grid_trials, random_trials, should_prune, validate_parameters
+
+
+class TestTrials(unittest.TestCase):
+    def test_grid_trials(self):
+        trials = grid_trials({"learning_rate": [1e-5, 1e-4], "batch_size": [8, 16, 32]})
+        self.assertEqual(len(trials), 6)
+        self.assertEqual(trials[0], {"learning_rate": 1e-5, "batch_size": 8})
+        self.assertEqual(len({tuple(x.items()) for x in trials}), 6)
+        self.assertEqual(grid_trials({}), [{}])
+
+    def test_random_trials(self):
+        parameters = {
+            "learning_rate": {"min": 1e-6, "max": 1e-4, "log": True},
+            "num_epochs": {"min": 1, "max": 5},
+            "distillation_alpha": {"min": 0.0, "max": 0.5},
+            "batch_size": [8, 16],
+        }
+        validate_parameters(parameters)
+        trials = random_trials(parameters, 200, seed=0)
+        self.assertEqual(len(trials), 200)
+        self.assertEqual(trials, random_trials(parameters, 200, seed=0))
+        for x in trials:
+            self.assertTrue(1e-6 <= x["learning_rate"] <= 1e-4)
+            self.assertIsInstance(x["num_epochs"], int)
+            self.assertTrue(1 <= x["num_epochs"] <= 5)
+            self.assertTrue(0 <= x["distillation_alpha"] <= 0.5)
+            self.assertIn(x["batch_size"], (8, 16))
+        # Log ranges are sampled uniformly in log space
+        below = sum(math.log10(x["learning_rate"]) < -5 for x in trials)
+        self.assertTrue(70 < below < 130)
+
+    def test_should_prune(self):
+        self.assertFalse(should_prune(0.1, [0.9]))
+        self.assertTrue(should_prune(0.5, [0.4, 0.6, 0.8]))
+        self.assertFalse(should_prune(0.6, [0.4, 0.6, 0.8]))
+        self.assertFalse(should_prune(0.5, [0.4, 0.6, 0.8], quantile=0.3))
+        self.assertTrue(should_prune(0.7, [0.4, 0.6, 0.8], quantile=1.0))
+
+    def test_validate_parameters(self):
+        validate_parameters({"learning_rate": [1e-5], "batch_size": [8], "max_length": [128]})
+        with self.assertRaisesRegex(ValueError, "warmup"):
+            validate_parameters({"learning_rate": [1e-5], "warmup": [0.1]})
+        # Arguments set by the sweep can't be swept
+        with self.assertRaisesRegex(ValueError, "output_path"):
+            validate_parameters({"output_path": ["/tmp"]})